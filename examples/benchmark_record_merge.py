@@ -0,0 +1,71 @@
+from scrapontologies.parsers.record_merge import merge_records
+import copy
+import random
+import time
+
+NUM_PAGES = 1000
+NUM_RUNS = 20
+
+def legacy_merge(d1, d2):
+    # The pairwise merge PDFParser used before merge_records, kept as the baseline
+    for key, value in d2.items():
+        if value in (None, 'NA', ''):
+            continue
+        if key not in d1 or d1[key] in (None, 'NA', ''):
+            d1[key] = value
+        elif isinstance(d1[key], dict) and isinstance(value, dict):
+            d1[key] = legacy_merge(d1[key], value)
+        elif isinstance(d1[key], list) and isinstance(value, list):
+            d1[key].extend([v for v in value if v not in (None, 'NA', '')])
+    return d1
+
+def synthetic_page(page_num, rng):
+    # A statement page: most header fields are NA outside the first pages, the transactions
+    # repeat across pages and the totals are nested objects
+    return {
+        "account": {
+            "holder": "Jane Doe" if page_num == 0 else "NA",
+            "number": rng.choice(["NA", "", "IT60X0542811101000000123456"]),
+            "address": {"street": "NA" if page_num else "Via Roma 1", "city": rng.choice([None, "Milano"])},
+        },
+        "transactions": [
+            {"id": f"t{rng.randrange(NUM_PAGES * 5)}", "amount": rng.randrange(10000) / 100, "category": rng.choice(["NA", "food", "rent"])}
+            for _ in range(20)
+        ],
+        "tags": [rng.choice(["NA", "savings", "checking", "joint"]) for _ in range(5)],
+        "totals": {"in": rng.random(), "out": "NA", "fees": {"monthly": None, "yearly": rng.random()}},
+    }
+
+def main():
+    rng = random.Random(0)
+    pages = [synthetic_page(page_num, rng) for page_num in range(NUM_PAGES)]
+
+    # legacy_merge modifies the pages, every run gets its own copy made ahead of time
+    legacy_copies = [copy.deepcopy(pages) for _ in range(NUM_RUNS + 1)]
+
+    def run_legacy():
+        combined = {}
+        for page in legacy_copies.pop():
+            combined = legacy_merge(combined, page)
+        return combined
+
+    benchmarks = [
+        ("legacy pairwise merge", run_legacy),
+        ("merge_records", lambda: merge_records(pages)),
+        ("merge_records, dedupe_lists", lambda: merge_records(pages, dedupe_lists=True)),
+        ("merge_records, list_key='id'", lambda: merge_records(pages, list_key="id")),
+    ]
+
+    print(f"{'merge':<32} {'ms':>9} {'transactions':>13} {'tags':>6}")
+    for label, run in benchmarks:
+        elapsed = min(timed(run) for _ in range(NUM_RUNS))
+        merged = run()
+        print(f"{label:<32} {elapsed * 1000:>9.1f} {len(merged['transactions']):>13} {len(merged['tags']):>6}")
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from scrapontologies import PDFParser
+from scrapontologies.llm_client import LLMClient
+from scrapontologies.parsers.prompts import JSON_SCHEMA_PROMPT
+from dotenv import load_dotenv
+import os
+import time
+
+# Rendering settings to compare, the first one is the default of PDFParser
+RENDER_SETTINGS = [
+    {"dpi": 150, "grayscale": False, "max_image_dimension": None, "image_format": "JPEG"},
+    {"dpi": 150, "grayscale": True, "max_image_dimension": None, "image_format": "JPEG"},
+    {"dpi": 100, "grayscale": True, "max_image_dimension": None, "image_format": "JPEG"},
+    {"dpi": 150, "grayscale": True, "max_image_dimension": 1568, "image_format": "JPEG", "image_quality": 70},
+    {"dpi": 150, "grayscale": True, "max_image_dimension": 1568, "image_format": "WEBP", "image_quality": 70},
+    {"dpi": 200, "grayscale": True, "max_image_dimension": 2048, "image_format": "WEBP", "image_quality": 80},
+]
+
+def main():
+    # Load environment variables
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    # Get current directory and set PDF path
+    curr_dir = os.path.dirname(os.path.abspath(__file__))
+    pdf_path = os.path.join(curr_dir, 'example_files', 'test.pdf')
+
+    # ************************************************
+    # Define the configuration for the LLMClient here
+    # ************************************************
+    llm_client_config = {
+        "provider_name": "openai",
+        "api_key": api_key,
+        "model": "gpt-4o-2024-08-06",
+        "llm_config": {
+            "temperature": 0.0,
+        }
+    }
+
+    llm_client = LLMClient(**llm_client_config)
+
+    # The LLM latency is measured on the first page only when an API key is available
+    measure_llm = bool(api_key)
+
+    print(f"{'settings':<70} {'pages':>5} {'payload KB':>11} {'render s':>9} {'llm s':>7}")
+    for settings in RENDER_SETTINGS:
+        pdf_parser = PDFParser(llm_client, **settings)
+
+        start = time.perf_counter()
+        base64_images = [base64_image for _, base64_image in pdf_parser.iter_encoded_pages(pdf_path)]
+        render_time = time.perf_counter() - start
+
+        payload_kb = sum(len(base64_image) for base64_image in base64_images) / 1024
+
+        llm_time = float("nan")
+        if measure_llm and base64_images:
+            start = time.perf_counter()
+            llm_client.get_response(JSON_SCHEMA_PROMPT, image_url=pdf_parser._image_data_url(base64_images[0]))
+            llm_time = time.perf_counter() - start
+
+        label = ", ".join(f"{key}={value}" for key, value in settings.items())
+        print(f"{label:<70} {len(base64_images):>5} {payload_kb:>11.1f} {render_time:>9.2f} {llm_time:>7.2f}")
+
+if __name__ == "__main__":
+    main()
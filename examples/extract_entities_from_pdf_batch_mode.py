@@ -0,0 +1,49 @@
+from scrapontologies import PDFParser
+from scrapontologies.llm_client import LLMClient
+from dotenv import load_dotenv
+import os
+
+def main():
+    # Load environment variables
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    # Get the path to the example files directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    files_dir = os.path.join(script_dir, 'example_files')
+
+    pdf_files = [os.path.join(files_dir, f) for f in os.listdir(files_dir) if f.endswith('.pdf')]
+    if not pdf_files:
+        raise FileNotFoundError("No PDF files found in the example files directory.")
+
+    # ************************************************
+    # Define the configuration for the LLMClient here
+    # ************************************************
+    llm_client_config = {
+        "provider_name": "openai",
+        "api_key": api_key,
+        "model": "gpt-4o-2024-08-06",
+        # Point base_url to a local server implementing the batch API to try the batch mode offline
+        "base_url": os.getenv("OPENAI_BASE_URL"),
+        "llm_config": {
+            "temperature": 0.0,
+        }
+    }
+
+    llm_client = LLMClient(**llm_client_config)
+    pdf_parser = PDFParser(llm_client)
+
+    # Generate the JSON schema first
+    pdf_parser.generate_json_schema(pdf_files[0])
+
+    # Send the pages of all the files as a single batch job, it can take up to 24 hours to complete
+    records = pdf_parser.extract_entities_from_file(pdf_files, batch=True, batch_poll_interval=60.0)
+
+    for record in records:
+        print(f"Record ID: {record.id}")
+        for entity in record.entities:
+            print(f"Entity ID: {entity.id}")
+            print(f"Attributes: {entity.attributes}")
+
+if __name__ == "__main__":
+    main()
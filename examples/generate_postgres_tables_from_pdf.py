@@ -52,5 +52,10 @@ def main():
 
     print("Tables created successfully in the PostgreSQL database.")
 
+    # Extract the data of the PDF and load it into the tables
+    records = pdf_parser.extract_entities_from_file([pdf_path])
+    loaded_rows = pdf_extractor.load_records(records)
+    print(f"Loaded rows: {loaded_rows}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
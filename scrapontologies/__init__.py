@@ -1,4 +1,7 @@
 from .llm_client import LLMClient
+from .response_cache import ResponseCache, SQLiteResponseCache
+from .scheduler import RequestScheduler
+from .checkpoint import SQLiteCheckpointer
 from .extractor import Extractor, FileExtractor
 from .primitives import Entity, Relation
 from .parsers import PDFParser
\ No newline at end of file
@@ -0,0 +1,299 @@
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Request parameters forwarded from the llm_config to the batch requests
+BATCH_REQUEST_PARAMS = ("temperature", "max_tokens", "top_p", "seed", "stop")
+
+
+class BatchBackend(ABC):
+    """
+    Base class of the provider batch APIs: a batch job is submitted, polled until it ends
+    and its results are downloaded.
+    """
+
+    default_base_url: str = ""
+    # Limits of a single batch job, larger request lists are split into several jobs
+    max_batch_requests: int = 50000
+    max_batch_bytes: int = 200_000_000
+
+    def __init__(
+        self,
+        http_client: httpx.Client,
+        api_key: str,
+        model: str,
+        base_url: Optional[str] = None,
+        llm_config: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Initializes the BatchBackend.
+
+        Args:
+            http_client (httpx.Client): The HTTP client sending the requests.
+            api_key (str): The API key for authentication.
+            model (str): The model name.
+            base_url (Optional[str]): The base URL of the API. Defaults to the provider's base URL.
+            llm_config (Optional[Dict[str, Any]]): The configuration of the language model, the parameters
+                in BATCH_REQUEST_PARAMS are sent with every request.
+        """
+        self.http_client = http_client
+        self.api_key = api_key
+        self.model = model
+        self.base_url = (base_url or self.default_base_url).rstrip("/")
+        self.request_params = {
+            key: value for key, value in (llm_config or {}).items() if key in BATCH_REQUEST_PARAMS
+        }
+
+    @abstractmethod
+    def submit(self, requests: List[Tuple[str, List[Dict[str, Any]]]]) -> str:
+        """Submits the (custom_id, messages) requests and returns the id of the batch job."""
+        pass
+
+    @abstractmethod
+    def _batch_entry(self, custom_id: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """The entry of a request in the batch job sent to the provider."""
+        pass
+
+    def split(self, requests: List[Tuple[str, List[Dict[str, Any]]]]) -> List[List[Tuple[str, List[Dict[str, Any]]]]]:
+        """
+        Splits the requests into chunks within the request count and byte size limits of a batch job.
+
+        Args:
+            requests (List[Tuple[str, List[Dict[str, Any]]]]): The custom ids and the messages of the requests.
+
+        Returns:
+            List[List[Tuple[str, List[Dict[str, Any]]]]]: The chunks, in request order.
+
+        Raises:
+            ValueError: If a single request is larger than max_batch_bytes.
+        """
+        chunks: List[List[Tuple[str, List[Dict[str, Any]]]]] = []
+        chunk: List[Tuple[str, List[Dict[str, Any]]]] = []
+        chunk_bytes = 0
+        for custom_id, messages in requests:
+            # The serialized entry and its separator
+            size = len(json.dumps(self._batch_entry(custom_id, messages)).encode("utf-8")) + 1
+            if size > self.max_batch_bytes:
+                raise ValueError(f"Batch request {custom_id} is {size} bytes, above the {self.max_batch_bytes} bytes limit of a batch job")
+            if chunk and (len(chunk) >= self.max_batch_requests or chunk_bytes + size > self.max_batch_bytes):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append((custom_id, messages))
+            chunk_bytes += size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @abstractmethod
+    def poll(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the batch job once it has ended, None while it is still running."""
+        pass
+
+    @abstractmethod
+    def results(self, batch: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """Downloads the results of an ended batch job, keyed by custom_id."""
+        pass
+
+    def run(
+        self,
+        requests: List[Tuple[str, List[Dict[str, Any]]]],
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Optional[str]]:
+        """
+        Submits the requests as batch jobs and waits for their results.
+
+        The requests are split into as many jobs as the provider limits require, see split,
+        and the jobs are polled together.
+
+        Args:
+            requests (List[Tuple[str, List[Dict[str, Any]]]]): The custom ids and the messages of the requests.
+            poll_interval (float): The number of seconds between two status checks. Defaults to 30.
+            timeout (Optional[float]): The maximum number of seconds to wait. Defaults to the provider's completion window.
+
+        Returns:
+            Dict[str, Optional[str]]: The responses keyed by custom_id, None for the failed requests.
+
+        Raises:
+            TimeoutError: If a batch job does not end within the timeout.
+        """
+        batch_ids = []
+        for chunk in self.split(requests):
+            batch_id = self.submit(chunk)
+            batch_ids.append(batch_id)
+            logger.info(f"Submitted batch {batch_id} with {len(chunk)} requests")
+
+        start = time.monotonic()
+        ended: Dict[str, Dict[str, Any]] = {}
+        while True:
+            for batch_id in batch_ids:
+                if batch_id not in ended:
+                    batch = self.poll(batch_id)
+                    if batch is not None:
+                        ended[batch_id] = batch
+                        logger.info(f"Batch {batch_id} ended")
+            if len(ended) == len(batch_ids):
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                pending = [batch_id for batch_id in batch_ids if batch_id not in ended]
+                raise TimeoutError(f"Batches {pending} did not complete within {timeout} seconds")
+            time.sleep(poll_interval)
+
+        responses: Dict[str, Optional[str]] = {}
+        for batch_id in batch_ids:
+            responses.update(self.results(ended[batch_id]))
+        return responses
+
+    def _get(self, url: str) -> httpx.Response:
+        response = self.http_client.get(url, headers=self._headers())
+        response.raise_for_status()
+        return response
+
+    def _post(self, url: str, **kwargs) -> httpx.Response:
+        response = self.http_client.post(url, headers=self._headers(), **kwargs)
+        response.raise_for_status()
+        return response
+
+    @abstractmethod
+    def _headers(self) -> Dict[str, str]:
+        pass
+
+    @staticmethod
+    def _parse_jsonl(content: str) -> List[Dict[str, Any]]:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    The OpenAI Batch API: the requests are uploaded as a JSONL file and run against /v1/chat/completions.
+    """
+
+    default_base_url = "https://api.openai.com/v1"
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _batch_entry(self, custom_id: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": self.model, "messages": messages, **self.request_params},
+        }
+
+    def submit(self, requests: List[Tuple[str, List[Dict[str, Any]]]]) -> str:
+        lines = [json.dumps(self._batch_entry(custom_id, messages)) for custom_id, messages in requests]
+        input_file = self._post(
+            f"{self.base_url}/files",
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+        ).json()
+
+        batch = self._post(
+            f"{self.base_url}/batches",
+            json={"input_file_id": input_file["id"], "endpoint": "/v1/chat/completions", "completion_window": "24h"},
+        ).json()
+        return batch["id"]
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = self._get(f"{self.base_url}/batches/{batch_id}").json()
+        if batch["status"] in ("completed", "expired", "cancelled", "failed"):
+            return batch
+        return None
+
+    def results(self, batch: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        if not batch.get("output_file_id"):
+            raise RuntimeError(f"Batch {batch['id']} ended with status {batch['status']} and no output")
+
+        content = self._get(f"{self.base_url}/files/{batch['output_file_id']}/content").text
+        responses = {}
+        for line in self._parse_jsonl(content):
+            response = line.get("response") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                logger.error(f"Batch request {line['custom_id']} failed: {line.get('error') or response}")
+                responses[line["custom_id"]] = None
+                continue
+            responses[line["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return responses
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """
+    The Anthropic Message Batches API.
+    """
+
+    default_base_url = "https://api.anthropic.com"
+    default_max_tokens = 4096
+    max_batch_requests = 100000
+    max_batch_bytes = 256_000_000
+
+    def _headers(self) -> Dict[str, str]:
+        return {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"}
+
+    def _batch_entry(self, custom_id: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        params = {"max_tokens": self.default_max_tokens, **self.request_params}
+        if "stop" in params:
+            params["stop_sequences"] = params.pop("stop")
+        return {
+            "custom_id": custom_id,
+            "params": {"model": self.model, "messages": self._convert_messages(messages), **params},
+        }
+
+    def submit(self, requests: List[Tuple[str, List[Dict[str, Any]]]]) -> str:
+        batch = self._post(
+            f"{self.base_url}/v1/messages/batches",
+            json={"requests": [self._batch_entry(custom_id, messages) for custom_id, messages in requests]},
+        ).json()
+        return batch["id"]
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = self._get(f"{self.base_url}/v1/messages/batches/{batch_id}").json()
+        if batch["processing_status"] == "ended":
+            return batch
+        return None
+
+    def results(self, batch: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        content = self._get(batch["results_url"]).text
+        responses = {}
+        for line in self._parse_jsonl(content):
+            result = line["result"]
+            if result["type"] != "succeeded":
+                logger.error(f"Batch request {line['custom_id']} failed: {result}")
+                responses[line["custom_id"]] = None
+                continue
+            responses[line["custom_id"]] = "".join(
+                block["text"] for block in result["message"]["content"] if block["type"] == "text"
+            )
+        return responses
+
+    @staticmethod
+    def _convert_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Converts the OpenAI style messages built by LLMClient, turning image data URLs into base64 image blocks."""
+        converted = []
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, list):
+                blocks = []
+                for part in content:
+                    if part["type"] == "image_url":
+                        header, data = part["image_url"]["url"].split(",", 1)
+                        media_type = header[len("data:"):].split(";")[0]
+                        blocks.append({"type": "image", "source": {"type": "base64", "media_type": media_type, "data": data}})
+                    else:
+                        blocks.append(part)
+                content = blocks
+            converted.append({"role": message["role"], "content": content})
+        return converted
+
+
+# Providers supporting the batch mode
+BATCH_BACKENDS = {
+    "openai": OpenAIBatchBackend,
+    "anthropic": AnthropicBatchBackend,
+}
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sqlite3
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class SQLiteCheckpointer(SqliteSaver):
+    """
+    A LangGraph checkpointer persisted in a SQLite database, usable by sync and async graph runs alike.
+
+    The async methods run the sync ones in a thread, so that a single local database file serves
+    both invoke and ainvoke. The connection is shared between threads behind the saver's lock.
+
+    Only the LangGraph types are deserialized from the checkpoints by default, the graphs using the
+    checkpointer allow their own state types with with_allowlist.
+
+    The checkpoints of an extraction hold the page images of its document, PDFParser deletes them once
+    every page group is extracted, so the file only keeps the runs that were interrupted or had failed pages.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initializes the SQLiteCheckpointer.
+
+        Args:
+            path (Optional[str]): The path of the SQLite database. Defaults to the SCRAPONTOLOGIES_CHECKPOINT_PATH
+                environment variable, or ".scrapontologies_checkpoints.sqlite" in the working directory.
+        """
+        self.path = path or os.getenv("SCRAPONTOLOGIES_CHECKPOINT_PATH", ".scrapontologies_checkpoints.sqlite")
+        super().__init__(
+            sqlite3.connect(self.path, check_same_thread=False),
+            serde=JsonPlusSerializer(allowed_msgpack_modules=None),
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoints = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -1,14 +1,298 @@
 import os
+import io
+import json
+import math
+import re
 from abc import ABC, abstractmethod
+from decimal import Decimal, InvalidOperation
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, Json, execute_values
 import logging
 from pydantic_core import CoreSchema, core_schema
-from typing import Any, Callable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from neo4j import GraphDatabase
+from .primitives import Record
+from .parsers.record_merge import is_na
+from .parsers.schema_relations import singular_forms
 
 logger = logging.getLogger(__name__)
 
+# Column types the loaded values are converted to
+INTEGER_TYPES = frozenset({"smallint", "integer", "bigint"})
+NUMERIC_TYPES = INTEGER_TYPES | frozenset({"numeric", "decimal", "real", "double precision"})
+JSON_TYPES = frozenset({"json", "jsonb"})
+
+# Characters escaped in the text format of COPY
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+LOAD_METHODS = ("copy", "values")
+
+
+def _snake_case(name: str) -> str:
+    name = re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", str(name))
+    return re.sub(r"\W+", "_", name).lower().strip("_")
+
+
+def _name_forms(name: str) -> List[str]:
+    """The name of an entity or a table in snake case, followed by its possible singular forms, to match them with each other."""
+    return singular_forms(_snake_case(name))
+
+
+class _RowKey:
+    """The primary key of a row before it is written, set when the ids of its table are reserved."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+
+class _Table:
+    def __init__(self, name: str):
+        self.name = name
+        self.columns: Dict[str, str] = {}
+        self.primary_key: Optional[str] = None
+        self.sequence: Optional[str] = None
+        # The identity columns GENERATED ALWAYS, which INSERT only writes with OVERRIDING SYSTEM VALUE
+        self.always_identity: set = set()
+        # The foreign key columns, with the table and column they reference
+        self.foreign_keys: Dict[str, Tuple[str, str]] = {}
+
+    def column(self, *names: str) -> Optional[str]:
+        """The first column named like one of the names, as it is or in snake case."""
+        for name in names:
+            for candidate in (name, _snake_case(name)):
+                if candidate in self.columns:
+                    return candidate
+        return None
+
+    def foreign_key_to(self, table_name: str) -> Optional[str]:
+        return next((column for column, (target, _) in self.foreign_keys.items() if target == table_name), None)
+
+
+class _RowMapper:
+    """
+    Maps the entities of records to the rows of the tables of a database schema.
+
+    An entity, or a nested object or list of objects, goes to the table named after it, in singular
+    or plural, and its values to the columns named after its attributes. Objects without a table are
+    flattened into the row of their parent as <attribute>_<key> or <key> columns. A row is linked to
+    its parent by the foreign key of either table, or by a junction table referencing both, and the
+    foreign keys still unset at the end of a record reference the row of the same record in the
+    referenced table. Values without a column are skipped.
+    """
+
+    def __init__(self, tables: Dict[str, _Table]):
+        self.tables = tables
+        # A plural name refers to the same table as its singular, the exact names are matched first
+        self.by_key: Dict[str, _Table] = {}
+        for table in tables.values():
+            self.by_key.setdefault(_snake_case(table.name), table)
+        for table in tables.values():
+            for form in _name_forms(table.name)[1:]:
+                self.by_key.setdefault(form, table)
+        self.rows: Dict[str, List[Dict[str, Any]]] = {name: [] for name in tables}
+        self.size = 0
+        self.skipped: set = set()
+        # The number of values set to NULL because they could not be converted to their column type, by column
+        self.coerced: Dict[str, int] = {}
+
+    def table_for(self, name: str) -> Optional[_Table]:
+        return next((self.by_key[form] for form in _name_forms(name) if form in self.by_key), None)
+
+    def add_record(self, record: Record) -> None:
+        record_rows: Dict[str, Dict[str, Any]] = {}
+        added: List[Tuple[_Table, Dict[str, Any]]] = []
+        for entity in record.entities:
+            table = self.table_for(entity.id)
+            if table is None:
+                self.skipped.add(entity.id)
+                continue
+            values = entity.attributes if isinstance(entity.attributes, list) else [entity.attributes]
+            for value in values:
+                if isinstance(value, dict):
+                    self._add_row(table, value, None, record_rows, added)
+
+        # Foreign keys not set by the nesting reference the rows of the same record
+        for table, row in added:
+            for column, (target, target_column) in table.foreign_keys.items():
+                if row.get(column) is None and target in record_rows and record_rows[target] is not row:
+                    row[column] = record_rows[target].get(target_column)
+
+    def clear(self) -> None:
+        for rows in self.rows.values():
+            rows.clear()
+        self.size = 0
+
+    def _add_row(self, table: _Table, data: Dict[str, Any], parent, record_rows, added) -> None:
+        row: Dict[str, Any] = {}
+        if table.sequence is not None:
+            row[table.primary_key] = _RowKey()
+        nested = self._fill(table, row, data, "")
+        self._append(table, row, record_rows, added)
+        if parent is not None:
+            self._link(parent, (table, row), record_rows, added)
+
+        for child_table, value in nested:
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, dict):
+                    self._add_row(child_table, item, (table, row), record_rows, added)
+
+    def _fill(self, table: _Table, row: Dict[str, Any], data: Dict[str, Any], prefix: str) -> List[Tuple[_Table, Any]]:
+        """Sets the columns of a row from an object, returns its nested objects that have a table."""
+        nested = []
+        for key, value in data.items():
+            if is_na(value):
+                continue
+            name = f"{prefix}{key}"
+            if isinstance(value, (dict, list)):
+                child_table = self.table_for(key)
+                has_objects = isinstance(value, dict) or any(isinstance(item, dict) for item in value)
+                if child_table is not None and child_table is not table and has_objects:
+                    nested.append((child_table, value))
+                    continue
+
+            column = table.column(name, key, *(f"{form}_{key}" for form in _name_forms(table.name)))
+            if isinstance(value, dict) and (column is None or table.columns[column] not in JSON_TYPES):
+                nested.extend(self._fill(table, row, value, f"{name}_"))
+            elif column is None:
+                self.skipped.add(f"{table.name}.{name}")
+            elif row.get(column) is None:
+                row[column] = value
+        return nested
+
+    def _append(self, table: _Table, row: Dict[str, Any], record_rows, added) -> None:
+        self.rows[table.name].append(row)
+        self.size += 1
+        record_rows.setdefault(table.name, row)
+        added.append((table, row))
+
+    def _link(self, parent, child, record_rows, added) -> None:
+        (parent_table, parent_row), (child_table, child_row) = parent, child
+        column = child_table.foreign_key_to(parent_table.name)
+        if column is not None:
+            child_row[column] = parent_row.get(child_table.foreign_keys[column][1])
+            return
+
+        column = parent_table.foreign_key_to(child_table.name)
+        if column is not None:
+            # A many to one relation, the parent references the nested row
+            parent_row.setdefault(column, child_row.get(parent_table.foreign_keys[column][1]))
+            return
+
+        for junction in self.tables.values():
+            parent_column = junction.foreign_key_to(parent_table.name)
+            child_column = junction.foreign_key_to(child_table.name)
+            if parent_column is not None and child_column is not None and parent_column != child_column:
+                junction_row = {
+                    parent_column: parent_row.get(junction.foreign_keys[parent_column][1]),
+                    child_column: child_row.get(junction.foreign_keys[child_column][1]),
+                }
+                if junction.sequence is not None:
+                    junction_row[junction.primary_key] = _RowKey()
+                self._append(junction, junction_row, record_rows, added)
+                return
+
+
+def _insert_order(tables: Dict[str, _Table]) -> List[str]:
+    """The tables ordered so that every table comes after the tables it references."""
+    order: List[str] = []
+    visiting: set = set()
+
+    def visit(name: str) -> None:
+        # Tables referencing each other keep the order they are found in
+        if name in order or name in visiting:
+            return
+        visiting.add(name)
+        for target, _ in tables[name].foreign_keys.values():
+            if target in tables:
+                visit(target)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in tables:
+        visit(name)
+    return order
+
+
+def _parse_number(text: str) -> Decimal:
+    """
+    Parses a number formatted by the model, with thousands separators or currency symbols, like "1,234.50",
+    "1.234,50" or "$ 1 234". The last of "." and "," is the decimal separator when both are present, a lone
+    "," followed by three digits separates thousands, otherwise it is the decimal separator.
+    """
+    number = re.sub(r"[^\d.,+\-eE]", "", text)
+    if "," in number and "." in number:
+        thousands = "," if number.rindex(",") < number.rindex(".") else "."
+        number = number.replace(thousands, "")
+    elif number.count(",") > 1 or re.fullmatch(r"[+\-]?\d{1,3}(,\d{3})+", number):
+        number = number.replace(",", "")
+    elif number.count(".") > 1:
+        number = number.replace(".", "")
+    try:
+        parsed = Decimal(number.replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"Not a number: {text!r}")
+    if not parsed.is_finite():
+        raise ValueError(f"Not a finite number: {text!r}")
+    return parsed
+
+
+def _column_value(value: Any, column_type: str) -> Any:
+    """
+    Converts an extracted value to the type of its column.
+
+    Raises:
+        ValueError: If the value cannot be converted, like a text in a numeric column or 2.5 in an integer column.
+    """
+    if isinstance(value, _RowKey):
+        value = value.value
+    if is_na(value):
+        return None
+    if column_type in JSON_TYPES:
+        return Json(value)
+    if column_type == "ARRAY":
+        return [item for item in (value if isinstance(value, list) else [value]) if not is_na(item)]
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if column_type in NUMERIC_TYPES:
+        if isinstance(value, bool):
+            raise ValueError(f"Not a number: {value!r}")
+        if not isinstance(value, (int, float, Decimal)):
+            value = _parse_number(str(value))
+        elif not math.isfinite(value):
+            raise ValueError(f"Not a finite number: {value!r}")
+        if column_type in INTEGER_TYPES:
+            if value != int(value):
+                raise ValueError(f"Not an integer: {value!r}")
+            return int(value)
+        return value
+    if column_type == "boolean" and isinstance(value, str):
+        boolean = {"true": True, "yes": True, "false": False, "no": False}.get(value.strip().lower())
+        if boolean is None:
+            raise ValueError(f"Not a boolean: {value!r}")
+        return boolean
+    return value
+
+
+def _copy_text(value: Any) -> str:
+    """Formats a column value in the text format of COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, Json):
+        return json.dumps(value.adapted).translate(COPY_ESCAPES)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        items = ",".join(
+            "NULL" if item is None else '"' + str(item).replace("\\", "\\\\").replace('"', '\\"') + '"'
+            for item in value
+        )
+        return ("{" + items + "}").translate(COPY_ESCAPES)
+    return str(value).translate(COPY_ESCAPES)
+
+
 class DBClient(ABC):
     @abstractmethod
     def connect(self):
@@ -66,6 +350,169 @@ class PostgresDBClient(DBClient):
             self.conn.rollback()
             raise error  # Re-raise the exception to propagate it
 
+    def load_records(
+        self,
+        records: Iterable[Record],
+        batch_size: int = 10000,
+        method: str = "copy",
+        schema: str = "public",
+    ) -> Dict[str, int]:
+        """
+        Loads extracted records into the tables of the database, like the ones created by FileExtractor.create_tables.
+
+        The tables, their columns and their keys are read from the database, and the entities of the records
+        are mapped to them by name: an entity or a nested object goes to the table named after it, in singular
+        or plural, and its attributes to the columns with the same name. The rows are linked by the foreign
+        keys of the tables, with the ids of the new rows reserved from their sequences beforehand, so that
+        every table is written in bulk, identity columns included. Generated columns are left to the database. All the records are loaded in a single transaction, which is rolled
+        back if any batch fails. Numbers formatted with thousands separators or currency symbols are parsed,
+        the values that still do not match their column type are loaded as NULL and counted by column in a
+        warning, next to the values without a table or column.
+
+        Args:
+            records (Iterable[Record]): The records, like the ones returned by PDFParser.extract_entities_from_file.
+                They are consumed lazily, so an iterator of records is loaded without keeping them all in memory.
+            batch_size (int): The number of rows buffered before they are written. Defaults to 10000.
+            method (str): "copy" to write the rows with COPY FROM STDIN, or "values" to write them with multi-row
+                INSERT statements built by execute_values. Defaults to "copy".
+            schema (str): The database schema of the tables. Defaults to "public".
+
+        Returns:
+            Dict[str, int]: The number of rows loaded into each table.
+
+        Raises:
+            RuntimeError: If the client is not connected.
+        """
+        if self.conn is None or self.cursor is None or self.conn.closed:
+            raise RuntimeError("The PostgreSQL client is not connected, call connect() first.")
+        if method not in LOAD_METHODS:
+            raise ValueError(f"Invalid load method: {method}. Expected one of {LOAD_METHODS}.")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+
+        try:
+            tables = self._read_tables(schema)
+            if not tables:
+                raise ValueError(f"No tables found in the database schema {schema}.")
+            mapper = _RowMapper(tables)
+            order = _insert_order(tables)
+            loaded = {name: 0 for name in tables}
+
+            for record in records:
+                mapper.add_record(record)
+                if mapper.size >= batch_size:
+                    self._write_rows(mapper, order, schema, method, batch_size, loaded)
+            self._write_rows(mapper, order, schema, method, batch_size, loaded)
+            self.conn.commit()
+        except (Exception, psycopg2.Error) as error:
+            logger.error(f"Error loading records: {error}")
+            self.conn.rollback()
+            raise error
+
+        if mapper.skipped:
+            logger.warning(f"Values without a matching table or column were not loaded: {sorted(mapper.skipped)}")
+        if mapper.coerced:
+            logger.warning(f"Values not matching their column type were loaded as NULL, by column: {mapper.coerced}")
+        loaded = {name: count for name, count in loaded.items() if count}
+        logger.info(f"Loaded {sum(loaded.values())} rows into {len(loaded)} tables")
+        return loaded
+
+    def _read_tables(self, schema: str) -> Dict[str, _Table]:
+        """Reads the columns, the primary key with its sequence and the foreign keys of the tables of a schema."""
+        self.cursor.execute(
+            """
+            SELECT c.table_name, c.column_name, c.data_type, c.identity_generation, c.is_generated
+            FROM information_schema.columns c
+            JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+            WHERE c.table_schema = %s AND t.table_type = 'BASE TABLE'
+            ORDER BY c.table_name, c.ordinal_position
+            """,
+            (schema,),
+        )
+        tables: Dict[str, _Table] = {}
+        for row in self.cursor.fetchall():
+            table = tables.setdefault(row["table_name"], _Table(row["table_name"]))
+            # Generated columns are computed by the database and reject any value
+            if row["is_generated"] == "ALWAYS":
+                continue
+            table.columns[row["column_name"]] = row["data_type"]
+            if row["identity_generation"] == "ALWAYS":
+                table.always_identity.add(row["column_name"])
+
+        # Only the single column keys are used to link the rows
+        self.cursor.execute(
+            """
+            SELECT con.contype, src.relname AS table_name, att.attname AS column_name,
+                   dst.relname AS foreign_table, fatt.attname AS foreign_column,
+                   pg_get_serial_sequence(format('%%I.%%I', ns.nspname, src.relname), att.attname) AS sequence
+            FROM pg_constraint con
+            JOIN pg_class src ON src.oid = con.conrelid
+            JOIN pg_namespace ns ON ns.oid = src.relnamespace
+            JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1]
+            LEFT JOIN pg_class dst ON dst.oid = con.confrelid
+            LEFT JOIN pg_attribute fatt ON fatt.attrelid = con.confrelid AND fatt.attnum = con.confkey[1]
+            WHERE ns.nspname = %s AND con.contype IN ('p', 'f') AND array_length(con.conkey, 1) = 1
+            """,
+            (schema,),
+        )
+        for row in self.cursor.fetchall():
+            table = tables.get(row["table_name"])
+            if table is None:
+                continue
+            if row["contype"] == "p":
+                table.primary_key = row["column_name"]
+                table.sequence = row["sequence"]
+            elif row["foreign_table"] in tables:
+                table.foreign_keys[row["column_name"]] = (row["foreign_table"], row["foreign_column"])
+        return tables
+
+    @staticmethod
+    def _row_value(mapper: _RowMapper, table: _Table, row: Dict[str, Any], column: str) -> Any:
+        try:
+            return _column_value(row.get(column), table.columns[column])
+        except ValueError:
+            name = f"{table.name}.{column}"
+            mapper.coerced[name] = mapper.coerced.get(name, 0) + 1
+            return None
+
+    def _write_rows(self, mapper: _RowMapper, order: List[str], schema: str, method: str, batch_size: int, loaded: Dict[str, int]) -> None:
+        """Writes the rows buffered by the mapper, the referenced tables first."""
+        # The ids of the new rows are reserved up front, so the rows referencing them are written in bulk as well
+        for name, rows in mapper.rows.items():
+            table = mapper.tables[name]
+            keys = [row[table.primary_key] for row in rows if isinstance(row.get(table.primary_key), _RowKey)]
+            if keys:
+                self.cursor.execute("SELECT nextval(%s) AS id FROM generate_series(1, %s)", (table.sequence, len(keys)))
+                for key, reserved in zip(keys, self.cursor.fetchall()):
+                    key.value = reserved["id"]
+
+        for name in order:
+            rows = mapper.rows[name]
+            table = mapper.tables[name]
+            used = set().union(*rows)
+            columns = [column for column in table.columns if column in used]
+            if not columns:
+                continue
+
+            values = [[self._row_value(mapper, table, row, column) for column in columns] for row in rows]
+            target = sql.SQL("{}.{} ({})").format(
+                sql.Identifier(schema), sql.Identifier(name), sql.SQL(", ").join(map(sql.Identifier, columns))
+            )
+            if method == "copy":
+                buffer = io.StringIO()
+                for row in values:
+                    buffer.write("\t".join(map(_copy_text, row)))
+                    buffer.write("\n")
+                buffer.seek(0)
+                self.cursor.copy_expert(sql.SQL("COPY {} FROM STDIN").format(target), buffer)
+            else:
+                # The reserved ids come from the identity sequence, COPY writes them regardless of GENERATED ALWAYS
+                overriding = sql.SQL(" OVERRIDING SYSTEM VALUE" if table.always_identity.intersection(columns) else "")
+                query = sql.SQL("INSERT INTO {}{} VALUES %s").format(target, overriding)
+                execute_values(self.cursor, query, values, page_size=batch_size)
+            loaded[name] += len(rows)
+        mapper.clear()
+
 
 class Neo4jDBClient(DBClient):
     def __init__(self, uri=None, user=None, password=None):
@@ -1,13 +1,15 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from .primitives import Entity, Relation
+from typing import List, Dict, Any, Iterable, Optional
+from .primitives import Entity, Relation, Record
 from .parsers.base_parser import BaseParser
 from .parsers.prompts import DELETE_PROMPT, UPDATE_SCHEMA_PROMPT, CREATE_TABLES_PROMPT
-from .parsers.prompts import UPDATE_SCHEMA_PROMPT
+from .parsers.schema_merge import merge_json_schemas
 from .db_client import DBClient, PostgresDBClient
 import json
 from langgraph.graph import StateGraph, END, START
+from langchain_core.runnables import RunnableLambda
 from typing import Literal
 from scrapontologies.db_client import PostgresDBClient
 from pydantic import BaseModel
@@ -75,6 +77,10 @@ class Extractor(ABC):
     def create_tables(self):
         pass
 
+    @abstractmethod
+    def load_records(self, records: Iterable[Record], batch_size: int = 10000, method: str = "copy") -> Dict[str, int]:
+        pass
+
 class FileExtractor(Extractor):
     def __init__(self, file_path: str, parser: BaseParser, db_client: Optional[DBClient] = None):
         """
@@ -102,6 +108,18 @@ class FileExtractor(Extractor):
         new_entities = self.parser.extract_entities_schema(self.file_path, prompt)
         return new_entities
 
+    async def aextract_entities_schema(self, prompt: Optional[str] = None) -> List[Entity]:
+        """
+        Asynchronously extract entities from the file.
+
+        Args:
+            prompt (Optional[str]): An optional prompt to guide the extraction.
+
+        Returns:
+            List[Entity]: A list of extracted entities.
+        """
+        return await self.parser.aextract_entities_schema(self.file_path, prompt)
+
     def extract_relations_schema(self, prompt: Optional[str] = None) -> List[Relation]:
         """
         Extract relations from the file.
@@ -124,6 +142,16 @@ class FileExtractor(Extractor):
         self.parser.generate_json_schema(self.file_path)
         return self.parser.get_json_schema()
 
+    async def agenerate_entities_json_schema(self) -> Dict[str, Any]:
+        """
+        Asynchronously generate a JSON schema for the entities.
+
+        Returns:
+            Dict[str, Any]: The generated JSON schema.
+        """
+        await self.parser.agenerate_json_schema(self.file_path)
+        return self.parser.get_json_schema()
+
     def delete_entity_or_relation(self, item_description: str) -> None:
         entities_ids = [e.id for e in self.parser.get_entities_schema()]
         relations_ids = [(r.source, r.target, r.name) for r in self.parser.get_relations_schema()]
@@ -197,53 +225,16 @@ class FileExtractor(Extractor):
         Args:
             other_schema (Dict[str, Any]): The schema to merge with.
         """
-        def _merge_json_schemas(self, schema1: Dict[str, Any], schema2: Dict[str, Any]) -> Dict[str, Any]:
-            """
-            Merges two JSON schemas using an API call to OpenAI.
-
-            Args:
-                schema1 (Dict[str, Any]): The first JSON schema.
-                schema2 (Dict[str, Any]): The second JSON schema.
-
-            Returns:
-                Dict[str, Any]: The merged JSON schema.
-            """
-
-            # Initialize the LLMClient (assuming the API key is set in the environment)
-
-            llm_client = self.parser.llm_client
-
-            # Prepare the prompt
-            prompt = UPDATE_SCHEMA_PROMPT.format(
-                existing_schema=json.dumps(schema1, indent=2),
-                new_schema=json.dumps(schema2, indent=2)
-            )
-
-            # Get the response from the LLM
-            response = llm_client.get_response(prompt)
-
-            # Extract the JSON schema from the response
-            response = response.strip().strip('```json').strip('```')
-            try:
-                merged_schema = json.loads(response)
-                return merged_schema
-            except json.JSONDecodeError as e:
-                logger.error(f"JSONDecodeError: {e}")
-                logger.error("Error: Unable to parse the LLM response.")
-                return schema1  # Return the original schema in case of an error
-
-
         if not self.parser.get_json_schema():
             logger.error("No JSON schema found in the parser.")
             return
 
-        # Merge JSON schemas
-        merged_schema = _merge_json_schemas(self, self.get_json_schema(), other_schema)
+        # Merge JSON schemas structurally, only the conflicts are reconciled by the LLM
+        merged_schema = merge_json_schemas(self.get_json_schema(), other_schema, self.parser.llm_client)
 
-        self.set_json_schema(merged_schema)
-        # Re-extract entities and relations based on the merged schema
-        new_entities = self.parser.extract_entities_schema_from_json_schema(merged_schema)
-        new_relations = self.parser.extract_relations_schema()
+        # Re-derive the entities from the merged schema, which also makes it the parser's schema, then the relations
+        self.parser.extract_entities_schema_from_json_schema(merged_schema)
+        self.parser.extract_relations_schema()
 
         return self.get_json_schema()
 
@@ -305,6 +296,59 @@ class FileExtractor(Extractor):
         """
         Creates the tables in a relational database.
         """
+        graph, state_create_tables = self._build_create_tables_graph()
+
+        self.db_client.connect()
+
+        # Execute the graph
+        graph.invoke(state_create_tables)
+        self.db_client.disconnect()
+        logger.info("Tables created successfully.")
+
+    async def acreate_tables(self):
+        """
+        Asynchronously creates the tables in a relational database.
+        """
+        graph, state_create_tables = self._build_create_tables_graph()
+
+        # psycopg2 is blocking, the database calls run in a thread to keep the event loop free
+        await asyncio.to_thread(self.db_client.connect)
+
+        # Execute the graph
+        await graph.ainvoke(state_create_tables)
+        await asyncio.to_thread(self.db_client.disconnect)
+        logger.info("Tables created successfully.")
+
+    def load_records(self, records: Iterable[Record], batch_size: int = 10000, method: str = "copy") -> Dict[str, int]:
+        """
+        Loads extracted records into the tables created by create_tables.
+
+        Args:
+            records (Iterable[Record]): The records, like the ones returned by the parser's extract_entities_from_file.
+            batch_size (int): The number of rows buffered before they are written. Defaults to 10000.
+            method (str): "copy" to write the rows with COPY FROM STDIN, or "values" to write them with
+                execute_values. Defaults to "copy".
+
+        Returns:
+            Dict[str, int]: The number of rows loaded into each table.
+        """
+        if not isinstance(self.db_client, PostgresDBClient):
+            logger.error("DB client is not a relational database client.")
+            raise ValueError("DB client is not a relational database client.")
+
+        self.db_client.connect()
+        try:
+            return self.db_client.load_records(records, batch_size=batch_size, method=method)
+        finally:
+            self.db_client.disconnect()
+
+    def _build_create_tables_graph(self):
+        """
+        Builds the graph used to generate and execute the SQL code for the tables.
+
+        Returns:
+            Tuple[Any, BaseModel]: The compiled graph and its initial state.
+        """
         # checks if the db_client is a PostgresDBClient
         if not isinstance(self.db_client, PostgresDBClient):
             logger.error("DB client is not a relational database client.")
@@ -313,8 +357,6 @@ class FileExtractor(Extractor):
         # get the json schema
         json_schema = self.get_json_schema()
 
-        self.db_client.connect()
-
         class StateCreateTables(BaseModel):
             json_schema: Optional[str] = None
             sql_code: Optional[str] = None
@@ -325,24 +367,24 @@ class FileExtractor(Extractor):
         state_create_tables = StateCreateTables()
         state_create_tables.json_schema = str(json_schema)
 
-        
-        def generate_sql_code(state: StateCreateTables, *_) -> StateCreateTables:
-            if state.sql_code is None:
-                create_tables_prompt = CREATE_TABLES_PROMPT.format(
-                    json_schema=json.dumps(state.json_schema, indent=2)
-                )
-                sql_code = self.parser.llm_client.get_response(create_tables_prompt)
-                sql_code = sql_code.replace("```sql", "").replace("```", "").strip()
-                state.sql_code = sql_code
-            else:
-                create_tables_prompt_fixed = CREATE_TABLES_PROMPT.format(
+        def sql_code_prompt(state: StateCreateTables) -> str:
+            create_tables_prompt = CREATE_TABLES_PROMPT.format(
                 json_schema=json.dumps(state.json_schema, indent=2)
-                ) + "You generated previously the following erroneous code: " + state.sql_code + "With the following error: " + state.error + " Please fix it, if the relation already exists in the database please just ignore it and do not create it again."
+            )
+            if state.sql_code is None:
+                return create_tables_prompt
+
+            state.retry_count += 1
+            return create_tables_prompt + "You generated previously the following erroneous code: " + state.sql_code + "With the following error: " + state.error + " Please fix it, if the relation already exists in the database please just ignore it and do not create it again."
+
+        def generate_sql_code(state: StateCreateTables, *_) -> StateCreateTables:
+            sql_code = self.parser.llm_client.get_response(sql_code_prompt(state))
+            state.sql_code = sql_code.replace("```sql", "").replace("```", "").strip()
+            return state
 
-                state.retry_count += 1
-                sql_code = self.parser.llm_client.get_response(create_tables_prompt_fixed)
-                sql_code = sql_code.replace("```sql", "").replace("```", "").strip()
-                state.sql_code = sql_code
+        async def agenerate_sql_code(state: StateCreateTables, *_) -> StateCreateTables:
+            sql_code = await self.parser.llm_client.aget_response(sql_code_prompt(state))
+            state.sql_code = sql_code.replace("```sql", "").replace("```", "").strip()
             return state
 
         def execute_sql_code(state: StateCreateTables, *_) -> Literal["success", "failure"]:
@@ -355,7 +397,10 @@ class FileExtractor(Extractor):
                 state.error = str(e)
                 state.retry = True
                 return state
-        
+
+        async def aexecute_sql_code(state: StateCreateTables, *_) -> StateCreateTables:
+            return await asyncio.to_thread(execute_sql_code, state)
+
         def retry_or_not(state: StateCreateTables, *_):
             if state.retry and state.retry_count < 2:
                 return "generate_sql_code"
@@ -366,8 +411,8 @@ class FileExtractor(Extractor):
         workflow = StateGraph(StateCreateTables)
 
         # Add nodes
-        workflow.add_node("generate_sql_code", generate_sql_code)
-        workflow.add_node("execute_sql_code", execute_sql_code)
+        workflow.add_node("generate_sql_code", RunnableLambda(generate_sql_code, afunc=agenerate_sql_code))
+        workflow.add_node("execute_sql_code", RunnableLambda(execute_sql_code, afunc=aexecute_sql_code))
 
         # Add edges
         workflow.add_edge(START, "generate_sql_code")
@@ -379,12 +424,7 @@ class FileExtractor(Extractor):
         workflow.add_edge("execute_sql_code", END)
 
         # Compile the graph
-        graph = workflow.compile()
-
-        # Execute the graph
-        graph.invoke(state_create_tables)
-        self.db_client.disconnect()
-        logger.info("Tables created successfully.")
+        return workflow.compile(), state_create_tables
 
     def extract_entities(self):
         return self.parser.extract_entities_schema()
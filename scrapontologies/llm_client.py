@@ -1,14 +1,72 @@
 import requests
+import httpx
+import asyncio
+import json
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+from typing import Dict, Any, Optional, List, Tuple, Type, Union
 from typing import Any, Callable
+from pydantic import BaseModel
 from pydantic_core import CoreSchema, core_schema
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain.chat_models import init_chat_model
+from .response_cache import ResponseCache, make_cache_key
+from .batch import BATCH_BACKENDS
+from .scheduler import RequestScheduler, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+# Connection pool settings used when they are not overridden by http_config
+DEFAULT_HTTP_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "timeout": 120.0,
+}
+
+# Providers whose langchain chat model accepts shared httpx clients
+HTTP_CLIENT_PROVIDERS = {"openai", "azure_openai"}
+
+# Providers whose langchain chat model retries failed requests through its SDK, which the scheduler replaces
+SDK_RETRY_PROVIDERS = {"openai", "azure_openai", "anthropic", "google_genai", "mistralai", "groq"}
+
+
+class _HTTPPools:
+    """
+    The shared HTTP pools of a client and the number of requests using them, so that pools replaced
+    while requests are in flight are closed when the last of these requests completes.
+    """
+
+    def __init__(self, http_config: Dict[str, Any]):
+        limits = httpx.Limits(
+            max_connections=http_config["max_connections"],
+            max_keepalive_connections=http_config["max_keepalive_connections"],
+            keepalive_expiry=http_config["keepalive_expiry"],
+        )
+        timeout = httpx.Timeout(http_config["timeout"])
+        self.client = httpx.Client(limits=limits, timeout=timeout)
+        self.async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._users += 1
+
+    def release(self) -> bool:
+        """Ends a request using the pools, returns whether they are replaced and no longer used."""
+        with self._lock:
+            self._users -= 1
+            return self._retired and self._users == 0
+
+    def retire(self) -> bool:
+        """Marks the pools as replaced, returns whether no request uses them."""
+        with self._lock:
+            self._retired = True
+            return self._users == 0
+
 
 class LLMClient:
     def __init__(
@@ -18,6 +76,9 @@ class LLMClient:
         model: str,
         base_url: Optional[str] = None,
         llm_config: Optional[Dict[str, Any]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        http_config: Optional[Dict[str, Any]] = None,
+        scheduler: Optional[RequestScheduler] = None,
     ):
         """
         Initializes the LLMClient with API credentials and settings.
@@ -28,15 +89,37 @@ class LLMClient:
             model (str): The model name to use for the language model.
             base_url (str | None): The base URL for the API. Defaults to None. It will be defaulted to the provider's base URL if not provided.
             llm_config (Dict[str, Any] | None): Additional configuration for the language model. It will be passed to the creation of the langchain language model. When using the Azure OpenAI provider, it should contain the "azure_deployment" key.
+            response_cache (ResponseCache | None): An optional cache of the responses, keyed by the prompt, the image, the provider, the model, the base_url and the JSON values of the llm_config. Defaults to None.
+            http_config (Dict[str, Any] | None): The settings of the HTTP connection pool shared by all the requests: "max_connections", "max_keepalive_connections", "keepalive_expiry" (seconds) and "timeout" (seconds). Missing keys fall back to DEFAULT_HTTP_CONFIG. The pool is used by the providers in HTTP_CLIENT_PROVIDERS, the others keep the pool of their own SDK client.
+            scheduler (RequestScheduler | None): The scheduler applying the rate limits, the retries with backoff and the adaptive concurrency to the requests. It can be shared by the clients of the same provider and model. The SDK retries of the providers in SDK_RETRY_PROVIDERS are disabled, unless llm_config sets max_retries. Defaults to a RequestScheduler without rate limits.
         """
         self._api_key = api_key
         self._model = model
         self._provider_name = provider_name.lower()
         self._llm_config = llm_config if llm_config is not None else {}
         self._base_url = base_url
-        self._llm = self._create_llm(
-            provider_name, api_key, model=model, base_url=base_url, llm_config=llm_config
+        self._response_cache = response_cache
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._http_config = {**DEFAULT_HTTP_CONFIG, **(http_config or {})}
+        self._http_pools = _HTTPPools(self._http_config)
+        self._closing_tasks = set()
+        self._rebuild_llm()
+
+    def _http_client_kwargs(self) -> Dict[str, Any]:
+        if self._provider_name not in HTTP_CLIENT_PROVIDERS:
+            return {}
+        return {"http_client": self._http_pools.client, "http_async_client": self._http_pools.async_client}
+
+    def _rebuild_llm(self) -> None:
+        """Builds the language model and the chain reused by every request from the current configuration."""
+        # The scheduler retries the requests, the SDK retries would multiply its attempts. Explicit clients
+        # and retries in llm_config take precedence over the shared pool and the scheduler
+        sdk_retries = {"max_retries": 0} if self._provider_name in SDK_RETRY_PROVIDERS else {}
+        llm_config = {**self._http_client_kwargs(), **sdk_retries, **self._llm_config}
+        llm = self._create_llm(
+            self._provider_name, self._api_key, model=self._model, base_url=self._base_url, llm_config=llm_config
         )
+        self.set_llm(llm)
 
     def _create_llm(
         self,
@@ -51,7 +134,7 @@ class LLMClient:
             model_provider=provider_name,
             api_key=api_key,
             base_url=base_url,
-            **llm_config,
+            **(llm_config or {}),
         )
 
     def get_api_key(self) -> str:
@@ -59,59 +142,319 @@ class LLMClient:
 
     def set_api_key(self, api_key: str) -> None:
         self._api_key = api_key
+        self._rebuild_llm()
 
     def get_model(self) -> str:
         return self._model
 
     def set_model(self, model: str) -> None:
         self._model = model
+        self._rebuild_llm()
 
     def get_provider_name(self) -> str:
         return self._provider_name
 
     def set_provider_name(self, provider: str) -> None:
-        self._provider_name = provider
+        self._provider_name = provider.lower()
+        self._rebuild_llm()
 
     def get_llm_config(self) -> Dict[str, Any]:
         return self._llm_config
 
     def set_llm_config(self, llm_config: Dict[str, Any]) -> None:
-        self._llm_config = llm_config
+        self._llm_config = llm_config if llm_config is not None else {}
+        self._rebuild_llm()
 
     def get_base_url(self) -> Optional[str]:
         return self._base_url
 
     def set_base_url(self, base_url: Optional[str]) -> None:
         self._base_url = base_url
+        self._rebuild_llm()
+
+    def get_response_cache(self) -> Optional[ResponseCache]:
+        return self._response_cache
+
+    def set_response_cache(self, response_cache: Optional[ResponseCache]) -> None:
+        self._response_cache = response_cache
+
+    def get_scheduler(self) -> RequestScheduler:
+        return self._scheduler
+
+    def set_scheduler(self, scheduler: RequestScheduler) -> None:
+        self._scheduler = scheduler
 
     def get_llm(self) -> BaseChatModel:
         return self._llm
 
     def set_llm(self, llm: BaseChatModel) -> None:
         self._llm = llm
+        self._chain = llm | StrOutputParser()
+        self._structured_chains = {}
+
+    def get_http_config(self) -> Dict[str, Any]:
+        return self._http_config
 
-    def get_response(self, prompt: str, image_url: Optional[str] = None) -> str:
+    def set_http_config(self, http_config: Dict[str, Any]) -> None:
+        http_config = {**DEFAULT_HTTP_CONFIG, **http_config}
+        if http_config == self._http_config:
+            # The pools already have these limits, their open connections are kept
+            return
+
+        # The requests in flight keep the chain they started with, the replaced pools are closed once they complete
+        old_pools = self._http_pools
+        self._http_config = http_config
+        self._http_pools = _HTTPPools(self._http_config)
+        self._rebuild_llm()
+        if old_pools.retire():
+            self._close_http_pools(old_pools)
+
+    def _acquire_chain(self, chain=None):
+        """The pools and the chain a request uses until it completes, the current chain by default."""
+        pools = self._http_pools
+        pools.acquire()
+        return pools, chain if chain is not None else self._chain
+
+    def _release_pools(self, pools: _HTTPPools) -> None:
+        if pools.release():
+            self._close_http_pools(pools)
+
+    def _close_http_pools(self, pools: _HTTPPools) -> None:
+        """Closes HTTP pools, the async one on the running event loop if there is one."""
+        pools.client.close()
+        http_async_client = pools.async_client
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        try:
+            if loop is not None:
+                task = loop.create_task(http_async_client.aclose())
+                # Keep a reference until the task completes, the loop only keeps weak ones
+                self._closing_tasks.add(task)
+                task.add_done_callback(self._closing_tasks.discard)
+            else:
+                asyncio.run(http_async_client.aclose())
+        except Exception as e:
+            logger.warning(f"Could not close the async HTTP pool: {e}")
+
+    def close(self) -> None:
+        """Closes the connections of both shared HTTP pools, the async one on the running event loop if there is one."""
+        self._close_http_pools(self._http_pools)
+
+    async def aclose(self) -> None:
+        """Closes the connections of both shared HTTP pools."""
+        self._http_pools.client.close()
+        await self._http_pools.async_client.aclose()
+
+    def _cache_key(self, prompt: str, image_url: Optional[Union[str, List[str]]]) -> str:
+        return make_cache_key(prompt, image_url, self._provider_name, self._model, self._llm_config, self._base_url)
+
+    def _estimate_tokens(self, prompt: str, image_url: Optional[Union[str, List[str]]]) -> int:
+        if not image_url:
+            num_images = 0
+        else:
+            num_images = 1 if isinstance(image_url, str) else sum(isinstance(part, str) for part in image_url)
+        return estimate_tokens(prompt, num_images, self._llm_config.get("max_tokens") or 0)
+
+    def _build_messages(self, prompt: str, image_url: Optional[Union[str, List[str]]] = None) -> List[Dict[str, Any]]:
+        messages = [{"role": "user", "content": prompt}]
+
+        if image_url:
+            image_urls = [image_url] if isinstance(image_url, str) else image_url
+            # Assuming the API supports image URLs in this format, text parts in the list are kept in place to label the images
+            messages[0]["content"] = [{"type": "text", "text": prompt}] + [
+                {"type": "image_url", "image_url": {"url": url}} if isinstance(url, str) else url for url in image_urls
+            ]
+        return messages
+
+    def get_response(self, prompt: str, image_url: Optional[Union[str, List[str]]] = None) -> str:
         """Get a response from the language model.
 
         Args:
             prompt (str): The prompt to send to the language model.
-            image_url (Optional[str]): An optional image URL to include in the prompt.
+            image_url (Optional[Union[str, List[str]]]): An optional image URL, or a list of image URLs, to include in the prompt.
+                The list may interleave text parts, {"type": "text", "text": ...}, labeling the images that follow them.
 
         Returns:
             str: The response from the language model.
         """
-        messages = [{"role": "user", "content": prompt}]
+        if self._response_cache is not None:
+            cache_key = self._cache_key(prompt, image_url)
+            cached_response = self._response_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
 
-        if image_url:
-            # Assuming the API supports image URLs in this format
-            messages[0]["content"] = [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {"url": image_url}},
-            ]
+        messages = self._build_messages(prompt, image_url)
+
+        pools, chain = self._acquire_chain()
+        try:
+            response = self._scheduler.run(lambda: chain.invoke(messages), self._estimate_tokens(prompt, image_url))
+        except requests.RequestException as e:
+            logger.error(f"RequestException: {e}")
+            raise
+        finally:
+            self._release_pools(pools)
+
+        if self._response_cache is not None:
+            self._response_cache.set(cache_key, response)
+        return response
+
+    async def aget_response(self, prompt: str, image_url: Optional[Union[str, List[str]]] = None) -> str:
+        """Asynchronously get a response from the language model.
+
+        Args:
+            prompt (str): The prompt to send to the language model.
+            image_url (Optional[Union[str, List[str]]]): An optional image URL, or a list of image URLs, to include in the prompt.
+                The list may interleave text parts, {"type": "text", "text": ...}, labeling the images that follow them.
+
+        Returns:
+            str: The response from the language model.
+        """
+        if self._response_cache is not None:
+            cache_key = self._cache_key(prompt, image_url)
+            cached_response = self._response_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
 
+        messages = self._build_messages(prompt, image_url)
+
+        pools, chain = self._acquire_chain()
         try:
-            chain = self._llm | StrOutputParser()
-            return chain.invoke(messages)
+            response = await self._scheduler.arun(lambda: chain.ainvoke(messages), self._estimate_tokens(prompt, image_url))
         except requests.RequestException as e:
             logger.error(f"RequestException: {e}")
             raise
+        finally:
+            self._release_pools(pools)
+
+        if self._response_cache is not None:
+            self._response_cache.set(cache_key, response)
+        return response
+
+    def _structured_chain(self, schema: Type[BaseModel]):
+        # The chains are built once per output schema, with_structured_output uses the provider's native mode
+        chain = self._structured_chains.get(schema)
+        if chain is None:
+            chain = self._llm.with_structured_output(schema)
+            self._structured_chains[schema] = chain
+        return chain
+
+    def _structured_cache_key(self, prompt: str, schema: Type[BaseModel]) -> str:
+        return self._cache_key(f"{schema.__name__}:{json.dumps(schema.model_json_schema(), sort_keys=True)}\n{prompt}", None)
+
+    def get_structured_response(self, prompt: str, schema: Type[BaseModel]) -> BaseModel:
+        """Get a response from the language model, parsed into a pydantic model with the provider's structured output.
+
+        Args:
+            prompt (str): The prompt to send to the language model.
+            schema (Type[BaseModel]): The pydantic model of the response.
+
+        Returns:
+            BaseModel: The response, as an instance of the schema.
+        """
+        if self._response_cache is not None:
+            cache_key = self._structured_cache_key(prompt, schema)
+            cached_response = self._response_cache.get(cache_key)
+            if cached_response is not None:
+                return schema.model_validate_json(cached_response)
+
+        messages = self._build_messages(prompt)
+        pools, chain = self._acquire_chain(self._structured_chain(schema))
+        try:
+            response = self._scheduler.run(lambda: chain.invoke(messages), self._estimate_tokens(prompt, None))
+        finally:
+            self._release_pools(pools)
+
+        if self._response_cache is not None:
+            self._response_cache.set(cache_key, response.model_dump_json())
+        return response
+
+    async def aget_structured_response(self, prompt: str, schema: Type[BaseModel]) -> BaseModel:
+        """Asynchronous version of get_structured_response.
+
+        Args:
+            prompt (str): The prompt to send to the language model.
+            schema (Type[BaseModel]): The pydantic model of the response.
+
+        Returns:
+            BaseModel: The response, as an instance of the schema.
+        """
+        if self._response_cache is not None:
+            cache_key = self._structured_cache_key(prompt, schema)
+            cached_response = self._response_cache.get(cache_key)
+            if cached_response is not None:
+                return schema.model_validate_json(cached_response)
+
+        messages = self._build_messages(prompt)
+        pools, chain = self._acquire_chain(self._structured_chain(schema))
+        try:
+            response = await self._scheduler.arun(lambda: chain.ainvoke(messages), self._estimate_tokens(prompt, None))
+        finally:
+            self._release_pools(pools)
+
+        if self._response_cache is not None:
+            self._response_cache.set(cache_key, response.model_dump_json())
+        return response
+
+    def get_batch_responses(
+        self,
+        prompts: List[Tuple[str, Optional[Union[str, List[str]]]]],
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+    ) -> List[Optional[str]]:
+        """Get the responses to many prompts with batch jobs of the provider.
+
+        Batch jobs trade latency for cost and throughput: they may take up to the provider's
+        completion window to finish. The requests are sent as a single job, or as several jobs polled
+        together when they exceed the provider's request count or size limits. Cached responses are
+        not submitted again.
+
+        Args:
+            prompts (List[Tuple[str, Optional[Union[str, List[str]]]]]): The prompts and their optional image URLs.
+            poll_interval (float): The number of seconds between two status checks of the jobs. Defaults to 30.
+            timeout (Optional[float]): The maximum number of seconds to wait for the jobs. Defaults to no limit.
+
+        Returns:
+            List[Optional[str]]: The responses in request order, None for the requests that failed.
+
+        Raises:
+            ValueError: If the provider does not support batch jobs.
+        """
+        if self._provider_name not in BATCH_BACKENDS:
+            raise ValueError(
+                f"Batch mode is not supported for provider {self._provider_name}. "
+                f"Supported providers: {', '.join(BATCH_BACKENDS)}"
+            )
+
+        responses: List[Optional[str]] = [None] * len(prompts)
+        pending = {}
+        for index, (prompt, image_url) in enumerate(prompts):
+            if self._response_cache is not None:
+                cached_response = self._response_cache.get(self._cache_key(prompt, image_url))
+                if cached_response is not None:
+                    responses[index] = cached_response
+                    continue
+            pending[f"request-{index}"] = index
+
+        if not pending:
+            return responses
+
+        pools, _ = self._acquire_chain()
+        try:
+            backend = BATCH_BACKENDS[self._provider_name](
+                pools.client, self._api_key, self._model, base_url=self._base_url, llm_config=self._llm_config
+            )
+            batch_requests = [
+                (custom_id, self._build_messages(*prompts[index])) for custom_id, index in pending.items()
+            ]
+            batch_responses = backend.run(batch_requests, poll_interval=poll_interval, timeout=timeout)
+        finally:
+            self._release_pools(pools)
+
+        for custom_id, index in pending.items():
+            response = batch_responses.get(custom_id)
+            responses[index] = response
+            if response is not None and self._response_cache is not None:
+                self._response_cache.set(self._cache_key(*prompts[index]), response)
+        return responses
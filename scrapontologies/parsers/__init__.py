@@ -1,2 +1,4 @@
 from .pdf_parser import PDFParser
-from .base_parser import BaseParser
\ No newline at end of file
+from .base_parser import BaseParser
+from .page_cache import PageCache
+from .schema_store import SchemaStore
@@ -34,6 +34,33 @@ class BaseParser(ABC):
         """
         pass
 
+    @abstractmethod
+    async def aextract_entities_schema(self, file_path: str, prompt: Optional[str] = None) -> List[Entity]:
+        """
+        Asynchronously extracts entities from the given file.
+
+        Args:
+            file_path (str): The path to the file.
+            prompt (Optional[str]): An optional prompt to guide the extraction.
+
+        Returns:
+            List[Entity]: A list of extracted entities.
+        """
+        pass
+
+    @abstractmethod
+    def extract_entities_schema_from_json_schema(self, json_schema: Dict[str, Any]) -> List[Entity]:
+        """
+        Derives the entities from a JSON schema, without reading any file.
+
+        Args:
+            json_schema (Dict[str, Any]): The JSON schema.
+
+        Returns:
+            List[Entity]: A list of entities.
+        """
+        pass
+
     @abstractmethod
     def extract_relations_schema(self, file_path: Optional[str] = None, prompt: Optional[str] = None) -> List[Relation]:
         """
@@ -61,6 +88,19 @@ class BaseParser(ABC):
         """
         pass
 
+    @abstractmethod
+    async def agenerate_json_schema(self, file_path: str) -> Dict[str, Any]:
+        """
+        Asynchronously generates a JSON schema for the entities based on the given file.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            Dict[str, Any]: The generated JSON schema.
+        """
+        pass
+
     @abstractmethod
     def get_entities_schema(self) -> List[Entity]:
         """
@@ -116,4 +156,8 @@ class BaseParser(ABC):
 
     @abstractmethod
     def extract_entities_from_file(self, file_path: Union[str, List[str]]):
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def aextract_entities_from_file(self, file_path: Union[str, List[str]]):
+        pass
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 digest of a file's content.
+
+    Args:
+        file_path (str): The path to the file.
+        chunk_size (int): The number of bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PageCache:
+    """
+    A cache of encoded page images keyed by the PDF content hash, the page number and the render settings.
+
+    Entries are kept in memory up to max_pages, evicting the least recently used first, and
+    optionally persisted in a directory so that they survive the process.
+    """
+
+    def __init__(self, max_pages: Optional[int] = 1024, directory: Optional[str] = None):
+        """
+        Initializes the PageCache.
+
+        Args:
+            max_pages (Optional[int]): The maximum number of pages kept in memory. Defaults to 1024, None means no limit.
+            directory (Optional[str]): An optional directory where the pages are persisted. Defaults to None (memory only).
+        """
+        self.max_pages = max_pages
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_hash: str, page_num: int, render_settings: Tuple[Any, ...]) -> str:
+        """
+        Builds the key of a page.
+
+        Args:
+            file_hash (str): The content hash of the PDF file.
+            page_num (int): The 1-based page number.
+            render_settings (Tuple[Any, ...]): The settings the page is rendered and encoded with.
+
+        Returns:
+            str: The key of the page.
+        """
+        settings_hash = hashlib.sha256(repr(render_settings).encode("utf-8")).hexdigest()[:16]
+        return f"{file_hash}-{page_num}-{settings_hash}"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieves an encoded page.
+
+        Args:
+            key (str): The key of the page.
+
+        Returns:
+            Optional[str]: The base64 encoded page image, None on a miss.
+        """
+        with self._lock:
+            base64_image = self._pages.get(key)
+            if base64_image is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return base64_image
+
+        base64_image = self._read_from_disk(key)
+        with self._lock:
+            if base64_image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store_in_memory(key, base64_image)
+        return base64_image
+
+    def set(self, key: str, base64_image: str) -> None:
+        """
+        Stores an encoded page.
+
+        Args:
+            key (str): The key of the page.
+            base64_image (str): The base64 encoded page image.
+        """
+        with self._lock:
+            self._store_in_memory(key, base64_image)
+        self._write_to_disk(key, base64_image)
+
+    def clear(self) -> None:
+        """Removes every page from memory and from the cache directory."""
+        with self._lock:
+            self._pages.clear()
+        if self.directory is not None:
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(".b64"):
+                    os.unlink(os.path.join(self.directory, file_name))
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def _store_in_memory(self, key: str, base64_image: str) -> None:
+        self._pages[key] = base64_image
+        self._pages.move_to_end(key)
+        if self.max_pages is not None:
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def _page_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.b64")
+
+    def _read_from_disk(self, key: str) -> Optional[str]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._page_path(key), "r") as page_file:
+                return page_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_to_disk(self, key: str, base64_image: str) -> None:
+        if self.directory is None:
+            return
+        try:
+            # Write to a temporary file first so that concurrent readers never see a partial page
+            with tempfile.NamedTemporaryFile("w", dir=self.directory, suffix=".tmp", delete=False) as temp_file:
+                temp_file.write(base64_image)
+            os.replace(temp_file.name, self._page_path(key))
+        except OSError as e:
+            logger.error(f"Error writing page {key} to the cache: {e}")
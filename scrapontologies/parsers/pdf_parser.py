@@ -1,21 +1,40 @@
 from typing import List, Dict, Any, Optional, Literal, Union
 from .base_parser import BaseParser
-from ..primitives import Entity, Relation, Record
+from ..primitives import Entity, Relation, Record, ExtractionResult
 import base64
+import io
 import os
 import tempfile
 import json
-from .prompts import JSON_SCHEMA_PROMPT, RELATIONS_PROMPT, UPDATE_ENTITIES_PROMPT, EXTRACT_ENTITIES_CODE_PROMPT, FIX_CODE_PROMPT, EXTRACT_DATA_PROMPT
+from .prompts import JSON_SCHEMA_PROMPT, RELATIONS_PROMPT, UPDATE_ENTITIES_PROMPT, EXTRACT_ENTITIES_CODE_PROMPT, FIX_CODE_PROMPT, EXTRACT_DATA_PROMPT, PAGE_TEXT_PROMPT, PACKED_PAGES_PROMPT
+from .prompts import ENTITIES_PROMPT, RELATIONS_STRUCTURED_PROMPT, CROSS_RELATIONS_PROMPT
 from PIL import Image
 import inspect
 import subprocess
 import logging
 import re
 from ..llm_client import LLMClient
+from .page_cache import PageCache, hash_file
+from .schema_merge import merge_json_schema_list, conflicts_prompt, apply_conflict_resolutions, merge_json_schemas, amerge_json_schemas
+from .schema_store import SchemaStore, hash_page
+from .schema_entities import entities_from_json_schema
+from .schema_relations import infer_relations, cross_relation_candidates, summarize_entities
+from .record_merge import merge_records, RecordAccumulator
 from requests.exceptions import ReadTimeout
 from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.types import Send
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Callable, Iterable, Iterator, AsyncIterator, Tuple, Annotated
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+import copy
+import hashlib
+import operator
+import asyncio
+import collections
+import heapq
 
 
 # Set up logging
@@ -51,15 +70,49 @@ def list_directory(path: str):
     except Exception as e:
         logging.error(f"Error listing directory {path}: {e}")
 
-def load_pdf_as_images(pdf_path: str) -> Optional[List[Image.Image]]:
+def get_pdf_page_count(pdf_path: str) -> int:
     """
-    Converts a PDF file to a list of images, one per page, using pdftoppm.
+    Returns the number of pages of a PDF file, using pdfinfo.
 
     Args:
         pdf_path (str): The path to the PDF file.
 
     Returns:
-        Optional[List[Image.Image]]: A list of images if successful, None otherwise.
+        int: The number of pages.
+    """
+    result = subprocess.run(['pdfinfo', pdf_path], check=True, capture_output=True, text=True)
+    match = re.search(r"^Pages:\s+(\d+)", result.stdout, re.MULTILINE)
+    if not match:
+        raise ValueError(f"Unable to read the page count of {pdf_path}")
+    return int(match.group(1))
+
+def iter_pdf_images(
+    pdf_path: str,
+    window_size: int = 1,
+    dpi: int = 150,
+    grayscale: bool = False,
+    max_dimension: Optional[int] = None,
+    pages: Optional[List[int]] = None,
+) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Lazily converts a PDF file to images, one per page, using pdftoppm.
+
+    Only window_size pages are rasterized and held in memory at a time, so the
+    memory usage does not grow with the number of pages of the document.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        window_size (int): The number of pages rasterized per pdftoppm call. Defaults to 1.
+        dpi (int): The rendering resolution. Defaults to 150, the pdftoppm default.
+        grayscale (bool): Whether to render the pages in grayscale. Defaults to False.
+        max_dimension (Optional[int]): If set, pages whose long edge exceeds this many pixels are downscaled to it.
+        pages (Optional[List[int]]): The 1-based page numbers to rasterize. Defaults to all the pages.
+
+    Yields:
+        Tuple[int, Image.Image]: The page number and the image of each page, in page order.
+
+    Raises:
+        subprocess.CalledProcessError: If pdfinfo or pdftoppm fail.
     """
     logging.info(f"Processing PDF: {pdf_path}")
     
@@ -71,145 +124,481 @@ def load_pdf_as_images(pdf_path: str) -> Optional[List[Image.Image]]:
         logging.error("Poppler is not installed.")
         raise EnvironmentError("Poppler is not installed. Please install it to use this functionality.")
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        output_prefix = os.path.join(temp_dir, 'pdf_page')
-        logging.info(f"Output prefix: {output_prefix}")
+    try:
+        if pages is None:
+            pages = range(1, get_pdf_page_count(pdf_path) + 1)
+
+        for first_page, last_page in _page_windows(pages, window_size):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                output_prefix = os.path.join(temp_dir, 'pdf_page')
+                command = ['pdftoppm', '-f', str(first_page), '-l', str(last_page), '-r', str(dpi)]
+                if grayscale:
+                    command.append('-gray')
+                command += [pdf_path, output_prefix, '-png']
+                logging.info(f"Running command: {' '.join(command)}")
+                subprocess.run(command, check=True, capture_output=True, text=True)
+
+                # pdftoppm zero-pads the page numbers depending on the page count, sorting by
+                # the numeric suffix keeps the page order
+                image_names = sorted(
+                    os.listdir(temp_dir),
+                    key=lambda name: int(os.path.splitext(name)[0].rsplit('-', 1)[-1])
+                )
+                images = []
+                for page_num, image_name in zip(range(first_page, last_page + 1), image_names):
+                    # Using context manager to ensure the file is closed properly after use
+                    with Image.open(os.path.join(temp_dir, image_name)) as img:
+                        image = img.copy()
+                    if max_dimension is not None:
+                        # thumbnail keeps the aspect ratio and never upscales
+                        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+                    images.append((page_num, image))
+
+            yield from images
+
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error converting PDF: {e}")
+        logging.error(f"Command output: {e.output}")
+        logging.error(f"Command error: {e.stderr}")
+        raise
+
+def _page_windows(pages: Iterable[int], window_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Groups page numbers into ranges of consecutive pages of at most window_size pages.
 
-        command = ['pdftoppm', pdf_path, output_prefix, '-png']
-        logging.info(f"Running command: {' '.join(command)}")
+    Args:
+        pages (Iterable[int]): The 1-based page numbers.
+        window_size (int): The maximum number of pages of a range.
 
-        try:
-            subprocess.run(command, check=True, capture_output=True, text=True)
-            logging.info("PDF conversion completed successfully")
+    Yields:
+        Tuple[int, int]: The first and last page of each range.
+    """
+    first_page = last_page = None
+    for page_num in sorted(pages):
+        if first_page is not None and page_num == last_page + 1 and page_num - first_page < window_size:
+            last_page = page_num
+            continue
+        if first_page is not None:
+            yield first_page, last_page
+        first_page = last_page = page_num
+    if first_page is not None:
+        yield first_page, last_page
+
+def extract_pdf_text_pages(pdf_path: str) -> List[str]:
+    """
+    Extracts the text layer of every page of a PDF file, using pdftotext.
 
-            logging.info("Listing directory contents after conversion:")
-            list_directory(temp_dir)
+    Args:
+        pdf_path (str): The path to the PDF file.
 
-            images = []
-            page_num = 1
-            while True:
-                image_path = f"{output_prefix}-{page_num}.png"
-                if not os.path.exists(image_path):
-                    break
-                logging.info(f"Loading image: {image_path}")
-                
-                # Using context manager to ensure the file is closed properly after use
-                with Image.open(image_path) as img:
-                    # Append a copy of the image to the list, closing the original image
-                    images.append(img.copy())
-                page_num += 1
-
-            return images
-
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error converting PDF: {e}")
-            logging.error(f"Command output: {e.output}")
-            logging.error(f"Command error: {e.stderr}")
-            return None
+    Returns:
+        List[str]: The text of each page, empty for pages without a text layer.
+    """
+    page_count = get_pdf_page_count(pdf_path)
+    result = subprocess.run(['pdftotext', '-layout', pdf_path, '-'], check=True, capture_output=True, text=True)
+
+    # pdftotext ends every page with a form feed
+    page_texts = result.stdout.split('\f')[:page_count]
+    return page_texts + [''] * (page_count - len(page_texts))
 
-def save_image_to_temp(image: Image.Image) -> str:
+def load_pdf_as_images(pdf_path: str) -> Optional[List[Image.Image]]:
     """
-    Saves an image to a temporary file.
+    Converts a PDF file to a list of images, one per page, using pdftoppm.
 
     Args:
-        image (Image.Image): The image to save.
+        pdf_path (str): The path to the PDF file.
 
     Returns:
-        str: The path to the temporary file.
+        Optional[List[Image.Image]]: A list of images if successful, None otherwise.
+    """
+    try:
+        return [image for _, image in iter_pdf_images(pdf_path)]
+    except subprocess.CalledProcessError:
+        return None
+
+# Image formats accepted for the page images, with their MIME type
+IMAGE_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+
+def encode_image_in_memory(image: Image.Image, image_format: str = "JPEG", quality: Optional[int] = None) -> str:
+    """
+    Encodes an image to a base64 string without writing it to disk.
+
+    Args:
+        image (Image.Image): The image to encode.
+        image_format (str): The output format, one of JPEG, WEBP or PNG. Defaults to JPEG.
+        quality (Optional[int]): The JPEG/WebP quality (1-100). Defaults to the Pillow default.
+
+    Returns:
+        str: The base64 encoded string of the image.
+    """
+    image_format = image_format.upper()
+    if image_format not in IMAGE_MIME_TYPES:
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    save_kwargs = {}
+    if quality is not None and image_format in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = quality
+
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **save_kwargs)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def encode_pdf_pages(
+    pdf_path: str,
+    pages: Optional[List[int]] = None,
+    window_size: int = 1,
+    dpi: int = 150,
+    grayscale: bool = False,
+    max_dimension: Optional[int] = None,
+    image_format: str = "JPEG",
+    image_quality: Optional[int] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily rasterizes the pages of a PDF file and encodes them to base64 in memory.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        pages (Optional[List[int]]): The 1-based page numbers to encode. Defaults to all the pages.
+        window_size (int): The number of pages rasterized per pdftoppm call. Defaults to 1.
+        dpi (int): The rendering resolution. Defaults to 150.
+        grayscale (bool): Whether to render the pages in grayscale. Defaults to False.
+        max_dimension (Optional[int]): If set, pages whose long edge exceeds this many pixels are downscaled to it.
+        image_format (str): The output format, one of JPEG, WEBP or PNG. Defaults to JPEG.
+        image_quality (Optional[int]): The JPEG/WebP quality (1-100). Defaults to the Pillow default.
+
+    Yields:
+        Tuple[int, str]: The page number and the base64 encoded image of each page, in page order.
+    """
+    images = iter_pdf_images(
+        pdf_path,
+        window_size=window_size,
+        dpi=dpi,
+        grayscale=grayscale,
+        max_dimension=max_dimension,
+        pages=pages,
+    )
+    for page_num, image in images:
+        try:
+            yield page_num, encode_image_in_memory(image, image_format, image_quality)
+        except Exception as e:
+            logging.error(f"Error processing page {page_num}: {e}")
+
+def _encode_pdf_pages_to_dict(pdf_path: str, pages: Optional[List[int]], render_options: Dict[str, Any]) -> Dict[int, str]:
+    """Process pool entry point of encode_pdf_pages, returning the pages by page number."""
+    return dict(encode_pdf_pages(pdf_path, pages, **render_options))
+
+
+class StateEntitiesJsonSchema(BaseModel):
+    file_path: Optional[str] = None
+    user_prompt_for_filter: Optional[str] = None
+    base64_images: Optional[List[Optional[str]]] = None
+    page_texts: Optional[List[Optional[str]]] = None
+    page_answers: Optional[List[str]] = None
+    entities_json_schema: Optional[Dict[str, Any]] = None
+
+
+class StateEntitiesSchema(StateEntitiesJsonSchema):
+    entities_schema_code: Optional[str] = None
+    existing_entities: Optional[List[Entity]] = None
+    temp_entities: Optional[List[Entity]] = None
+    entities_schema: Optional[List[Entity]] = None
+
+
+class StateRelations(BaseModel):
+    entities: Optional[List[Entity]] = None
+    user_prompt_for_filter: Optional[str] = None
+    relations_code: Optional[str] = None
+    relation_class: Optional[str] = None
+    relations: Optional[List[Relation]] = None
+
+
+class StateExtractEntities(BaseModel):
+    file_path: Optional[str] = None
+    entities_json_schema: Optional[Dict[str, Any]] = None
+    user_prompt_for_filter: Optional[str] = None
+    base64_images: Optional[List[Optional[str]]] = None
+    page_texts: Optional[List[Optional[str]]] = None
+    page_answers: Optional[List[str]] = None
+    entities: Optional[List[Entity]] = None
+    # The pages of a single extraction task and the answers of all the tasks, keyed by their first page,
+    # when the pages are extracted as separate tasks of a checkpointed graph
+    page_group: Optional[List[Tuple[int, Optional[str], Optional[str]]]] = None
+    page_group_answers: Annotated[List[Tuple[int, List[str]]], operator.add] = []
+    failed_pages: Optional[List[int]] = None
+
+
+# How the entities and relations are built from the JSON schema: "code" asks the model for Python code that
+# is executed, "structured" asks for the objects directly with the provider's structured output and "local"
+# derives the entities from the schema itself and infers the relations from its structure, without any LLM call
+SCHEMA_MODES = ("code", "structured", "local")
+
+# Attempts at executing the entities code, the failed ones are sent back to the LLM to be fixed
+ENTITIES_CODE_MAX_RETRIES = 3
+
+
+class AttributeOutput(BaseModel):
     """
-    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-        image.save(temp_file.name, 'JPEG')
-        return temp_file.name
+    An attribute of an entity or a relation.
+
+    The structured output schemas are strict, which rules out open dicts, so the attributes are a list of
+    named items and a nested object lists its own attributes.
+    """
+    name: str
+    type: str
+    attributes: List["AttributeOutput"]
+
+
+def _attributes_dict(attributes: List[AttributeOutput]) -> Dict[str, Any]:
+    # The attributes of a nested object keep their structure, as in the entities built from code
+    return {
+        attribute.name: _attributes_dict(attribute.attributes) if attribute.attributes else attribute.type
+        for attribute in attributes
+    }
+
+
+class EntityOutput(BaseModel):
+    """An entity of the JSON schema."""
+    id: str
+    type: str
+    attributes: List[AttributeOutput]
+
+    def to_entity(self) -> Entity:
+        return Entity(id=self.id, type=self.type, attributes=_attributes_dict(self.attributes))
+
+
+class EntitiesOutput(BaseModel):
+    """The entities of the JSON schema."""
+    entities: List[EntityOutput]
+
+
+class RelationOutput(BaseModel):
+    """A relation between two entities."""
+    id: str
+    source: str
+    target: str
+    name: str
+    type: Optional[str] = None
+    attributes: Optional[List[AttributeOutput]] = None
+
+    def to_relation(self) -> Relation:
+        attributes = _attributes_dict(self.attributes) if self.attributes else None
+        return Relation(id=self.id, source=self.source, target=self.target, name=self.name, type=self.type, attributes=attributes)
+
+
+class RelationsOutput(BaseModel):
+    """The relations among the entities."""
+    relations: List[RelationOutput]
+
+
+# Types stored in the checkpoints of the entity extraction graph
+CHECKPOINT_TYPES = [
+    ("scrapontologies.parsers.pdf_parser", "StateExtractEntities"),
+    ("scrapontologies.primitives", "Entity"),
+]
+
+
+class _SchemaUpdate:
+    """
+    The documents and pages of an incremental schema update, tracking which pages were answered
+    so that the pages that failed are sent again by the next update.
+    """
+
+    def __init__(self):
+        self.page_answers: List[str] = []
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.sent_page_hashes = set()
+        self.answered_page_hashes: List[str] = []
+        self._pending_pages: Dict[str, Dict[int, str]] = {}
+        self._document_paths: Dict[str, str] = {}
+
+    def add_document(self, file_path: str, document_hash: str, page_hashes: List[str], new_page_hashes: Dict[int, str]) -> None:
+        self.documents[document_hash] = {"path": file_path, "pages": page_hashes}
+        self._pending_pages[document_hash] = new_page_hashes
+        self._document_paths[file_path] = document_hash
+
+    def add_answers(self, file_path: str, page_answers: List[str]) -> None:
+        pending_pages = self._pending_pages[self._document_paths[file_path]]
+        for page_answer in page_answers:
+            # A page whose answer holds no schema is sent again by the next update
+            match = re.match(r"Page (\d+):\s*\S", page_answer)
+            if match and int(match.group(1)) in pending_pages:
+                self.answered_page_hashes.append(pending_pages.pop(int(match.group(1))))
+        self.page_answers.extend(page_answers)
+
+    def completed_documents(self) -> Dict[str, Dict[str, Any]]:
+        """The documents whose new pages were all answered."""
+        return {
+            document_hash: document
+            for document_hash, document in self.documents.items()
+            if not self._pending_pages[document_hash]
+        }
 
 
 class PDFParser(BaseParser):
     """
     A parser for extracting entities and relations from PDF files.
+
+    The state of every run lives in the graph state created by each call, the parser only
+    keeps its configuration, the compiled graphs and the latest results returned by the
+    getters, so a single instance can serve concurrent calls.
     """
 
-    def __init__(self, llm_client: LLMClient):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        max_concurrency: int = 1,
+        image_format: str = "JPEG",
+        image_quality: Optional[int] = None,
+        render_window: int = 1,
+        dpi: int = 150,
+        grayscale: bool = False,
+        max_image_dimension: Optional[int] = None,
+        use_text_layer: bool = False,
+        min_text_length: int = 200,
+        page_cache: Optional[PageCache] = None,
+        pages_per_request: int = 1,
+        schema_merge_fan_in: int = 8,
+        schema_mode: str = "code",
+        cross_relations: bool = False,
+        list_merge_key: Optional[str] = None,
+        dedupe_lists: bool = False,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+    ):
         """
         Initializes the PDFParser with an API key and LLM settings.
 
         Args:
-            api_key (str): The API key for authentication.
-            inference_base_url (str): The base URL for the inference API.
-            model (str): The model to use for inference.
-            temperature (float): The temperature setting for the model.
+            llm_client (LLMClient): The LLM client for inference.
+            max_concurrency (int): The maximum number of page requests sent to the LLM in parallel. Defaults to 1 (sequential).
+            image_format (str): The format the page images are encoded to, one of JPEG, WEBP or PNG. Defaults to JPEG.
+            image_quality (Optional[int]): The JPEG/WebP quality (1-100) of the page images. Defaults to the Pillow default.
+            render_window (int): The number of pages rasterized at a time. Defaults to 1.
+            dpi (int): The resolution the pages are rendered at. Defaults to 150.
+            grayscale (bool): Whether to render the pages in grayscale, which is usually enough for text-heavy documents. Defaults to False.
+            max_image_dimension (Optional[int]): If set, page images are downscaled so that their long edge is at most this many pixels.
+            use_text_layer (bool): Whether to send the PDF text layer instead of the page image for pages with enough text. Scanned pages still go through the vision model. Defaults to False.
+            min_text_length (int): The minimum number of non-blank characters a page needs to be sent as text. Defaults to 200.
+            page_cache (Optional[PageCache]): An optional cache of the encoded page images, it can be shared between parsers. Defaults to None.
+            pages_per_request (int): The number of consecutive pages packed in a single LLM request, the model answers for each page separately. Pages missing from a packed answer are requested again alone. Defaults to 1.
+            schema_merge_fan_in (int): The number of page schemas merged by a single LLM call. The page schemas are merged as a tree, level by level, with the calls of a level running in parallel. Defaults to 8.
+            schema_mode (str): How the entities and relations are built: "code" has the model write Python code that is executed, "structured" gets them directly from the model with the provider's structured output, without executing any code, "local" derives the entities from the JSON schema and infers the relations from its nesting and reference attributes without any LLM call. Defaults to "code".
+            cross_relations (bool): In the "local" schema mode, whether the LLM is asked for the relations the schema structure does not show, among the top level entities and the ones with unresolved references only. Defaults to False.
+            list_merge_key (Optional[str]): A field identifying the objects in the lists of the extracted data, like "id". When the pages of a document are merged, list items with the same value are merged into one. Defaults to None.
+            dedupe_lists (bool): Whether merging the pages of a document drops the list items identical to an item of a previous page, at the cost of fingerprinting every item. Defaults to False, which keeps them all.
+            checkpointer (Optional[BaseCheckpointSaver]): An optional LangGraph checkpointer, like a SQLiteCheckpointer, for the entity extraction. The page groups are then extracted as separate graph tasks whose answers are checkpointed as they complete, and a run of the same document, schema and prompt resumes from the pages already extracted. The checkpoints of a run, which hold its page images, are deleted once it completes. A page group that fails is skipped and reported in the failed pages of the file result, the checkpoints of such a run are kept so that running it again only requests the failed groups. Defaults to None.
         """
 
         super().__init__(llm_client)
 
-        class StateEntitiesSchema(BaseModel):
-            file_path: Optional[str] = None
-            user_prompt_for_filter: Optional[str] = None
-            entities_schema_code: Optional[str] = None
-            entity_class: Optional[str] = None 
-            temp_entities: Optional[List[Entity]] = None
-            entities: Optional[List[Entity]] = None
-            base64_images: Optional[List[str]] = None
-            page_answers: Optional[List[str]] = None
-            entities_json_schema: Optional[Dict[str, Any]] = None
-            entities_schema: Optional[List[Entity]] = None
-
-
-        # initialize the state with the avaible field at the start, the entity class definition
-        self.state_entities_schema =  StateEntitiesSchema()
-        self.state_entities_schema.entity_class = inspect.getsource(Entity)
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.max_concurrency = max_concurrency
+
+        if image_format.upper() not in IMAGE_MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        if image_quality is not None and not 1 <= image_quality <= 100:
+            raise ValueError("image_quality must be between 1 and 100.")
+        self.image_format = image_format.upper()
+        self.image_quality = image_quality
+
+        if render_window < 1:
+            raise ValueError("render_window must be at least 1.")
+        self.render_window = render_window
+
+        if dpi < 1:
+            raise ValueError("dpi must be at least 1.")
+        if max_image_dimension is not None and max_image_dimension < 1:
+            raise ValueError("max_image_dimension must be at least 1.")
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.max_image_dimension = max_image_dimension
+
+        self.use_text_layer = use_text_layer
+        self.min_text_length = min_text_length
+        self.page_cache = page_cache
+
+        if pages_per_request < 1:
+            raise ValueError("pages_per_request must be at least 1.")
+        self.pages_per_request = pages_per_request
+
+        if schema_merge_fan_in < 2:
+            raise ValueError("schema_merge_fan_in must be at least 2.")
+        self.schema_merge_fan_in = schema_merge_fan_in
+
+        if schema_mode not in SCHEMA_MODES:
+            raise ValueError(f"Unsupported schema mode: {schema_mode}")
+        self.schema_mode = schema_mode
+        self.cross_relations = cross_relations
+        self.list_merge_key = list_merge_key
+        self.dedupe_lists = dedupe_lists
+        # The extraction state and the entities are deserialized from the checkpoints
+        self.checkpointer = checkpointer.with_allowlist(CHECKPOINT_TYPES) if checkpointer is not None else None
 
         #nodes for the entities graph
         builder_for_entities_schema = StateGraph(StateEntitiesSchema)
         builder_for_entities_schema.add_node("process_pdf", self._process_pdf)
-        builder_for_entities_schema.add_node("generate_json_schemas", self._generate_json_schemas)
-        builder_for_entities_schema.add_node("merge_json_schemas", self._merge_json_schemas)
-        builder_for_entities_schema.add_node("generate_entities_schema_code", self._generate_entities_schema_code)
-        builder_for_entities_schema.add_node("execute_entities_schema_code", self._execute_entities_schema_code)
-        builder_for_entities_schema.add_node("assign_entities_schema", self.update_entities)
+        builder_for_entities_schema.add_node("generate_json_schemas", RunnableLambda(self._generate_json_schemas, afunc=self._agenerate_json_schemas))
+        builder_for_entities_schema.add_node("merge_json_schemas", RunnableLambda(self._merge_json_schemas, afunc=self._amerge_json_schemas))
+        builder_for_entities_schema.add_node("assign_entities_schema", RunnableLambda(self.update_entities, afunc=self.aupdate_entities))
 
         #edges for the entities graph
         builder_for_entities_schema.add_edge(START, "process_pdf")
         builder_for_entities_schema.add_edge("process_pdf", "generate_json_schemas")
         builder_for_entities_schema.add_edge("generate_json_schemas", "merge_json_schemas")
-        builder_for_entities_schema.add_edge("merge_json_schemas", "generate_entities_schema_code")
-        builder_for_entities_schema.add_edge("generate_entities_schema_code","execute_entities_schema_code")
-        builder_for_entities_schema.add_edge("execute_entities_schema_code", "assign_entities_schema")
+        if self.schema_mode == "code":
+            builder_for_entities_schema.add_node("generate_entities_schema_code", RunnableLambda(self._generate_entities_schema_code, afunc=self._agenerate_entities_schema_code))
+            builder_for_entities_schema.add_node("execute_entities_schema_code", RunnableLambda(self._execute_entities_schema_code, afunc=self._aexecute_entities_schema_code))
+            builder_for_entities_schema.add_edge("merge_json_schemas", "generate_entities_schema_code")
+            builder_for_entities_schema.add_edge("generate_entities_schema_code","execute_entities_schema_code")
+            builder_for_entities_schema.add_edge("execute_entities_schema_code", "assign_entities_schema")
+        else:
+            if self.schema_mode == "local":
+                builder_for_entities_schema.add_node("generate_entities", self._derive_entities)
+            else:
+                builder_for_entities_schema.add_node("generate_entities", RunnableLambda(self._generate_entities, afunc=self._agenerate_entities))
+            builder_for_entities_schema.add_edge("merge_json_schemas", "generate_entities")
+            builder_for_entities_schema.add_edge("generate_entities", "assign_entities_schema")
         builder_for_entities_schema.add_edge("assign_entities_schema", END)
 
         self.graph_for_entities_schema = builder_for_entities_schema.compile()
 
 
-        class StateRelations(BaseModel):
-            entities: Optional[List[Entity]] = None
-            user_prompt_for_filter: Optional[str] = None
-            relations_code: Optional[str] = None
-            relation_class: Optional[str] = None
-            relations: Optional[List[Relation]] = None
-
-        self.state_relations = StateRelations()
-        self.state_relations.relation_class = inspect.getsource(Relation)
-
         builder_for_relations = StateGraph(StateRelations)
-        builder_for_relations.add_node("extract_relations_schema", self._extract_relations_schema_code)
-        builder_for_relations.add_node("execute_relations_code", self._execute_relations_code)
-        builder_for_relations.add_edge(START, "extract_relations_schema")
-        builder_for_relations.add_edge("extract_relations_schema", "execute_relations_code")
-        builder_for_relations.add_edge("execute_relations_code", END)
+        if self.schema_mode == "code":
+            builder_for_relations.add_node("extract_relations_schema", self._extract_relations_schema_code)
+            builder_for_relations.add_node("execute_relations_code", self._execute_relations_code)
+            builder_for_relations.add_edge(START, "extract_relations_schema")
+            builder_for_relations.add_edge("extract_relations_schema", "execute_relations_code")
+            builder_for_relations.add_edge("execute_relations_code", END)
+        elif self.schema_mode == "local":
+            builder_for_relations.add_node("infer_relations", self._infer_relations)
+            builder_for_relations.add_edge(START, "infer_relations")
+            if self.cross_relations:
+                builder_for_relations.add_node("generate_cross_relations", self._generate_cross_relations)
+                builder_for_relations.add_edge("infer_relations", "generate_cross_relations")
+                builder_for_relations.add_edge("generate_cross_relations", END)
+            else:
+                builder_for_relations.add_edge("infer_relations", END)
+        else:
+            builder_for_relations.add_node("generate_relations", self._generate_relations)
+            builder_for_relations.add_edge(START, "generate_relations")
+            builder_for_relations.add_edge("generate_relations", END)
 
         self.graph_for_relations = builder_for_relations.compile()
 
-        class StateEntitiesJsonSchema(BaseModel):
-            file_path: Optional[str] = None
-            base64_images: Optional[List[str]] = None
-            page_answers: Optional[List[str]] = None
-            entities_json_schema: Optional[Dict[str, Any]] = None
-
-        self.state_entities_json_schema = StateEntitiesJsonSchema()
-    
 
         builder_for_entities_json_schema = StateGraph(StateEntitiesJsonSchema)
         builder_for_entities_json_schema.add_node("process_pdf", self._process_pdf)
-        builder_for_entities_json_schema.add_node("generate_json_schemas", self._generate_json_schemas)
-        builder_for_entities_json_schema.add_node("merge_json_schemas", self._merge_json_schemas)
+        builder_for_entities_json_schema.add_node("generate_json_schemas", RunnableLambda(self._generate_json_schemas, afunc=self._agenerate_json_schemas))
+        builder_for_entities_json_schema.add_node("merge_json_schemas", RunnableLambda(self._merge_json_schemas, afunc=self._amerge_json_schemas))
         builder_for_entities_json_schema.add_edge(START, "process_pdf")
         builder_for_entities_json_schema.add_edge("process_pdf", "generate_json_schemas")
         builder_for_entities_json_schema.add_edge("generate_json_schemas", "merge_json_schemas")
@@ -217,80 +606,154 @@ class PDFParser(BaseParser):
 
         self.graph_for_entities_schema_json_schema = builder_for_entities_json_schema.compile()
 
-        # State class for extracting entities from files
-        class StateExtractEntities(BaseModel):
-            file_path: Optional[str] = None
-            entities_json_schema: Optional[Dict[str, Any]] = None
-            base64_images: Optional[List[str]] = None
-            page_answers: Optional[List[str]] = None
-            temp_entities: Optional[List[Entity]] = None
-            entities: Optional[List[Entity]] = None
-            user_prompt_for_filter: Optional[str] = None
-
-        self.state_extract_entities = StateExtractEntities()
-
         # Build the state graph for extracting entities from files
         builder_for_extract_entities = StateGraph(StateExtractEntities)
-        builder_for_extract_entities.add_node("process_pdf", self._process_pdf_for_extraction)
-        builder_for_extract_entities.add_node("extract_data_from_pages", self._extract_data_from_pages)
+        builder_for_extract_entities.add_node("process_pdf", self._process_pdf)
         builder_for_extract_entities.add_node("merge_extracted_data", self._merge_extracted_data)
 
         # Define edges for the state graph
         builder_for_extract_entities.add_edge(START, "process_pdf")
-        builder_for_extract_entities.add_edge("process_pdf", "extract_data_from_pages")
-        builder_for_extract_entities.add_edge("extract_data_from_pages", "merge_extracted_data")
+        if self.checkpointer is None:
+            builder_for_extract_entities.add_node("extract_data_from_pages", RunnableLambda(self._extract_data_from_pages, afunc=self._aextract_data_from_pages))
+            builder_for_extract_entities.add_edge("process_pdf", "extract_data_from_pages")
+            builder_for_extract_entities.add_edge("extract_data_from_pages", "merge_extracted_data")
+        else:
+            # One task per page group, so that the checkpointer saves the answers of every group as it completes
+            builder_for_extract_entities.add_node("extract_page_group", RunnableLambda(self._extract_page_group, afunc=self._aextract_page_group))
+            builder_for_extract_entities.add_conditional_edges("process_pdf", self._send_page_groups, ["extract_page_group", "merge_extracted_data"])
+            builder_for_extract_entities.add_edge("extract_page_group", "merge_extracted_data")
         builder_for_extract_entities.add_edge("merge_extracted_data", END)
 
-        self.graph_for_extract_entities = builder_for_extract_entities.compile()
+        self.graph_for_extract_entities = builder_for_extract_entities.compile(checkpointer=self.checkpointer)
 
     
-    def _generate_entities_schema_code(self, *_) -> str:
-        prompt = EXTRACT_ENTITIES_CODE_PROMPT.format(json_schema=str(self.state_entities_schema.entities_json_schema) , entity_class=str(inspect.getsource(Entity)))
-        entities_schema_code = self.llm_client.get_response(prompt)
+    def _entities_schema_code_prompt(self, json_schema: Dict[str, Any]) -> str:
+        return EXTRACT_ENTITIES_CODE_PROMPT.format(json_schema=str(json_schema) , entity_class=str(inspect.getsource(Entity)))
+
+    def _generate_entities_schema_code(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        entities_schema_code = self.llm_client.get_response(self._entities_schema_code_prompt(state.entities_json_schema))
+
+        # extract the python code from the entities_schema_code remove the ```python and ```
+        entities_schema_code = entities_schema_code.replace("```python", "").replace("```", "")
+        return {"entities_schema_code": entities_schema_code}
+
+    async def _agenerate_entities_schema_code(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        entities_schema_code = await self.llm_client.aget_response(self._entities_schema_code_prompt(state.entities_json_schema))
 
         # extract the python code from the entities_schema_code remove the ```python and ```
         entities_schema_code = entities_schema_code.replace("```python", "").replace("```", "")
-        self.state_entities_schema.entities_schema_code = entities_schema_code
-        return self.state_entities_schema
+        return {"entities_schema_code": entities_schema_code}
     
-    def _execute_entities_schema_code(self, *_):
+    def _execute_entities_schema_code(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        entities_schema_code = state.entities_schema_code
         local_vars = {}
-        max_retries = 3
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                exec(self.state_entities_schema.entities_schema_code, globals(), local_vars)
-                break  # If successful, exit the loop
-            except Exception as e:
-                logging.error(f"Error executing entities code (attempt {retry_count + 1}): {e}")
-                if retry_count == max_retries - 1:
-                    logging.error("Max retries reached. Unable to execute entities code.")
-                    break
-                fix_code_prompt = FIX_CODE_PROMPT.format(code=self.state_entities_schema.entities_schema_code, error=str(e))
-                fixed_code = self.llm_client.get_response(fix_code_prompt)
-                fixed_code = fixed_code.replace("```python", "").replace("```", "")
-                self.state_entities_schema.entities_schema_code = fixed_code  # Update entities_schema_code with the fixed version
-                retry_count += 1
-        
+        for attempt in range(ENTITIES_CODE_MAX_RETRIES):
+            fix_code_prompt = self._run_entities_schema_code(entities_schema_code, local_vars, attempt)
+            if fix_code_prompt is None:
+                break
+            fixed_code = self.llm_client.get_response(fix_code_prompt)
+            entities_schema_code = fixed_code.replace("```python", "").replace("```", "")
+
         new_entities = local_vars.get('entities', [])
-        self.state_entities_schema.temp_entities = new_entities
-        
-        return self.state_entities_schema
+        return {"entities_schema_code": entities_schema_code, "temp_entities": new_entities}
 
-    
-    def extract_entities_schema(self, file_path: str, prompt: Optional[str] = None) -> List[Entity]:
+    async def _aexecute_entities_schema_code(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        entities_schema_code = state.entities_schema_code
+        local_vars = {}
+        for attempt in range(ENTITIES_CODE_MAX_RETRIES):
+            fix_code_prompt = self._run_entities_schema_code(entities_schema_code, local_vars, attempt)
+            if fix_code_prompt is None:
+                break
+            fixed_code = await self.llm_client.aget_response(fix_code_prompt)
+            entities_schema_code = fixed_code.replace("```python", "").replace("```", "")
+
+        new_entities = local_vars.get('entities', [])
+        return {"entities_schema_code": entities_schema_code, "temp_entities": new_entities}
+
+    def _run_entities_schema_code(self, entities_schema_code: str, local_vars: Dict[str, Any], attempt: int) -> Optional[str]:
+        """
+        Executes the entities code generated by the LLM into local_vars.
+
+        Returns:
+            Optional[str]: The prompt asking the LLM to fix the code when it fails and retries are left, otherwise None.
+        """
+        try:
+            exec(entities_schema_code, globals(), local_vars)
+            return None
+        except Exception as e:
+            logging.error(f"Error executing entities code (attempt {attempt + 1}): {e}")
+            if attempt == ENTITIES_CODE_MAX_RETRIES - 1:
+                logging.error("Max retries reached. Unable to execute entities code.")
+                return None
+            return FIX_CODE_PROMPT.format(code=entities_schema_code, error=str(e))
+
+    def _entities_prompt(self, json_schema: Dict[str, Any]) -> str:
+        return ENTITIES_PROMPT.format(json_schema=json.dumps(json_schema, indent=2))
+
+    def _generate_entities(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        output = self.llm_client.get_structured_response(self._entities_prompt(state.entities_json_schema), EntitiesOutput)
+        return {"temp_entities": [entity.to_entity() for entity in output.entities]}
+
+    async def _agenerate_entities(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        output = await self.llm_client.aget_structured_response(self._entities_prompt(state.entities_json_schema), EntitiesOutput)
+        return {"temp_entities": [entity.to_entity() for entity in output.entities]}
+
+    def _derive_entities(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        return {"temp_entities": entities_from_json_schema(state.entities_json_schema)}
+
+    def extract_entities_schema_from_json_schema(self, json_schema: Dict[str, Any]) -> List[Entity]:
+        """
+        Derives the entities from a JSON schema locally, without any LLM call, and makes them the entities schema.
+
+        Args:
+            json_schema (Dict[str, Any]): The JSON schema.
+
+        Returns:
+            List[Entity]: The entities of the schema.
+        """
+        entities = entities_from_json_schema(json_schema)
+        self._json_schema = json_schema
+        self._entities_schema = entities
+        logging.info(f"Derived {len(entities)} entities from the JSON schema")
+        return entities
+
+    def _entities_schema_state(self, file_path: str, prompt: Optional[str]) -> StateEntitiesSchema:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"PDF file not found: {file_path}")
-        
-        self.state_entities_schema.file_path = file_path
 
-        if prompt:
-            self.state_entities_schema.user_prompt_for_filter = prompt
+        return StateEntitiesSchema(
+            file_path=file_path,
+            user_prompt_for_filter=prompt,
+            existing_entities=list(self._entities_schema),
+        )
 
+    def _apply_entities_schema_result(self, result: Dict[str, Any]) -> Optional[List[Entity]]:
+        if result.get("entities_json_schema"):
+            self._json_schema = result["entities_json_schema"]
+        entities_schema = result.get("entities_schema")
+        if entities_schema is not None:
+            self._entities_schema = entities_schema
+        return entities_schema
+    
+    def extract_entities_schema(self, file_path: str, prompt: Optional[str] = None) -> List[Entity]:
+        state = self._entities_schema_state(file_path, prompt)
+        result = self.graph_for_entities_schema.invoke(state)
+        return self._apply_entities_schema_result(result)
+
+    async def aextract_entities_schema(self, file_path: str, prompt: Optional[str] = None) -> List[Entity]:
+        """
+        Asynchronous version of extract_entities_schema.
 
-        self.graph_for_entities_schema.invoke(self.state_entities_schema)
+        Args:
+            file_path (str): The path to the PDF file.
+            prompt (Optional[str]): An optional prompt to guide the extraction.
 
-        return self.state_entities_schema.entities_schema
+        Returns:
+            List[Entity]: A list of extracted entities.
+        """
+        state = self._entities_schema_state(file_path, prompt)
+        result = await self.graph_for_entities_schema.ainvoke(state)
+        return self._apply_entities_schema_result(result)
 
     
 
@@ -308,35 +771,44 @@ class PDFParser(BaseParser):
             return match.group(1).strip()
         return ""
 
-    def update_entities(self, *_):
-        existing_entities = self._entities_schema
-
-        prompt = UPDATE_ENTITIES_PROMPT.format(
+    def _update_entities_prompt(self, existing_entities: List[Entity], new_entities: List[Entity]) -> str:
+        return UPDATE_ENTITIES_PROMPT.format(
             existing_entities=json.dumps([e.__dict__ for e in existing_entities], indent=2),
-            new_entities=json.dumps([e.__dict__ for e in self.state_entities_schema.temp_entities], indent=2)
+            new_entities=json.dumps([e.__dict__ for e in new_entities], indent=2)
         )
 
+    def update_entities(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        if not state.existing_entities:
+            # Nothing to reconcile, the new entities are the schema as they are
+            return {"entities_schema": state.temp_entities or []}
+        prompt = self._update_entities_prompt(state.existing_entities, state.temp_entities or [])
         response = self.llm_client.get_response(prompt)
+        return self._apply_updated_entities(response)
+
+    async def aupdate_entities(self, state: StateEntitiesSchema) -> Dict[str, Any]:
+        if not state.existing_entities:
+            return {"entities_schema": state.temp_entities or []}
+        prompt = self._update_entities_prompt(state.existing_entities, state.temp_entities or [])
+        response = await self.llm_client.aget_response(prompt)
+        return self._apply_updated_entities(response)
+
+    def _apply_updated_entities(self, response: str) -> Dict[str, Any]:
         response = response.strip().strip('```json').strip('```')
 
         try:
             updated_entities_data = json.loads(response)
             updated_entities = [Entity(**entity_data) for entity_data in updated_entities_data]
             
-            # Update the parser's entities
-            self.state_entities_schema.entities_schema = updated_entities
-            self._entities_schema = updated_entities
-            
             # print the updated entities
             logging.info("Updated entities:")
             for entity in updated_entities:
                 logging.info(entity.__dict__)
             logging.info(f"Entities updated. New count: {len(updated_entities)}")
-            return self.state_entities_schema
+            return {"entities_schema": updated_entities}
         except json.JSONDecodeError as e:
             logging.error(f"JSONDecodeError: {e}")
             logging.error("Error: Unable to parse the LLM response.")
-            return self.state_entities_schema
+            return {}
 
     def extract_relations_schema(self, file_path: Optional[str] = None, prompt: Optional[str] = None) -> List[Relation]:
         """
@@ -344,6 +816,7 @@ class PDFParser(BaseParser):
 
         Args:
             file_path (str): The path to the PDF file.
+            prompt (Optional[str]): An optional prompt to filter the relations.
 
         Returns:
             List[Relation]: A list of extracted relations.
@@ -356,132 +829,659 @@ class PDFParser(BaseParser):
             logging.error("Entities not found. Please extract entities first.")
             raise ValueError("Entities not found. Please extract entities first.")
 
-        self.graph_for_relations.invoke(self.state_relations)
+        state = StateRelations(
+            entities=list(self._entities_schema),
+            user_prompt_for_filter=prompt,
+            relation_class=inspect.getsource(Relation),
+        )
+        result = self.graph_for_relations.invoke(state)
 
-        return self.state_relations.relations
+        relations = result.get("relations", [])
+        self._relations_schema = relations
+        return relations
 
 
-    def _extract_relations_schema_code(self, *_):
-        relation_class_str = inspect.getsource(Relation)
+    def _extract_relations_schema_code(self, state: StateRelations) -> Dict[str, Any]:
         relations_prompt = RELATIONS_PROMPT.format(
-            entities=json.dumps([e.__dict__ for e in self._entities_schema], indent=2),
-            relation_class=self.state_relations.relation_class
+            entities=json.dumps([e.__dict__ for e in state.entities], indent=2),
+            relation_class=state.relation_class
         )
-        if self.state_relations.user_prompt_for_filter:
+        if state.user_prompt_for_filter:
             #append to the relations_prompt the prompt
-            relations_prompt += f"\n\n Extract only the relations that are required from the following user prompt:\n\n{self.state_relations.user_prompt_for_filter}"
+            relations_prompt += f"\n\n Extract only the relations that are required from the following user prompt:\n\n{state.user_prompt_for_filter}"
 
 
         relations_code_answer = self.llm_client.get_response(relations_prompt)
         relations_code = self._extract_python_content(relations_code_answer)
-        self.state_relations.relations_code = relations_code
-        return self.state_relations
+        return {"relations_code": relations_code}
 
-    def _execute_relations_code(self, *_):
+    def _generate_relations(self, state: StateRelations) -> Dict[str, Any]:
+        relations_prompt = RELATIONS_STRUCTURED_PROMPT.format(
+            entities=json.dumps([e.__dict__ for e in state.entities], indent=2)
+        )
+        if state.user_prompt_for_filter:
+            relations_prompt += f"\n\n Extract only the relations that are required from the following user prompt:\n\n{state.user_prompt_for_filter}"
+
+        output = self.llm_client.get_structured_response(relations_prompt, RelationsOutput)
+        relations = [relation.to_relation() for relation in output.relations]
+        logging.info(f"Extracted relations: {relations}")
+        return {"relations": relations}
+
+    def _infer_relations(self, state: StateRelations) -> Dict[str, Any]:
+        relations = infer_relations(state.entities)
+        logging.info(f"Inferred {len(relations)} relations from the schema structure")
+        return {"relations": relations}
+
+    def _generate_cross_relations(self, state: StateRelations) -> Dict[str, Any]:
+        relations = list(state.relations or [])
+        candidates = cross_relation_candidates(state.entities, relations)
+        if len(candidates) < 2:
+            return {"relations": relations}
+
+        candidate_ids = {entity.id for entity in candidates}
+        relations_prompt = CROSS_RELATIONS_PROMPT.format(
+            entities=json.dumps(summarize_entities(candidates), indent=2),
+            relations=json.dumps([
+                {"source": r.source, "target": r.target, "name": r.name}
+                for r in relations if r.source in candidate_ids or r.target in candidate_ids
+            ], indent=2),
+        )
+        if state.user_prompt_for_filter:
+            relations_prompt += f"\n\n Extract only the relations that are required from the following user prompt:\n\n{state.user_prompt_for_filter}"
+
+        output = self.llm_client.get_structured_response(relations_prompt, RelationsOutput)
+        known = {(r.source, r.target, r.name) for r in relations}
+        entity_ids = {entity.id for entity in state.entities}
+        for relation in output.relations:
+            key = (relation.source, relation.target, relation.name)
+            # Relations between unknown entities or already inferred ones are dropped
+            if relation.source in entity_ids and relation.target in entity_ids and key not in known:
+                known.add(key)
+                relations.append(relation.to_relation())
+        logging.info(f"Extracted relations: {relations}")
+        return {"relations": relations}
+
+    def _execute_relations_code(self, state: StateRelations) -> Dict[str, Any]:
         local_vars = {}
         try:
-            exec(self.state_relations.relations_code, globals(), local_vars)
+            exec(state.relations_code, globals(), local_vars)
         except Exception as e:
             logging.error(f"Error executing relations code: {e}")
             raise ValueError(f"The language model generated invalid code: {e}") from e
 
         relations_answer = local_vars.get('relations', [])
-        self._relations_schema = relations_answer
-        self.state_relations.relations = relations_answer
-        logging.info(f"Extracted relations: {self.state_relations.relations}")
+        logging.info(f"Extracted relations: {relations_answer}")
 
-        return self.state_relations
+        return {"relations": relations_answer}
   
 
-    def _generate_json_schemas(self,*_):
-        page_answers = []
-        for page_num, base64_image in enumerate(self.state_entities_schema.base64_images, start=1):
-            if self.state_entities_schema.user_prompt_for_filter:
-                customized_prompt = f"{JSON_SCHEMA_PROMPT} extract only what is required from the following prompt:\
-                      {self.state_entities_schema.user_prompt_for_filter} (Page {page_num})"
+    def _map_page_groups(
+        self,
+        func: Callable[[List[Tuple[int, Optional[str], Optional[str]]]], Any],
+        base64_images: List[Optional[str]],
+        page_texts: Optional[List[Optional[str]]] = None,
+    ) -> List[Any]:
+        """
+        Applies a function to every group of pages_per_request pages, running up to max_concurrency calls in parallel.
+
+        Args:
+            func (Callable[[List[Tuple[int, Optional[str], Optional[str]]]], Any]): A function taking a group of
+                pages, each one given as its page number, base64 image and page text.
+            base64_images (List[Optional[str]]): The base64 encoded page images.
+            page_texts (Optional[List[Optional[str]]]): The page texts, for pages sent as text.
+
+        Returns:
+            List[Any]: The results of the function, in page order.
+        """
+        return self._map_concurrently(func, self._page_groups(base64_images, page_texts))
+
+    async def _amap_page_groups(
+        self,
+        func: Callable[[List[Tuple[int, Optional[str], Optional[str]]]], Any],
+        base64_images: List[Optional[str]],
+        page_texts: Optional[List[Optional[str]]] = None,
+    ) -> List[Any]:
+        """
+        Asynchronous version of _map_page_groups, awaiting up to max_concurrency coroutines at a time.
+
+        Args:
+            func (Callable[[List[Tuple[int, Optional[str], Optional[str]]]], Any]): A coroutine function taking a group of pages.
+            base64_images (List[Optional[str]]): The base64 encoded page images.
+            page_texts (Optional[List[Optional[str]]]): The page texts, for pages sent as text.
+
+        Returns:
+            List[Any]: The results of the function, in page order.
+        """
+        return await self._amap_concurrently(func, self._page_groups(base64_images, page_texts))
+
+    def _map_concurrently(self, func: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """Applies a function to every item, running up to max_concurrency calls in parallel and keeping the item order."""
+        if self.max_concurrency == 1 or len(items) <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    async def _amap_concurrently(self, func: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """Asynchronous version of _map_concurrently, awaiting up to max_concurrency coroutines at a time."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(item) -> Any:
+            async with semaphore:
+                return await func(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    def _page_groups(
+        self, base64_images: List[Optional[str]], page_texts: Optional[List[Optional[str]]]
+    ) -> List[List[Tuple[int, Optional[str], Optional[str]]]]:
+        return list(self._iter_page_groups(self._iter_pages(base64_images, page_texts)))
+
+    def _iter_page_groups(
+        self, pages: Iterable[Tuple[int, Optional[str], Optional[str]]]
+    ) -> Iterator[List[Tuple[int, Optional[str], Optional[str]]]]:
+        """Groups the pages pages_per_request at a time, consuming them as the groups are requested."""
+        group = []
+        for page in pages:
+            group.append(page)
+            if len(group) == self.pages_per_request:
+                yield group
+                group = []
+        if group:
+            yield group
+
+    def _iter_pages(
+        self, base64_images: List[Optional[str]], page_texts: Optional[List[Optional[str]]]
+    ) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        if page_texts is None:
+            page_texts = [None] * len(base64_images)
+        return [
+            (page_num, base64_image, page_text)
+            for page_num, (base64_image, page_text) in enumerate(zip(base64_images, page_texts), start=1)
+            if base64_image is not None or page_text is not None
+        ]
+
+    def _page_request(self, prompt: str, base64_image: Optional[str], page_text: Optional[str]) -> Tuple[str, Optional[str]]:
+        """
+        Builds the prompt and the image URL for a page, sending the page text instead of the image when available.
+
+        Returns:
+            Tuple[str, Optional[str]]: The prompt and the image URL.
+        """
+        if page_text is not None:
+            return prompt + PAGE_TEXT_PROMPT.format(page_text=page_text), None
+        return prompt, self._image_data_url(base64_image)
+
+    def _page_group_request(
+        self, prompt_for_page: Callable[[Optional[int]], str], pages: List[Tuple[int, Optional[str], Optional[str]]]
+    ) -> Tuple[str, Optional[Union[str, List[str]]]]:
+        """
+        Builds the prompt and the image URLs of a group of pages. A single page is sent as usual, several pages
+        are packed in one message asking for an answer tagged by page.
+
+        Args:
+            prompt_for_page (Callable[[Optional[int]], str]): Builds the prompt of a page, or of packed pages when given None.
+            pages (List[Tuple[int, Optional[str], Optional[str]]]): The page numbers, base64 images and page texts.
+
+        Returns:
+            Tuple[str, Optional[Union[str, List[str]]]]: The prompt and the image URL, or the image URLs of packed pages,
+                each preceded by a "Page N:" text part.
+        """
+        if len(pages) == 1:
+            page_num, base64_image, page_text = pages[0]
+            return self._page_request(prompt_for_page(page_num), base64_image, page_text)
+
+        page_nums = [page_num for page_num, _, _ in pages]
+        prompt = prompt_for_page(None) + PACKED_PAGES_PROMPT.format(
+            page_list=", ".join(str(page_num) for page_num in page_nums), first_page=page_nums[0]
+        )
+        image_urls = []
+        for page_num, base64_image, page_text in pages:
+            if page_text is not None:
+                prompt += f"\nPage {page_num}:" + PAGE_TEXT_PROMPT.format(page_text=page_text)
             else:
-                customized_prompt = f"{JSON_SCHEMA_PROMPT} (Page {page_num})"
-            
-            image_data = f"data:image/jpeg;base64,{base64_image}"
+                # Every image is labeled with its page number, as the text pages are, so mixed groups stay unambiguous
+                image_urls.append({"type": "text", "text": f"Page {page_num}:"})
+                image_urls.append(self._image_data_url(base64_image))
+        return prompt, image_urls or None
+
+    def _split_page_group_answer(self, answer: str, pages: List[Tuple[int, Optional[str], Optional[str]]]) -> Dict[int, str]:
+        """
+        Extracts the JSON answer of every page of a group, pages missing from a packed answer are left out.
+
+        Returns:
+            Dict[int, str]: The JSON answers by page number.
+        """
+        if len(pages) == 1:
+            return {pages[0][0]: self._extract_json_content(answer)}
+
+        try:
+            packed_answer = json.loads(self._extract_json_content(answer))
+        except json.JSONDecodeError as e:
+            logging.warning(f"Unable to parse the answer of pages {[page[0] for page in pages]}: {e}")
+            return {}
+        if not isinstance(packed_answer, dict):
+            return {}
+
+        page_answers = {}
+        for page_num, _, _ in pages:
+            page_answer = packed_answer.get(f"page_{page_num}")
+            if page_answer is not None:
+                page_answers[page_num] = json.dumps(page_answer)
+        return page_answers
+
+    def _get_page_group_answers(
+        self, prompt_for_page: Callable[[Optional[int]], str], pages: List[Tuple[int, Optional[str], Optional[str]]]
+    ) -> Dict[int, str]:
+        """
+        Sends a group of pages in one request and returns the JSON answers by page number.
+        The pages missing from a packed answer are requested again one at a time.
+        """
+        prompt, image_data = self._page_group_request(prompt_for_page, pages)
+        answer = self.llm_client.get_response(prompt, image_url=image_data)
+        page_answers = self._split_page_group_answer(answer, pages)
+
+        if len(pages) > 1:
+            for page in pages:
+                if page[0] not in page_answers:
+                    logging.warning(f"Page {page[0]} is missing from the packed answer, requesting it alone.")
+                    page_answers.update(self._get_page_group_answers(prompt_for_page, [page]))
+        return page_answers
+
+    async def _aget_page_group_answers(
+        self, prompt_for_page: Callable[[Optional[int]], str], pages: List[Tuple[int, Optional[str], Optional[str]]]
+    ) -> Dict[int, str]:
+        """
+        Asynchronous version of _get_page_group_answers.
+        """
+        prompt, image_data = self._page_group_request(prompt_for_page, pages)
+        answer = await self.llm_client.aget_response(prompt, image_url=image_data)
+        page_answers = self._split_page_group_answer(answer, pages)
+
+        if len(pages) > 1:
+            for page in pages:
+                if page[0] not in page_answers:
+                    logging.warning(f"Page {page[0]} is missing from the packed answer, requesting it alone.")
+                    page_answers.update(await self._aget_page_group_answers(prompt_for_page, [page]))
+        return page_answers
+
+    def _json_schema_page_prompt(self, page_num: Optional[int], user_prompt: Optional[str] = None) -> str:
+        page_suffix = f" (Page {page_num})" if page_num is not None else ""
+        if user_prompt:
+            return f"{JSON_SCHEMA_PROMPT} extract only what is required from the following prompt:\
+                  {user_prompt}{page_suffix}"
+        return f"{JSON_SCHEMA_PROMPT}{page_suffix}"
+
+    def _generate_json_schemas(self, state: StateEntitiesJsonSchema) -> Dict[str, Any]:
+        def prompt_for_page(page_num: Optional[int]) -> str:
+            return self._json_schema_page_prompt(page_num, state.user_prompt_for_filter)
+
+        def generate_group_json_schemas(pages: List[Tuple[int, Optional[str], Optional[str]]]) -> List[str]:
             try:
-                answer = self.llm_client.get_response(customized_prompt, image_url=image_data)
+                page_answers = self._get_page_group_answers(prompt_for_page, pages)
             except ReadTimeout:
-                logging.warning("Request to OpenAI API timed out. Retrying...")
-                continue
-            answer = self._extract_json_content(answer)
-            page_answers.append(f"Page {page_num}: {answer}")
-            logging.info(f"Processed page {page_num}")
+                logging.error(f"Request for pages {[page[0] for page in pages]} timed out after the retries. Skipping pages.")
+                return []
+            for page_num in page_answers:
+                logging.info(f"Processed page {page_num}")
+            return [f"Page {page_num}: {answer}" for page_num, answer in sorted(page_answers.items())]
 
-        self.state_entities_schema.page_answers = page_answers
-        return self.state_entities_schema
+        group_answers = self._map_page_groups(generate_group_json_schemas, state.base64_images, state.page_texts)
+        return {"page_answers": [answer for answers in group_answers for answer in answers]}
 
-    def _merge_json_schemas(self,*_):
-        json_schema_prompt = "Generate a unique json schema starting from the following \
-                          \n\n" + "\n\n".join(self.state_entities_schema.page_answers) + "\n\n \
+    async def _agenerate_json_schemas(self, state: StateEntitiesJsonSchema) -> Dict[str, Any]:
+        def prompt_for_page(page_num: Optional[int]) -> str:
+            return self._json_schema_page_prompt(page_num, state.user_prompt_for_filter)
+
+        async def generate_group_json_schemas(pages: List[Tuple[int, Optional[str], Optional[str]]]) -> List[str]:
+            try:
+                page_answers = await self._aget_page_group_answers(prompt_for_page, pages)
+            except (ReadTimeout, asyncio.TimeoutError):
+                logging.error(f"Request for pages {[page[0] for page in pages]} timed out after the retries. Skipping pages.")
+                return []
+            for page_num in page_answers:
+                logging.info(f"Processed page {page_num}")
+            return [f"Page {page_num}: {answer}" for page_num, answer in sorted(page_answers.items())]
+
+        group_answers = await self._amap_page_groups(generate_group_json_schemas, state.base64_images, state.page_texts)
+        return {"page_answers": [answer for answers in group_answers for answer in answers]}
+
+    def _merge_json_schemas_prompt(self, page_answers: List[str]) -> str:
+        return "Generate a unique json schema starting from the following \
+                          \n\n" + "\n\n".join(page_answers) + "\n\n \
                           Remember to provide only the json schema without any comments, wrapped in backticks (`) like ```json ... ``` and nothing else."
 
-        json_schema_answer = self.llm_client.get_response(json_schema_prompt)
-        json_schema = self._extract_json_content(json_schema_answer)
+    def _page_answer_schemas(self, page_answers: List[str]) -> List[str]:
+        """Strips the "Page n: " labels from the page answers, dropping the pages without a schema."""
+        return self._dedupe_schemas([re.sub(r"^Page \d+: ", "", page_answer, count=1).strip() for page_answer in page_answers])
+
+    def _dedupe_schemas(self, schemas: List[str]) -> List[str]:
+        """Removes the empty schemas and the ones structurally identical to a previous schema, keeping the order."""
+        seen = set()
+        unique_schemas = []
+        for schema in schemas:
+            if not schema:
+                continue
+            try:
+                key = json.dumps(json.loads(schema), sort_keys=True)
+            except json.JSONDecodeError:
+                key = schema
+            if key not in seen:
+                seen.add(key)
+                unique_schemas.append(schema)
+        return unique_schemas
+
+    def _schema_merge_groups(self, schemas: List[str]) -> List[List[str]]:
+        fan_in = self.schema_merge_fan_in
+        return [schemas[i:i + fan_in] for i in range(0, len(schemas), fan_in)]
+
+    def _parse_schemas(self, schemas: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Parses the schemas of a merge group, None if any of them is not a JSON object."""
+        try:
+            parsed_schemas = [json.loads(schema) for schema in schemas]
+        except json.JSONDecodeError:
+            return None
+        if not all(isinstance(schema, dict) for schema in parsed_schemas):
+            return None
+        return parsed_schemas
+
+    def _merge_json_schema_group(self, schemas: List[str]) -> str:
+        """
+        Merges a group of schemas structurally, only the conflicts are sent to the LLM. Groups holding
+        schemas that are not valid JSON are merged by the LLM as a whole, or structurally without them
+        when its answer holds no schema.
+        """
+        if len(schemas) == 1:
+            return schemas[0]
+
+        parsed_schemas = self._parse_schemas(schemas)
+        if parsed_schemas is None:
+            answer = self.llm_client.get_response(self._merge_json_schemas_prompt(schemas))
+            return self._extract_json_content(answer) or self._fallback_json_schema(schemas)
+
+        merged, conflicts = merge_json_schema_list(parsed_schemas)
+        if conflicts:
+            answer = self.llm_client.get_response(conflicts_prompt(merged, conflicts))
+            merged = apply_conflict_resolutions(merged, conflicts, answer)
+        return json.dumps(merged)
+
+    async def _amerge_json_schema_group(self, schemas: List[str]) -> str:
+        if len(schemas) == 1:
+            return schemas[0]
+
+        parsed_schemas = self._parse_schemas(schemas)
+        if parsed_schemas is None:
+            answer = await self.llm_client.aget_response(self._merge_json_schemas_prompt(schemas))
+            return self._extract_json_content(answer) or self._fallback_json_schema(schemas)
+
+        merged, conflicts = merge_json_schema_list(parsed_schemas)
+        if conflicts:
+            answer = await self.llm_client.aget_response(conflicts_prompt(merged, conflicts))
+            merged = apply_conflict_resolutions(merged, conflicts, answer)
+        return json.dumps(merged)
+
+    def _fallback_json_schema(self, schemas: List[str]) -> str:
+        """The structural merge of the schemas of a group that are JSON objects, empty if there are none."""
+        logging.warning("The merged JSON schema is missing from the answer, merging the valid schemas of the group.")
+        parsed_schemas = []
+        for schema in schemas:
+            try:
+                parsed_schema = json.loads(schema)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(parsed_schema, dict):
+                parsed_schemas.append(parsed_schema)
+        if not parsed_schemas:
+            return ""
+        # The conflicts keep the schema of the first page
+        merged, _ = merge_json_schema_list(parsed_schemas)
+        return json.dumps(merged)
+
+    def _merge_json_schemas(self, state: StateEntitiesJsonSchema) -> Dict[str, Any]:
+        """
+        Merges the page schemas as a tree: the identical schemas are dropped locally, the others are merged
+        schema_merge_fan_in at a time, in parallel, until a single schema is left, so that no merge prompt
+        grows with the number of pages. Each group is merged structurally and only its conflicts need an LLM call.
+        """
+        schemas = self._page_answer_schemas(state.page_answers or [])
+        while len(schemas) > 1:
+            schemas = self._dedupe_schemas(self._map_concurrently(self._merge_json_schema_group, self._schema_merge_groups(schemas)))
+        return self._apply_merged_json_schema(schemas)
+
+    async def _amerge_json_schemas(self, state: StateEntitiesJsonSchema) -> Dict[str, Any]:
+        schemas = self._page_answer_schemas(state.page_answers or [])
+        while len(schemas) > 1:
+            schemas = self._dedupe_schemas(await self._amap_concurrently(self._amerge_json_schema_group, self._schema_merge_groups(schemas)))
+        return self._apply_merged_json_schema(schemas)
+
+    def _apply_merged_json_schema(self, schemas: List[str]) -> Dict[str, Any]:
+        if not schemas:
+            raise ValueError("No JSON schema was generated from the pages of the document.")
+        json_schema = schemas[0]
         logging.info("\n PDF JSON Schema:")
         logging.info(json_schema)
         # json schema is a valid json schema but its a string convert it to a python dict
         entities_json_schema = json.loads(json_schema) 
 
-        self.state_entities_schema.entities_json_schema = entities_json_schema
-        self._json_schema = entities_json_schema
-        return self.state_entities_schema
+        return {"entities_json_schema": entities_json_schema}
     
-    def _process_pdf(self, *_):  #Optional[List[str]]:
+    def _process_pdf(self, state: Union[StateEntitiesJsonSchema, StateExtractEntities]) -> Dict[str, Any]:
         """
-        Processes a PDF file and converts each page to a base64 encoded image.
+        Processes a PDF file and converts each page to a base64 encoded image, or to text
+        when the text layer is used.
 
         Args:
-            pdf_path (str): The path to the PDF file.
+            state: The graph state, holding the path to the PDF file.
 
         Returns:
-            List[str] or None: A list of base64 encoded images if successful, None otherwise.
-        """
-        if (self.state_entities_schema.file_path is None and 
-            self.state_entities_json_schema.file_path is None):
-            raise FileNotFoundError(f"PDF file not found")
-        elif self.state_entities_schema.file_path is None:
-            # check if the file exists
-            if not os.path.exists(self.state_entities_json_schema.file_path):
-                raise FileNotFoundError(f"PDF file not found: {self.state_entities_json_schema.file_path}")
-            file_path = self.state_entities_json_schema.file_path
-        elif self.state_entities_json_schema.file_path is None:
-            # check if the file exists
-            if not os.path.exists(self.state_entities_schema.file_path):
-                raise FileNotFoundError(f"PDF file not found: {self.state_entities_schema.file_path}")
-            file_path = self.state_entities_schema.file_path
-        
-        # Load PDF as images
-        images = load_pdf_as_images(file_path)
-        if not images:
+            Dict[str, Any]: The base64 encoded images and the texts of the pages.
+        """
+        if state.file_path is None:
+            raise FileNotFoundError("PDF file path is not provided.")
+        if not os.path.exists(state.file_path):
+            raise FileNotFoundError(f"PDF file not found: {state.file_path}")
+
+        pages = self._load_pdf_pages(state.file_path)
+        if not pages:
+            return {"base64_images": [], "page_texts": []}
+
+        base64_images, page_texts = pages
+        return {"base64_images": base64_images, "page_texts": page_texts}
+    
+    def iter_encoded_pages(self, file_path: str, pages: Optional[List[int]] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily rasterizes the pages of a PDF file and encodes them to base64.
+
+        Pages are rasterized render_window at a time with the parser's rendering
+        options and encoded in memory, using the parser's image format and quality.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            pages (Optional[List[int]]): The 1-based page numbers to encode. Defaults to all the pages.
+
+        Yields:
+            Tuple[int, str]: The page number and the base64 encoded image of each page, in page order.
+        """
+        return encode_pdf_pages(file_path, pages, **self._render_options())
+
+    def _render_options(self) -> Dict[str, Any]:
+        return {
+            "window_size": self.render_window,
+            "dpi": self.dpi,
+            "grayscale": self.grayscale,
+            "max_dimension": self.max_image_dimension,
+            "image_format": self.image_format,
+            "image_quality": self.image_quality,
+        }
+
+    def _encode_pages(self, file_path: str, pages: Optional[List[int]], executor: Optional[Executor] = None) -> Dict[int, str]:
+        """
+        Encodes the pages of a PDF file, in the given executor if any.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            pages (Optional[List[int]]): The 1-based page numbers to encode. Defaults to all the pages.
+            executor (Optional[Executor]): An optional executor, e.g. a process pool, running the rasterization.
+
+        Returns:
+            Dict[int, str]: The base64 encoded image of each page, by page number.
+        """
+        if executor is None:
+            return dict(self.iter_encoded_pages(file_path, pages))
+        return executor.submit(_encode_pdf_pages_to_dict, file_path, pages, self._render_options()).result()
+
+    def _load_pdf_pages(
+        self, file_path: str, executor: Optional[Executor] = None
+    ) -> Optional[Tuple[List[Optional[str]], List[Optional[str]]]]:
+        """
+        Loads the content of every page of a PDF file, keeping only the encoded images in memory.
+
+        When use_text_layer is enabled, pages with at least min_text_length characters of
+        text are not rasterized and their text is returned instead.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            executor (Optional[Executor]): An optional executor, e.g. a process pool, running the rasterization.
+
+        Returns:
+            Optional[Tuple[List[Optional[str]], List[Optional[str]]]]: The base64 encoded image and
+            the text of each page, one of them being None, or None if the conversion failed. Both are
+            None for a page that failed to encode, so that the next pages keep their numbers.
+        """
+        try:
+            pages = list(self._iter_document_pages(file_path, executor))
+        except subprocess.CalledProcessError:
             return None
 
-        base64_images = []
+        page_count = pages[-1][0] if pages else 0
+        base64_images: List[Optional[str]] = [None] * page_count
+        page_texts: List[Optional[str]] = [None] * page_count
+        for page_num, base64_image, page_text in pages:
+            base64_images[page_num - 1] = base64_image
+            page_texts[page_num - 1] = page_text
+        return base64_images, page_texts
+
+    def _iter_document_pages(
+        self, file_path: str, executor: Optional[Executor] = None
+    ) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Lazily loads the pages of a PDF file, in page order, sending the text of the pages with enough of it when
+        use_text_layer is enabled. Without an executor the pages are rasterized render_window at a time as they
+        are consumed, pages that fail to encode are left out.
 
-        for page_num, image in enumerate(images, start=1):
-            temp_image_path = None
-            try:
-                # Save image to temporary file
-                temp_image_path = save_image_to_temp(image)
-                
-                # Convert image to base64
-                base64_image = encode_image(temp_image_path)
-                base64_images.append(base64_image)
+        Args:
+            file_path (str): The path to the PDF file.
+            executor (Optional[Executor]): An optional executor, e.g. a process pool, running the rasterization of all the pages.
+
+        Yields:
+            Tuple[int, Optional[str], Optional[str]]: The page number, the base64 encoded image and the text of each page.
+        """
+        page_texts = {}
+        image_pages = None
+        if self.use_text_layer:
+            texts = extract_pdf_text_pages(file_path)
+            page_texts = {
+                page_num: text
+                for page_num, text in enumerate(texts, start=1)
+                if len("".join(text.split())) >= self.min_text_length
+            }
+            image_pages = [page_num for page_num in range(1, len(texts) + 1) if page_num not in page_texts]
+            logging.info(f"Using the text layer for {len(page_texts)} of {len(texts)} pages")
+
+        if executor is None:
+            base64_images = self._iter_encoded_pages_with_cache(file_path, image_pages)
+        else:
+            base64_images = iter(sorted(self._encode_pages_with_cache(file_path, image_pages, executor).items()))
+        yield from heapq.merge(
+            ((page_num, None, page_text) for page_num, page_text in sorted(page_texts.items())),
+            ((page_num, base64_image, None) for page_num, base64_image in base64_images),
+            key=lambda page: page[0],
+        )
+
+    def _render_settings(self) -> Tuple[Any, ...]:
+        return (self.dpi, self.grayscale, self.max_image_dimension, self.image_format, self.image_quality)
+
+    def _encode_pages_with_cache(
+        self, file_path: str, pages: Optional[List[int]] = None, executor: Optional[Executor] = None
+    ) -> Dict[int, str]:
+        """
+        Encodes the pages of a PDF file, rasterizing only the pages missing from the page cache.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            pages (Optional[List[int]]): The 1-based page numbers to encode. Defaults to all the pages.
+            executor (Optional[Executor]): An optional executor, e.g. a process pool, running the rasterization.
+
+        Returns:
+            Dict[int, str]: The base64 encoded image of each page, by page number.
+        """
+        if self.page_cache is None:
+            return self._encode_pages(file_path, pages, executor)
+
+        if pages is None:
+            pages = list(range(1, get_pdf_page_count(file_path) + 1))
+
+        file_hash = hash_file(file_path)
+        render_settings = self._render_settings()
+        keys = {page_num: PageCache.make_key(file_hash, page_num, render_settings) for page_num in pages}
+
+        base64_images = {}
+        missing_pages = []
+        for page_num in pages:
+            base64_image = self.page_cache.get(keys[page_num])
+            if base64_image is None:
+                missing_pages.append(page_num)
+            else:
+                base64_images[page_num] = base64_image
+
+        if missing_pages:
+            for page_num, base64_image in self._encode_pages(file_path, missing_pages, executor).items():
+                self.page_cache.set(keys[page_num], base64_image)
+                base64_images[page_num] = base64_image
+        logging.info(f"Page cache: {len(pages) - len(missing_pages)} of {len(pages)} pages reused")
+
+        return base64_images
+
+    def _iter_encoded_pages_with_cache(self, file_path: str, pages: Optional[List[int]] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily encodes the pages of a PDF file render_window at a time, rasterizing only the pages missing from the page cache.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            pages (Optional[List[int]]): The 1-based page numbers to encode. Defaults to all the pages.
+
+        Yields:
+            Tuple[int, str]: The page number and the base64 encoded image of each page, in page order.
+        """
+        if self.page_cache is None:
+            yield from self.iter_encoded_pages(file_path, pages)
+            return
+
+        if pages is None:
+            pages = list(range(1, get_pdf_page_count(file_path) + 1))
+
+        file_hash = hash_file(file_path)
+        render_settings = self._render_settings()
+        reused = 0
+        for start in range(0, len(pages), self.render_window):
+            window = pages[start:start + self.render_window]
+            keys = {page_num: PageCache.make_key(file_hash, page_num, render_settings) for page_num in window}
+            base64_images = {page_num: self.page_cache.get(keys[page_num]) for page_num in window}
+            missing_pages = [page_num for page_num in window if base64_images[page_num] is None]
+            if missing_pages:
+                for page_num, base64_image in self.iter_encoded_pages(file_path, missing_pages):
+                    self.page_cache.set(keys[page_num], base64_image)
+                    base64_images[page_num] = base64_image
+            reused += len(window) - len(missing_pages)
+
+            for page_num in window:
+                if base64_images[page_num] is not None:
+                    yield page_num, base64_images[page_num]
+        logging.info(f"Page cache: {reused} of {len(pages)} pages reused")
+
+    def _image_data_url(self, base64_image: str) -> str:
+        return f"data:{IMAGE_MIME_TYPES[self.image_format]};base64,{base64_image}"
 
-            except Exception as e:
-                logging.error(f"Error processing page {page_num}: {e}")
-            finally:
-                # Ensure temp file is deleted even in case of an error
-                if temp_image_path and os.path.exists(temp_image_path):
-                    os.unlink(temp_image_path)
-
-        self.state_entities_schema.base64_images = base64_images
-        return self.state_entities_schema
-    
     def get_entities_schema_graph(self) -> StateGraph:
         """
         Get the graph for entities schema.
@@ -516,12 +1516,154 @@ class PDFParser(BaseParser):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"PDF file not found: {file_path}")
         
-        self.state_entities_json_schema.file_path = file_path  
-        self.graph_for_entities_schema_json_schema.invoke(self.state_entities_json_schema)
+        result = self.graph_for_entities_schema_json_schema.invoke(StateEntitiesJsonSchema(file_path=file_path))
+        self._json_schema = result["entities_json_schema"]
 
         logging.info(f"Entities JSON Schema: {self._json_schema}")
         return self._json_schema
 
+    async def agenerate_json_schema(self, file_path: str) -> Dict[str, Any]:
+        """
+        Asynchronous version of generate_json_schema.
+
+        Args:
+            file_path (str): Path to the PDF file.
+
+        Returns:
+            Dict[str, Any]: The generated JSON schema.
+
+        Raises:
+            FileNotFoundError: If the specified PDF file is not found.
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"PDF file not found: {file_path}")
+
+        result = await self.graph_for_entities_schema_json_schema.ainvoke(StateEntitiesJsonSchema(file_path=file_path))
+        self._json_schema = result["entities_json_schema"]
+
+        logging.info(f"Entities JSON Schema: {self._json_schema}")
+        return self._json_schema
+
+    def update_json_schema(
+        self, file_path: Union[str, List[str]], schema_store: SchemaStore, prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Updates the JSON schema of a corpus with the new documents only.
+
+        Documents already in the store are skipped without being rendered, and only the pages of
+        the new documents that were never seen are sent to the LLM. Their schemas are merged
+        together and then into the schema of the store, so the cost grows with the new pages only.
+        The same prompt should be used for every update of a store.
+
+        Args:
+            file_path (Union[str, List[str]]): Path to the PDF file or list of PDF files.
+            schema_store (SchemaStore): The store of the corpus schema, updated and saved.
+            prompt (Optional[str]): An optional prompt to guide the schema generation.
+
+        Returns:
+            Dict[str, Any]: The updated JSON schema, which also becomes the schema of the parser.
+        """
+        if isinstance(file_path, str):
+            file_path = [file_path]
+
+        update = _SchemaUpdate()
+        for path in file_path:
+            new_pages = self._new_pages(path, schema_store, update)
+            if new_pages is None:
+                continue
+            state = StateEntitiesJsonSchema(user_prompt_for_filter=prompt, base64_images=new_pages[0], page_texts=new_pages[1])
+            update.add_answers(path, self._generate_json_schemas(state)["page_answers"])
+
+        delta_schema = None
+        if self._page_answer_schemas(update.page_answers):
+            delta_schema = self._merge_json_schemas(StateEntitiesJsonSchema(page_answers=update.page_answers))["entities_json_schema"]
+            if schema_store.json_schema:
+                delta_schema = merge_json_schemas(schema_store.json_schema, delta_schema, self.llm_client)
+        return self._apply_schema_update(schema_store, update, delta_schema)
+
+    async def aupdate_json_schema(
+        self, file_path: Union[str, List[str]], schema_store: SchemaStore, prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Asynchronous version of update_json_schema.
+        """
+        if isinstance(file_path, str):
+            file_path = [file_path]
+
+        update = _SchemaUpdate()
+        for path in file_path:
+            # The documents are hashed and rasterized in a thread, off the event loop
+            new_pages = await asyncio.to_thread(self._new_pages, path, schema_store, update)
+            if new_pages is None:
+                continue
+            state = StateEntitiesJsonSchema(user_prompt_for_filter=prompt, base64_images=new_pages[0], page_texts=new_pages[1])
+            update.add_answers(path, (await self._agenerate_json_schemas(state))["page_answers"])
+
+        delta_schema = None
+        if self._page_answer_schemas(update.page_answers):
+            delta_schema = (await self._amerge_json_schemas(StateEntitiesJsonSchema(page_answers=update.page_answers)))["entities_json_schema"]
+            if schema_store.json_schema:
+                delta_schema = await amerge_json_schemas(schema_store.json_schema, delta_schema, self.llm_client)
+        return self._apply_schema_update(schema_store, update, delta_schema)
+
+    def _new_pages(
+        self, file_path: str, schema_store: SchemaStore, update: "_SchemaUpdate"
+    ) -> Optional[Tuple[List[Optional[str]], List[Optional[str]]]]:
+        """
+        Loads a document for a schema update, masking the pages already known to the store or to the update.
+
+        Returns:
+            Optional[Tuple[List[Optional[str]], List[Optional[str]]]]: The base64 images and the texts of the
+                pages, None for the known pages, or None if the document is missing or already in the store.
+        """
+        if not os.path.exists(file_path):
+            logging.error(f"PDF file not found: {file_path}")
+            return None
+
+        document_hash = hash_file(file_path)
+        if schema_store.has_document(document_hash) or document_hash in update.documents:
+            logging.info(f"Skipping {file_path}, already in the schema store")
+            return None
+
+        pages = self._load_pdf_pages(file_path)
+        if not pages:
+            return None
+
+        base64_images, page_texts = pages
+        page_hashes = [hash_page(base64_image, page_text) for base64_image, page_text in zip(base64_images, page_texts)]
+        new_images, new_texts = [], []
+        new_page_hashes = {}
+        for page_num, (page_hash, base64_image, page_text) in enumerate(zip(page_hashes, base64_images, page_texts), start=1):
+            if base64_image is None and page_text is None:
+                # A page that failed to encode is never answered, so the next update loads the document again
+                new_page_hashes[page_num] = None
+                new_images.append(None)
+                new_texts.append(None)
+                continue
+            if schema_store.has_page(page_hash) or page_hash in update.sent_page_hashes:
+                new_images.append(None)
+                new_texts.append(None)
+                continue
+            update.sent_page_hashes.add(page_hash)
+            new_page_hashes[page_num] = page_hash
+            new_images.append(base64_image)
+            new_texts.append(page_text)
+
+        update.add_document(file_path, document_hash, page_hashes, new_page_hashes)
+        sent_pages = sum(page_hash is not None for page_hash in new_page_hashes.values())
+        logging.info(f"{file_path}: {sent_pages} new pages out of {len(page_hashes)}")
+        return new_images, new_texts
+
+    def _apply_schema_update(
+        self, schema_store: SchemaStore, update: "_SchemaUpdate", json_schema: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        if json_schema is None:
+            json_schema = schema_store.json_schema
+        schema_store.update(json_schema, update.completed_documents(), update.answered_page_hashes)
+        self._json_schema = json_schema
+        logging.info(f"Entities JSON Schema: {self._json_schema}")
+        return self._json_schema
+
     def get_json_schema_graph(self) -> StateGraph:
         """
         Get the graph for JSON schema generation.
@@ -560,13 +1702,23 @@ class PDFParser(BaseParser):
 
     
     
-    def extract_entities_from_file(self, file_path: Union[str, List[str]], prompt: Optional[str] = None) -> List[Record]:
+    def extract_entities_from_file(
+        self,
+        file_path: Union[str, List[str]],
+        prompt: Optional[str] = None,
+        batch: bool = False,
+        batch_poll_interval: float = 30.0,
+    ) -> List[Record]:
         """
         Extract entities from the given file(s) using the entities_json_schema.
 
         Args:
             file_path (Union[str, List[str]]): Path to the PDF file or list of PDF files.
             prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+            batch (bool): Whether to send the pages of all the files as batch jobs of the provider, as few as its
+                limits allow, for backfills where cost and throughput matter more than latency. The pages missing
+                from a packed answer are sent again alone in another batch job. Defaults to False.
+            batch_poll_interval (float): The number of seconds between two status checks of the batch jobs. Defaults to 30.
 
         Returns:
             List[Entity]: A list of extracted entities with data.
@@ -579,132 +1731,571 @@ class PDFParser(BaseParser):
         if isinstance(file_path, str):
             file_path = [file_path]
 
-        self.state_extract_entities.entities_json_schema = self._json_schema
-        self.state_extract_entities.user_prompt_for_filter = prompt
+        json_schema = self._json_schema
+        if batch:
+            return self._extract_entities_with_batch_job(file_path, json_schema, prompt, batch_poll_interval)
 
-        records = []
+        # The files that fail are logged and skipped, the other files are still extracted
+        return [result.record for result in self.iter_entities_from_file(file_path, prompt) if result.record is not None]
+
+    async def aextract_entities_from_file(self, file_path: Union[str, List[str]], prompt: Optional[str] = None) -> List[Record]:
+        """
+        Asynchronous version of extract_entities_from_file.
+
+        Args:
+            file_path (Union[str, List[str]]): Path to the PDF file or list of PDF files.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+
+        Returns:
+            List[Record]: A list of records with the extracted entities.
+        """
+        if not self._json_schema:
+            raise ValueError("JSON schema is not generated. Please generate JSON schema first.")
 
+        if isinstance(file_path, str):
+            file_path = [file_path]
+
+        return [result.record async for result in self.aiter_entities_from_file(file_path, prompt) if result.record is not None]
+
+    def iter_entities_from_file(self, file_path: Union[str, List[str]], prompt: Optional[str] = None) -> Iterator[ExtractionResult]:
+        """
+        Extract entities from the given file(s), yielding the result of each file as soon as its pages are merged.
+
+        Unlike extract_entities_from_file, nothing is kept once a result is yielded, so that the records
+        can be written while the next files are extracted. A file that fails does not stop the others,
+        its result carries the error instead of a record, and the pages that failed are listed in failed_pages.
+
+        Args:
+            file_path (Union[str, List[str]]): Path to the PDF file or list of PDF files.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+
+        Yields:
+            ExtractionResult: The result of each file, in file order. The record is None when nothing was extracted.
+        """
+        if not self._json_schema:
+            raise ValueError("JSON schema is not generated. Please generate JSON schema first.")
+
+        if isinstance(file_path, str):
+            file_path = [file_path]
+
+        json_schema = self._json_schema
         for path in file_path:
             if not os.path.exists(path):
                 logging.error(f"PDF file not found: {path}")
-                continue  # Skip this file and proceed to the next one
+                yield ExtractionResult(file_path=path, error=FileNotFoundError(f"PDF file not found: {path}"))
+                continue
 
-            self.state_extract_entities.file_path = path
-            self.state_extract_entities.base64_images = None
-            self.state_extract_entities.page_answers = None
-            self.state_extract_entities.temp_entities = None
-            self.state_extract_entities.entities = None
+            state = StateExtractEntities(file_path=path, entities_json_schema=json_schema, user_prompt_for_filter=prompt)
+            try:
+                result = self._invoke_extract_graph(state)
+            except Exception as e:
+                logging.error(f"Error extracting entities from {path}: {e}")
+                yield ExtractionResult(file_path=path, error=e)
+                continue
+            yield self._extraction_result(path, result)
 
-            # Invoke the state graph
-            self.graph_for_extract_entities.invoke(self.state_extract_entities)
+    async def aiter_entities_from_file(self, file_path: Union[str, List[str]], prompt: Optional[str] = None) -> AsyncIterator[ExtractionResult]:
+        """
+        Asynchronous version of iter_entities_from_file.
 
-            if self.state_extract_entities.entities:
-                record = Record(id=path, entities=self.state_extract_entities.entities) 
-                records.append(record)
+        Args:
+            file_path (Union[str, List[str]]): Path to the PDF file or list of PDF files.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
 
-        return records
+        Yields:
+            ExtractionResult: The result of each file, in file order.
+        """
+        if not self._json_schema:
+            raise ValueError("JSON schema is not generated. Please generate JSON schema first.")
+
+        if isinstance(file_path, str):
+            file_path = [file_path]
+
+        json_schema = self._json_schema
+        for path in file_path:
+            if not os.path.exists(path):
+                logging.error(f"PDF file not found: {path}")
+                yield ExtractionResult(file_path=path, error=FileNotFoundError(f"PDF file not found: {path}"))
+                continue
+
+            state = StateExtractEntities(file_path=path, entities_json_schema=json_schema, user_prompt_for_filter=prompt)
+            try:
+                result = await self._ainvoke_extract_graph(state)
+            except Exception as e:
+                logging.error(f"Error extracting entities from {path}: {e}")
+                yield ExtractionResult(file_path=path, error=e)
+                continue
+            yield self._extraction_result(path, result)
+
+    def _extract_graph_config(self, state: StateExtractEntities) -> Dict[str, Any]:
+        # The thread of a run is identified by the content of the document and everything that changes its answers
+        key = json.dumps(
+            [hash_file(state.file_path), state.entities_json_schema, state.user_prompt_for_filter, self._render_settings(),
+             self.use_text_layer, self.min_text_length, self.pages_per_request],
+            sort_keys=True,
+            default=str,
+        )
+        thread_id = f"extract_entities:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+        return {"configurable": {"thread_id": thread_id}, "max_concurrency": self.max_concurrency}
+
+    def _invoke_extract_graph(self, state: StateExtractEntities) -> Dict[str, Any]:
+        if self.checkpointer is None:
+            return self.graph_for_extract_entities.invoke(state)
+
+        config = self._extract_graph_config(state)
+        snapshot = self.graph_for_extract_entities.get_state(config)
+        if snapshot.next:
+            logging.info(f"Resuming the extraction of {state.file_path} from its checkpoint")
+            result = self.graph_for_extract_entities.invoke(None, config, durability="sync")
+        else:
+            # Every page group is saved before the next step, so that even a killed process loses no extracted page.
+            # A thread kept for its failed pages starts again with the answers of the other groups
+            result = self.graph_for_extract_entities.invoke(state, config, durability="sync")
+
+        # The checkpoints hold the page images, they are only kept until every page group is extracted
+        if not self._keep_extract_thread(state, result):
+            try:
+                self.checkpointer.delete_thread(config["configurable"]["thread_id"])
+            except NotImplementedError:
+                pass
+        return result
+
+    async def _ainvoke_extract_graph(self, state: StateExtractEntities) -> Dict[str, Any]:
+        if self.checkpointer is None:
+            return await self.graph_for_extract_entities.ainvoke(state)
+
+        # Hashing the document reads the whole file
+        config = await asyncio.to_thread(self._extract_graph_config, state)
+        snapshot = await self.graph_for_extract_entities.aget_state(config)
+        if snapshot.next:
+            logging.info(f"Resuming the extraction of {state.file_path} from its checkpoint")
+            result = await self.graph_for_extract_entities.ainvoke(None, config, durability="sync")
+        else:
+            result = await self.graph_for_extract_entities.ainvoke(state, config, durability="sync")
+
+        if not self._keep_extract_thread(state, result):
+            try:
+                await self.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+            except NotImplementedError:
+                pass
+        return result
+
+    def _keep_extract_thread(self, state: StateExtractEntities, result: Dict[str, Any]) -> bool:
+        if not result.get("failed_pages"):
+            return False
+        logging.warning(
+            f"Pages {result['failed_pages']} of {state.file_path} failed, extracting the file again requests only them"
+        )
+        return True
 
-    # Additional methods will be implemented below
+    def _extraction_result(self, path: str, result: Dict[str, Any]) -> ExtractionResult:
+        failed_pages = result.get("failed_pages") or []
+        if not result.get("entities"):
+            return ExtractionResult(file_path=path, failed_pages=failed_pages)
+        return ExtractionResult(file_path=path, record=Record(id=path, entities=result["entities"]), failed_pages=failed_pages)
 
-    def _process_pdf_for_extraction(self, *_):
+    def iter_record_snapshots(self, file_path: str, prompt: Optional[str] = None) -> Iterator[Record]:
         """
-        Process a PDF file for entity extraction.
+        Extract entities from a file, yielding a snapshot of the record every time a group of pages is merged.
 
-        This method loads the PDF file as images, converts each page to base64 format,
-        and stores the results in the state_extract_entities object.
+        Each page answer is folded into the running data as soon as it and the pages before it are extracted,
+        so the first snapshot comes after the first pages rather than after the whole document, and the
+        last snapshot is the complete record. The page requests still run up to max_concurrency at a time.
 
         Args:
-            *_: Unused arguments.
+            file_path (str): Path to the PDF file.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+
+        Yields:
+            Record: The record of the pages merged so far. Every snapshot is a copy, later pages do not change it.
+        """
+        extract_prompt, groups = self._snapshot_page_groups(file_path, prompt)
+        accumulator = RecordAccumulator(self.list_merge_key, dedupe_lists=self.dedupe_lists)
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        pending = collections.deque()
+        try:
+            # The pages are rasterized as their groups are submitted, so that only the groups in flight are held
+            # in memory, and the snapshots come in page order, each one as soon as its group is done
+            for group in groups:
+                pending.append(executor.submit(self._extract_group_data, extract_prompt, group))
+                if len(pending) == self.max_concurrency:
+                    yield self._fold_record_snapshot(file_path, accumulator, pending.popleft().result())
+            while pending:
+                yield self._fold_record_snapshot(file_path, accumulator, pending.popleft().result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def aiter_record_snapshots(self, file_path: str, prompt: Optional[str] = None) -> AsyncIterator[Record]:
+        """
+        Asynchronous version of iter_record_snapshots.
+
+        Args:
+            file_path (str): Path to the PDF file.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+
+        Yields:
+            Record: The record of the pages merged so far.
+        """
+        extract_prompt, groups = self._snapshot_page_groups(file_path, prompt)
+        accumulator = RecordAccumulator(self.list_merge_key, dedupe_lists=self.dedupe_lists)
+        pending = collections.deque()
+        try:
+            while True:
+                # The pages are rasterized in a thread, off the event loop
+                group = await asyncio.to_thread(next, groups, None)
+                if group is None:
+                    break
+                pending.append(asyncio.ensure_future(self._aextract_group_data(extract_prompt, group)))
+                if len(pending) == self.max_concurrency:
+                    yield self._fold_record_snapshot(file_path, accumulator, await pending.popleft())
+            while pending:
+                yield self._fold_record_snapshot(file_path, accumulator, await pending.popleft())
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _snapshot_page_groups(
+        self, file_path: str, prompt: Optional[str]
+    ) -> Tuple[str, Iterator[List[Tuple[int, Optional[str], Optional[str]]]]]:
+        if not self._json_schema:
+            raise ValueError("JSON schema is not generated. Please generate JSON schema first.")
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"PDF file not found: {file_path}")
+
+        def pages() -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+            try:
+                yield from self._iter_document_pages(file_path)
+            except subprocess.CalledProcessError:
+                # The conversion error is logged, the snapshots stop at the pages converted before it
+                return
+
+        # A document without pages has no snapshot, as extract_entities_from_file has no record for it
+        return self._extract_data_prompt(self._json_schema, prompt), self._iter_page_groups(pages())
+
+    def _fold_record_snapshot(self, file_path: str, accumulator: RecordAccumulator, page_answers: List[str]) -> Record:
+        for page_answer in page_answers:
+            accumulator.add(self._parse_page_answer(page_answer))
+        # The accumulator keeps changing, the snapshot gets its own copy of the data
+        return Record(id=file_path, entities=self._entities_from_data(copy.deepcopy(accumulator.merged)))
+
+    def _extract_entities_with_batch_job(
+        self,
+        file_paths: List[str],
+        json_schema: Dict[str, Any],
+        prompt: Optional[str],
+        poll_interval: float,
+    ) -> List[Record]:
+        """
+        Extracts the entities of many files by sending the requests of all their pages as batch jobs, split by the provider limits.
+
+        Args:
+            file_paths (List[str]): The paths to the PDF files.
+            json_schema (Dict[str, Any]): The JSON schema of the extracted data.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+            poll_interval (float): The number of seconds between two status checks of the batch job.
 
         Returns:
-            The updated state_extract_entities object or None if no images were loaded.
+            List[Record]: The records of the files with extracted entities, in file order.
+        """
+        extract_prompt = self._extract_data_prompt(json_schema, prompt)
 
-        Raises:
-            FileNotFoundError: If the PDF file path is not provided.
+        group_requests = []
+        request_groups = []
+        paths = []
+        for path in file_paths:
+            if not os.path.exists(path):
+                logging.error(f"PDF file not found: {path}")
+                continue
+
+            pages = self._load_pdf_pages(path)
+            if not pages:
+                continue
+
+            paths.append(path)
+            for group in self._page_groups(*pages):
+                group_requests.append(self._page_group_request(lambda _: extract_prompt, group))
+                request_groups.append((path, group))
+
+        if not group_requests:
+            return []
+
+        answers = self.llm_client.get_batch_responses(group_requests, poll_interval=poll_interval)
+
+        page_answers = {path: {} for path in paths}
+        missing_pages = []
+        for (path, group), answer in zip(request_groups, answers):
+            group_answers = self._split_page_group_answer(answer, group) if answer is not None else {}
+            page_answers[path].update(group_answers)
+            for page in group:
+                if page[0] in group_answers:
+                    continue
+                if len(group) > 1:
+                    missing_pages.append((path, page))
+                else:
+                    logging.error(f"Page {page[0]} of {path} failed in the batch job.")
+
+        if missing_pages:
+            # As in the real time requests, the pages missing from a packed answer are requested again one at a time
+            logging.warning(f"{len(missing_pages)} pages are missing from the packed batch answers, requesting them alone.")
+            answers = self.llm_client.get_batch_responses(
+                [self._page_group_request(lambda _: extract_prompt, [page]) for _, page in missing_pages],
+                poll_interval=poll_interval,
+            )
+            for (path, page), answer in zip(missing_pages, answers):
+                if answer is None:
+                    logging.error(f"Page {page[0]} of {path} failed in the batch job.")
+                else:
+                    page_answers[path].update(self._split_page_group_answer(answer, [page]))
+
+        records = []
+        for path in paths:
+            try:
+                entities = self._entities_from_page_answers([answer for _, answer in sorted(page_answers[path].items())])
+            except ValueError as e:
+                logging.error(f"Error extracting entities from {path}: {e}")
+                continue
+            if entities:
+                records.append(Record(id=path, entities=entities))
+        return records
+
+    def extract_entities_batch(
+        self,
+        file_paths: List[str],
+        prompt: Optional[str] = None,
+        max_documents: int = 4,
+        rasterize_workers: Optional[int] = None,
+    ) -> Iterator[Record]:
         """
-        if not self.state_extract_entities.file_path:
-            raise FileNotFoundError("PDF file path is not provided.")
+        Extract entities from many files, yielding the records as the documents complete.
+
+        The rasterization, which is CPU bound, runs in a process pool, while the LLM calls run
+        in a thread pool handling max_documents documents at a time, each of them sending up to
+        max_concurrency page requests. Documents that fail are logged and skipped.
+
+        Args:
+            file_paths (List[str]): The paths to the PDF files.
+            prompt (Optional[str]): Additional prompt for filtering or guiding the extraction.
+            max_documents (int): The maximum number of documents processed at the same time. Defaults to 4.
+            rasterize_workers (Optional[int]): The number of rasterization processes. Defaults to the number of CPUs.
 
-        file_path = self.state_extract_entities.file_path
+        Yields:
+            Record: The record of each document, in completion order.
+        """
+        if not self._json_schema:
+            raise ValueError("JSON schema is not generated. Please generate JSON schema first.")
+
+        extract_prompt = self._extract_data_prompt(self._json_schema, prompt)
+
+        # spawn avoids forking a process that is running LLM threads
+        process_pool = ProcessPoolExecutor(max_workers=rasterize_workers, mp_context=multiprocessing.get_context("spawn"))
+        thread_pool = ThreadPoolExecutor(max_workers=max_documents)
+        try:
+            futures = {}
+            for path in file_paths:
+                if not os.path.exists(path):
+                    logging.error(f"PDF file not found: {path}")
+                    continue
+                futures[thread_pool.submit(self._extract_document, path, extract_prompt, process_pool)] = path
+
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logging.error(f"Error extracting entities from {path}: {e}")
+                    continue
+                if record is not None:
+                    yield record
+        finally:
+            thread_pool.shutdown(wait=True, cancel_futures=True)
+            process_pool.shutdown(wait=True, cancel_futures=True)
+
+    def _extract_document(self, file_path: str, prompt: str, executor: Optional[Executor] = None) -> Optional[Record]:
+        """
+        Extracts the entities of a single document without using the parser's graph state.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            prompt (str): The data extraction prompt.
+            executor (Optional[Executor]): An optional executor running the rasterization.
 
-        # Load PDF as images
-        images = load_pdf_as_images(file_path)
-        if not images:
+        Returns:
+            Optional[Record]: The record of the document, None if nothing was extracted.
+        """
+        pages = self._load_pdf_pages(file_path, executor)
+        if not pages:
             return None
 
-        base64_images = []
+        page_answers = self._extract_page_answers(prompt, *pages)
+        entities = self._entities_from_page_answers(page_answers)
+        if not entities:
+            return None
+        return Record(id=file_path, entities=entities)
 
-        for page_num, image in enumerate(images, start=1):
-            temp_image_path = None
-            try:
-                # Save image to temporary file
-                temp_image_path = save_image_to_temp(image)
+    def _extract_data_prompt(self, json_schema: Dict[str, Any], user_prompt: Optional[str] = None) -> str:
+        json_schema_str = json.dumps(json_schema, indent=2)
+        prompt = EXTRACT_DATA_PROMPT.format(json_schema=json_schema_str)
 
-                # Convert image to base64
-                base64_image = encode_image(temp_image_path)
-                base64_images.append(base64_image)
+        if user_prompt:
+            prompt += f"\n\nAdditional instructions: {user_prompt}"
+        return prompt
 
-            except Exception as e:
-                logging.error(f"Error processing page {page_num}: {e}")
-            finally:
-                # Ensure temp file is deleted even in case of an error
-                if temp_image_path and os.path.exists(temp_image_path):
-                    os.unlink(temp_image_path)
-
-        self.state_extract_entities.base64_images = base64_images
-        return self.state_extract_entities
-    
-    
-    def _extract_data_from_pages(self, *_):
+    def _extract_page_answers(
+        self, prompt: str, base64_images: List[Optional[str]], page_texts: Optional[List[Optional[str]]] = None
+    ) -> List[str]:
         """
-        Extract data from images using the entities_json_schema.
+        Extracts the data of every page with the given prompt.
+
+        Args:
+            prompt (str): The data extraction prompt, the same for every page.
+            base64_images (List[Optional[str]]): The base64 encoded page images.
+            page_texts (Optional[List[Optional[str]]]): The page texts, for pages sent as text.
+
+        Returns:
+            List[str]: The JSON answers of the pages that were extracted successfully, in page order.
+        """
+        group_answers = self._map_page_groups(lambda pages: self._extract_group_data(prompt, pages), base64_images, page_texts)
+        return [answer for answers in group_answers for answer in answers]
+
+    async def _aextract_page_answers(
+        self, prompt: str, base64_images: List[Optional[str]], page_texts: Optional[List[Optional[str]]] = None
+    ) -> List[str]:
         """
-        page_answers = []
-        for page_num, base64_image in enumerate(self.state_extract_entities.base64_images, start=1):
-            # Prepare the prompt
-            json_schema_str = json.dumps(self.state_extract_entities.entities_json_schema, indent=2)
-            prompt = EXTRACT_DATA_PROMPT.format(json_schema=json_schema_str)
+        Asynchronous version of _extract_page_answers.
+        """
+        group_answers = await self._amap_page_groups(lambda pages: self._aextract_group_data(prompt, pages), base64_images, page_texts)
+        return [answer for answers in group_answers for answer in answers]
 
-            if self.state_extract_entities.user_prompt_for_filter:
-                prompt += f"\n\nAdditional instructions: {self.state_extract_entities.user_prompt_for_filter}"
+    def _extract_group_data(self, prompt: str, pages: List[Tuple[int, Optional[str], Optional[str]]]) -> List[str]:
+        """Extracts the data of a group of pages, returning the answers in page order and none if the request fails."""
+        try:
+            page_answers = self._get_page_group_answers(lambda _: prompt, pages)
+        except Exception as e:
+            logging.error(f"Error extracting data from pages {[page[0] for page in pages]}: {e}")
+            return []
+        for page_num in page_answers:
+            logging.info(f"Extracted data from page {page_num}")
+        return [answer for _, answer in sorted(page_answers.items())]
+
+    async def _aextract_group_data(self, prompt: str, pages: List[Tuple[int, Optional[str], Optional[str]]]) -> List[str]:
+        """Asynchronous version of _extract_group_data."""
+        try:
+            page_answers = await self._aget_page_group_answers(lambda _: prompt, pages)
+        except Exception as e:
+            logging.error(f"Error extracting data from pages {[page[0] for page in pages]}: {e}")
+            return []
+        for page_num in page_answers:
+            logging.info(f"Extracted data from page {page_num}")
+        return [answer for _, answer in sorted(page_answers.items())]
 
-            image_data = f"data:image/jpeg;base64,{base64_image}"
+    def _extract_data_from_pages(self, state: StateExtractEntities) -> Dict[str, Any]:
+        """
+        Extract data from images using the entities_json_schema.
+        """
+        prompt = self._extract_data_prompt(state.entities_json_schema, state.user_prompt_for_filter)
+        groups = self._page_groups(state.base64_images or [], state.page_texts)
+        group_answers = self._map_concurrently(lambda pages: self._extract_group_data(prompt, pages), groups)
+        return {
+            "page_answers": [answer for answers in group_answers for answer in answers],
+            # The groups whose request failed have no answer
+            "failed_pages": self._failed_pages(groups, {group[0][0] for group, answers in zip(groups, group_answers) if answers}),
+        }
+
+    async def _aextract_data_from_pages(self, state: StateExtractEntities) -> Dict[str, Any]:
+        """
+        Asynchronous version of _extract_data_from_pages.
+        """
+        prompt = self._extract_data_prompt(state.entities_json_schema, state.user_prompt_for_filter)
+        groups = self._page_groups(state.base64_images or [], state.page_texts)
+        group_answers = await self._amap_concurrently(lambda pages: self._aextract_group_data(prompt, pages), groups)
+        return {
+            "page_answers": [answer for answers in group_answers for answer in answers],
+            "failed_pages": self._failed_pages(groups, {group[0][0] for group, answers in zip(groups, group_answers) if answers}),
+        }
+
+    def _failed_pages(self, groups: List[List[Tuple[int, Optional[str], Optional[str]]]], answered_groups: set) -> List[int]:
+        """The pages of the groups without an answer, the answered groups being given by their first page."""
+        return [page_num for group in groups if group[0][0] not in answered_groups for page_num, _, _ in group]
+
+    def _send_page_groups(self, state: StateExtractEntities) -> Union[str, List[Send]]:
+        # A thread run again after some groups failed already holds the answers of the other groups
+        answered_groups = {first_page for first_page, _ in state.page_group_answers}
+        groups = [
+            group for group in self._page_groups(state.base64_images or [], state.page_texts)
+            if group[0][0] not in answered_groups
+        ]
+        if not groups:
+            return "merge_extracted_data"
+        return [
+            Send("extract_page_group", StateExtractEntities(
+                entities_json_schema=state.entities_json_schema,
+                user_prompt_for_filter=state.user_prompt_for_filter,
+                page_group=group,
+            ))
+            for group in groups
+        ]
+
+    def _extract_page_group(self, state: StateExtractEntities) -> Dict[str, Any]:
+        """
+        Extracts the data of a single page group. A group that fails writes no answer, so that the merge
+        reports its pages as failed and a run of the same thread requests it again.
+        """
+        prompt = self._extract_data_prompt(state.entities_json_schema, state.user_prompt_for_filter)
+        return self._page_group_answers_update(state.page_group, self._extract_group_data(prompt, state.page_group))
 
-            try:
-                answer = self.llm_client.get_response(prompt, image_url=image_data)
-                answer = self._extract_json_content(answer)
-                page_answers.append(answer)
-                logging.info(f"Extracted data from page {page_num}")
-            except Exception as e:
-                logging.error(f"Error extracting data from page {page_num}: {e}")
+    async def _aextract_page_group(self, state: StateExtractEntities) -> Dict[str, Any]:
+        """
+        Asynchronous version of _extract_page_group.
+        """
+        prompt = self._extract_data_prompt(state.entities_json_schema, state.user_prompt_for_filter)
+        return self._page_group_answers_update(state.page_group, await self._aextract_group_data(prompt, state.page_group))
 
-        self.state_extract_entities.page_answers = page_answers
-        return self.state_extract_entities
+    def _page_group_answers_update(self, pages: List[Tuple[int, Optional[str], Optional[str]]], answers: List[str]) -> Dict[str, Any]:
+        if not answers:
+            return {}
+        return {"page_group_answers": [(pages[0][0], answers)]}
     
-    def _merge_extracted_data(self, *_):
+    def _merge_extracted_data(self, state: StateExtractEntities) -> Dict[str, Any]:
         """
         Merge the extracted data from all pages into entities.
         """
-        all_entities_data = []
-        for page_answer in self.state_extract_entities.page_answers:
-            try:
-                entities_data = json.loads(page_answer)
-                all_entities_data.append(entities_data)
-            except json.JSONDecodeError as e:
-                logging.error(f"JSONDecodeError: {e}")
-                raise ValueError(f"Error merging extracted data: {e}") from e
+        if self.checkpointer is None:
+            return {"entities": self._entities_from_page_answers(state.page_answers or [])}
+
+        groups = self._page_groups(state.base64_images or [], state.page_texts)
+        return {
+            "entities": self._entities_from_page_answers(
+                [answer for _, answers in sorted(state.page_group_answers) for answer in answers]
+            ),
+            "failed_pages": self._failed_pages(groups, {first_page for first_page, _ in state.page_group_answers}),
+        }
+
+    def _entities_from_page_answers(self, page_answers: List[str]) -> List[Entity]:
+        """
+        Merges the JSON answers of the pages into entities.
+
+        Args:
+            page_answers (List[str]): The JSON answers of the pages.
+
+        Returns:
+            List[Entity]: The merged entities.
+        """
+        all_entities_data = [self._parse_page_answer(page_answer) for page_answer in page_answers]
 
         # Merge all entities data
         merged_entities_data = self._combine_entities_data(all_entities_data)
+        return self._entities_from_data(merged_entities_data)
 
-        entities = []
-        # Create Entity instances
-        for entity_id, attributes in merged_entities_data.items():
-            entity = Entity(id=entity_id, type='object', attributes=attributes)
-            entities.append(entity)
+    def _parse_page_answer(self, page_answer: str) -> Any:
+        try:
+            return json.loads(page_answer)
+        except json.JSONDecodeError as e:
+            logging.error(f"JSONDecodeError: {e}")
+            raise ValueError(f"Error merging extracted data: {e}") from e
 
-        self.state_extract_entities.entities = entities
-        return self.state_extract_entities
+    def _entities_from_data(self, entities_data: Dict[str, Any]) -> List[Entity]:
+        # Every top level key of the merged data is an entity
+        return [Entity(id=entity_id, type='object', attributes=attributes) for entity_id, attributes in entities_data.items()]
 
     def _combine_entities_data(self, all_entities_data):
         """
@@ -716,10 +2307,8 @@ class PDFParser(BaseParser):
         Returns:
             dict: A combined dictionary of entity data, with non-NA values preferred.
         """
-        combined_data = {}
-        for entities_data in all_entities_data:
-            combined_data = self.merge_dicts_preferring_non_na(combined_data, entities_data)
-        return combined_data
+        # All the pages are merged in a single pass rather than folded two by two
+        return merge_records(all_entities_data, list_key=self.list_merge_key, dedupe_lists=self.dedupe_lists)
 
     def merge_dicts_preferring_non_na(self, d1, d2):
         """
@@ -735,21 +2324,8 @@ class PDFParser(BaseParser):
         Notes:
             - NA values are considered to be None, 'NA', or empty string.
             - For nested dictionaries, the merge is performed recursively.
-            - For lists, values from d2 are appended to d1, excluding NA values.
+            - For lists, values from d2 are appended to d1, excluding NA values, and duplicates with dedupe_lists.
+              Dict items sharing the list_merge_key value are merged together.
             - For other types, existing non-NA values in d1 are not overwritten.
         """
-        for key, value in d2.items():
-            if value in (None, 'NA', ''):
-                continue
-            if key not in d1 or d1[key] in (None, 'NA', ''):
-                d1[key] = value
-            else:
-                if isinstance(d1[key], dict) and isinstance(value, dict):
-                    d1[key] = self.merge_dicts_preferring_non_na(d1[key], value)
-                elif isinstance(d1[key], list) and isinstance(value, list):
-                    # Extend the list, excluding 'NA' values
-                    d1[key].extend([v for v in value if v not in (None, 'NA', '')])
-                else:
-                    # Do not overwrite existing non-'NA' values
-                    pass
-        return d1
\ No newline at end of file
+        return merge_records([d1, d2], list_key=self.list_merge_key, dedupe_lists=self.dedupe_lists)
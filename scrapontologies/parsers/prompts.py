@@ -293,3 +293,45 @@ Separate the tables in the jsons with respective attributes in order to be used
 Basically you have to create the json that contains the tables and the data to be inserted.
 Each field containing a string that represent mainly a number must be converted to a numeric value, if not available provide the field empty.
 """
+
+PAGE_TEXT_PROMPT = """
+The page is provided as the text extracted from the PDF text layer instead of an image, the layout is approximated with spaces:
+
+{page_text}
+"""
+
+PACKED_PAGES_PROMPT = """
+The pages {page_list} of the document are provided together in this request, each page is preceded by its "Page <page number>:" label.
+Answer for each page separately, with a single JSON object having one key per page, "page_<page number>", whose value is the answer for that page alone, like:
+```json
+{{
+    "page_{first_page}": {{ ... }},
+    ...
+}}
+```
+"""
+
+ENTITIES_PROMPT = """
+Extract the entities from the following json schema:\n\n{json_schema}
+
+Every object of the schema describing a meaningful concept is an entity, with:
+- id: the name of the object in the schema
+- type: "object"
+- attributes: one item per property, with its name and its type, a nested object lists its own properties as attributes, like
+  [{{"name": "salesCharges", "type": "string", "attributes": []}},
+   {{"name": "fundExpenses", "type": "object", "attributes": [{{"name": "managementExpenseRatio", "type": "number", "attributes": []}}]}}]
+"""
+
+RELATIONS_STRUCTURED_PROMPT = """
+Given these entitities in this format:
+{entities}
+Find meaningfull relations among this entities. Every relation has an id, the ids of its source and target entities, a name, and optionally a type and attributes.
+"""
+
+CROSS_RELATIONS_PROMPT = """
+Given these entities, with the names of their attributes:
+{entities}
+And these relations among them, already known from the structure of the schema:
+{relations}
+Find the other meaningfull relations among these entities, only the ones that are not already known. Every relation has an id, the ids of its source and target entities, a name, and optionally a type and attributes.
+"""
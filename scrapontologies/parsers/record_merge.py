@@ -0,0 +1,171 @@
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional
+
+# String values the model uses when a field is not available on a page
+NA_STRINGS = frozenset({"", "NA"})
+
+
+def is_na(value: Any, na_strings: FrozenSet[str] = NA_STRINGS) -> bool:
+    """
+    Tells whether a value is missing: None or one of the NA strings.
+
+    The type is checked before comparing, so dicts and lists are never compared by equality.
+    """
+    return value is None or (type(value) is str and value in na_strings)
+
+
+def _fingerprint(value: Any) -> Hashable:
+    """A hashable identity of a list item, used to drop duplicates in a single pass."""
+    value_type = type(value)
+    if value_type is str or value_type is int:
+        return value_type, value
+    if value_type is dict:
+        try:
+            # Flat dicts, the common case, are hashed without fingerprinting their values, with their types
+            # so that {"a": 1} and {"a": True} stay distinct
+            return dict, frozenset((key, type(item), item) for key, item in value.items())
+        except TypeError:
+            return dict, frozenset((key, _fingerprint(item)) for key, item in value.items())
+    if value_type is list:
+        items = tuple((type(item), item) for item in value)
+        try:
+            hash(items)
+            return list, items
+        except TypeError:
+            return list, tuple(_fingerprint(item) for item in value)
+    # The type is part of the identity so that 1, 1.0 and True stay distinct
+    try:
+        hash(value)
+    except TypeError:
+        return value_type, repr(value)
+    return value_type, value
+
+
+class RecordAccumulator:
+    """
+    Merges page records one at a time, as they arrive, with the same rules as merge_records.
+
+    The merged record is available at any time, so that partial results can be used before the last
+    page is extracted. The records must be added in page order for the first non-NA value to win.
+    """
+
+    def __init__(self, list_key: Optional[str] = None, na_strings: FrozenSet[str] = NA_STRINGS, dedupe_lists: bool = False):
+        """
+        Initializes the RecordAccumulator.
+
+        Args:
+            list_key (Optional[str]): A field identifying the dict items of lists, see merge_records. Defaults to None.
+            na_strings (FrozenSet[str]): The strings meaning that a value is not available. Defaults to "" and "NA".
+            dedupe_lists (bool): Whether to drop the list items identical to an item already merged. Defaults to False.
+        """
+        self.list_key = list_key
+        self.na_strings = na_strings
+        self.dedupe_lists = dedupe_lists
+        self.merged: Dict[str, Any] = {}
+        # The fingerprints of the items of every merged list, and the position of their keyed items
+        self._seen: Dict[int, set] = {}
+        self._keyed: Dict[int, Dict[Hashable, Dict[str, Any]]] = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Folds a record into the merged record. The record is not modified."""
+        if isinstance(record, dict):
+            self._fold(self.merged, record)
+
+    def _fold(self, merged: Dict[str, Any], record: Dict[str, Any]) -> None:
+        na_strings = self.na_strings
+        for key, value in record.items():
+            value_type = type(value)
+            if value is None or (value_type is str and value in na_strings):
+                continue
+
+            current = merged.get(key)
+            if current is None or (type(current) is str and current in na_strings):
+                # The merged record gets its own containers so that later pages never modify the added records
+                if value_type is dict:
+                    current = merged[key] = {}
+                elif value_type is list:
+                    current = merged[key] = []
+                else:
+                    merged[key] = value
+                    continue
+
+            # The first value decides the kind of the field, values of another kind are ignored
+            current_type = type(current)
+            if current_type is dict:
+                if value_type is dict:
+                    self._fold(current, value)
+            elif current_type is list and value_type is list:
+                self._extend(current, value)
+
+    def _extend(self, merged: List[Any], items: List[Any]) -> None:
+        list_key = self.list_key
+        na_strings = self.na_strings
+        if list_key is None and not self.dedupe_lists:
+            # Plain concatenation, the items are checked for NA only
+            merged.extend([item for item in items if not (item is None or (type(item) is str and item in na_strings))])
+            return
+
+        # Only the new items are fingerprinted, the merged ones are remembered in sets kept per list
+        seen = self._seen.setdefault(id(merged), set()) if self.dedupe_lists else None
+        keyed = self._keyed.setdefault(id(merged), {}) if list_key is not None else None
+        for item in items:
+            item_type = type(item)
+            if item is None or (item_type is str and item in na_strings):
+                continue
+            if keyed is not None and item_type is dict:
+                key_value = item.get(list_key)
+                if not (key_value is None or (type(key_value) is str and key_value in na_strings)):
+                    # Items sharing the key are the same object seen on several pages
+                    key = _fingerprint(key_value)
+                    target = keyed.get(key)
+                    if target is None:
+                        target = keyed[key] = {}
+                        merged.append(target)
+                    self._fold(target, item)
+                    continue
+            if seen is None:
+                merged.append(item)
+                continue
+            if item_type is dict:
+                # Flat dicts, the common case, are fingerprinted inline
+                try:
+                    fingerprint = dict, frozenset((key, type(value), value) for key, value in item.items())
+                except TypeError:
+                    fingerprint = _fingerprint(item)
+            else:
+                fingerprint = _fingerprint(item)
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                merged.append(item)
+
+
+def merge_records(
+    records: Iterable[Dict[str, Any]],
+    list_key: Optional[str] = None,
+    na_strings: FrozenSet[str] = NA_STRINGS,
+    dedupe_lists: bool = False,
+) -> Dict[str, Any]:
+    """
+    Merges the records extracted from the pages of a document in a single pass, preferring non-NA values.
+
+    The records are folded into a single merged record, which gets its own dicts and lists, so
+    that no record is copied or compared as a whole:
+    - the first non-NA value of a field wins, in record order.
+    - dicts are merged recursively.
+    - lists are concatenated without NA items, and without duplicates with dedupe_lists.
+    - fields that are NA in every record are left out.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): The records, in page order. They are not modified.
+        list_key (Optional[str]): A field identifying the dict items of lists, like "id". Items with the same
+            value are merged together instead of being kept side by side. Defaults to None.
+        na_strings (FrozenSet[str]): The strings meaning that a value is not available. Defaults to "" and "NA".
+        dedupe_lists (bool): Whether to drop the list items identical to an item already merged, each new item is
+            fingerprinted once. Defaults to False, which keeps every item as the pairwise merge did.
+
+    Returns:
+        Dict[str, Any]: The merged record.
+    """
+    accumulator = RecordAccumulator(list_key, na_strings, dedupe_lists)
+    for record in records:
+        accumulator.add(record)
+    return accumulator.merged
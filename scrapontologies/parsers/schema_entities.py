@@ -0,0 +1,148 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..primitives import Entity
+
+# Name of the entity built from the root of a schema that has attributes of its own and no title
+ROOT_ENTITY_ID = "document"
+
+
+def _is_object(schema: Dict[str, Any]) -> bool:
+    schema_type = schema.get("type")
+    types = schema_type if isinstance(schema_type, list) else [schema_type]
+    return "object" in types or "properties" in schema
+
+
+def _scalar_type(schema: Dict[str, Any]) -> str:
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "null")
+    if schema_type is None and "enum" in schema:
+        return "string"
+    return schema_type or "string"
+
+
+def _entity_id(name: str) -> str:
+    return re.sub(r"\W+", "_", name).strip("_") or ROOT_ENTITY_ID
+
+
+class _EntityBuilder:
+    """Walks a JSON schema once, building an entity for every object it contains."""
+
+    def __init__(self, json_schema: Dict[str, Any]):
+        self.root = json_schema
+        self.entities: Dict[str, Entity] = {}
+        # The entity built for each $ref, so that a definition referenced many times is built once
+        self.ref_entities: Dict[str, str] = {}
+
+    def resolve(self, schema: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Follows the $ref of a subschema, returns the target and the name of the definition."""
+        ref = schema.get("$ref")
+        if not isinstance(ref, str) or not ref.startswith("#"):
+            return schema, None
+        target: Any = self.root
+        for key in ref.lstrip("#").split("/")[1:]:
+            key = key.replace("~1", "/").replace("~0", "~")
+            if not isinstance(target, dict) or key not in target:
+                return schema, None
+            target = target[key]
+        return (target, ref) if isinstance(target, dict) else (schema, None)
+
+    def properties(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """The properties of an object, including the ones of its allOf/anyOf/oneOf variants."""
+        properties = dict(schema.get("properties") or {})
+        for keyword in ("allOf", "anyOf", "oneOf"):
+            for variant in schema.get(keyword) or []:
+                variant, _ = self.resolve(variant) if isinstance(variant, dict) else ({}, None)
+                for name, property_schema in (variant.get("properties") or {}).items():
+                    properties.setdefault(name, property_schema)
+        return properties
+
+    def attribute(self, name: str, schema: Dict[str, Any], parent_id: Optional[str]) -> Any:
+        """The attribute describing a property, building the entities of the nested objects."""
+        schema, ref = self.resolve(schema)
+        if _is_object(schema) and self.properties(schema):
+            return {"type": "object", "entity": self.build(name, schema, parent_id, ref)}
+
+        if _scalar_type(schema) == "array" or "items" in schema:
+            items = schema.get("items")
+            if isinstance(items, dict):
+                items, items_ref = self.resolve(items)
+                if _is_object(items) and self.properties(items):
+                    return {"type": "array", "entity": self.build(name, items, parent_id, items_ref)}
+                return {"type": "array", "items": _scalar_type(items)}
+            return {"type": "array", "items": "string"}
+
+        return _scalar_type(schema)
+
+    def build(self, name: str, schema: Dict[str, Any], parent_id: Optional[str], ref: Optional[str] = None) -> str:
+        """Builds the entity of an object and returns its id."""
+        if ref is not None:
+            if ref in self.ref_entities:
+                return self.ref_entities[ref]
+            name = ref.rsplit("/", 1)[-1]
+
+        entity_id = _entity_id(name)
+        if entity_id in self.entities:
+            # Objects with the same name in different places are told apart by their parent
+            entity_id = f"{parent_id}_{entity_id}" if parent_id else entity_id
+            suffix = 2
+            base_id = entity_id
+            while entity_id in self.entities:
+                entity_id = f"{base_id}_{suffix}"
+                suffix += 1
+
+        if ref is not None:
+            # Registered before walking the definition so that recursive definitions refer to themselves
+            self.ref_entities[ref] = entity_id
+        entity = Entity(id=entity_id, type="object", attributes={})
+        self.entities[entity_id] = entity
+        for property_name, property_schema in self.properties(schema).items():
+            if isinstance(property_schema, dict):
+                entity.attributes[property_name] = self.attribute(property_name, property_schema, entity_id)
+            else:
+                entity.attributes[property_name] = "string"
+        return entity_id
+
+    def build_root(self) -> List[Entity]:
+        root, _ = self.resolve(self.root)
+        properties = self.properties(root)
+        nested = {name: schema for name, schema in properties.items() if isinstance(schema, dict) and self._is_nested(schema)}
+
+        if len(nested) < len(properties):
+            # The root has attributes of its own, it is an entity too
+            self.build(root.get("title") or ROOT_ENTITY_ID, root, None)
+        else:
+            for name, schema in nested.items():
+                self.attribute(name, schema, None)
+        return list(self.entities.values())
+
+    def _is_nested(self, schema: Dict[str, Any]) -> bool:
+        schema, _ = self.resolve(schema)
+        if _is_object(schema) and self.properties(schema):
+            return True
+        items = schema.get("items")
+        if isinstance(items, dict):
+            items, _ = self.resolve(items)
+            return _is_object(items) and bool(self.properties(items))
+        return False
+
+
+def entities_from_json_schema(json_schema: Dict[str, Any]) -> List[Entity]:
+    """
+    Derives the entities of a JSON schema without any LLM call.
+
+    Every object of the schema with properties becomes an entity named after its property, or
+    after its definition when it is reached through a $ref, and the objects in arrays become
+    entities too. The attributes of an entity map the name of each property to its type, or to
+    {"type": "object" | "array", "entity": <entity id>} for the nested entities and to
+    {"type": "array", "items": <type>} for arrays of values. The root becomes an entity only
+    when it has attributes of its own, otherwise its nested objects are the top level entities.
+
+    Args:
+        json_schema (Dict[str, Any]): The JSON schema.
+
+    Returns:
+        List[Entity]: The entities, parents before their children.
+    """
+    return _EntityBuilder(json_schema).build_root()
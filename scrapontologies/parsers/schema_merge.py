@@ -0,0 +1,215 @@
+import copy
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .prompts import UPDATE_SCHEMA_PROMPT
+
+logger = logging.getLogger(__name__)
+
+# Keywords describing a schema without constraining its structure, the existing value is kept when they differ
+ANNOTATION_KEYWORDS = {"$schema", "$id", "title", "description", "examples", "default", "$comment"}
+
+# Types that can be widened to the second one without losing values
+TYPE_WIDENINGS = {("integer", "number"): "number", ("number", "integer"): "number"}
+
+
+def _pointer(path: List[str]) -> str:
+    return "".join("/" + key.replace("~", "~0").replace("/", "~1") for key in path)
+
+
+def _path(pointer: str) -> List[str]:
+    return [key.replace("~1", "/").replace("~0", "~") for key in pointer.split("/")[1:]]
+
+
+def _as_type_list(schema_type: Any) -> List[str]:
+    return list(schema_type) if isinstance(schema_type, list) else [schema_type]
+
+
+def _merge_types(existing: Any, new: Any) -> Optional[Any]:
+    """Reconciles two type keywords, returns None when they are in conflict."""
+    if existing == new:
+        return existing
+    if isinstance(existing, str) and isinstance(new, str) and (existing, new) in TYPE_WIDENINGS:
+        return TYPE_WIDENINGS[(existing, new)]
+
+    existing_types = _as_type_list(existing)
+    new_types = _as_type_list(new)
+    # A nullable field only differs by "null", which is merged into a type list
+    if [t for t in existing_types if t != "null"] == [t for t in new_types if t != "null"]:
+        merged_types = existing_types + [t for t in new_types if t not in existing_types]
+        return merged_types[0] if len(merged_types) == 1 else merged_types
+    return None
+
+
+def _union(existing: List[Any], new: List[Any]) -> List[Any]:
+    return existing + [value for value in new if value not in existing]
+
+
+def _merge(existing: Any, new: Any, path: List[str], conflicts: Dict[str, List[Any]]) -> Any:
+    if existing == new:
+        return existing
+
+    if not isinstance(existing, dict) or not isinstance(new, dict):
+        conflicts.setdefault(_pointer(path), []).append(new)
+        return existing
+
+    if "type" in existing and "type" in new and _merge_types(existing["type"], new["type"]) is None:
+        # Different kinds of values, the whole subschema is a conflict
+        conflicts.setdefault(_pointer(path), []).append(new)
+        return existing
+
+    merged = dict(existing)
+    for key, new_value in new.items():
+        if key not in merged:
+            merged[key] = copy.deepcopy(new_value)
+            continue
+
+        existing_value = merged[key]
+        if existing_value == new_value or key in ANNOTATION_KEYWORDS:
+            continue
+
+        if key == "type":
+            merged[key] = _merge_types(existing_value, new_value)
+        elif key in ("properties", "definitions", "$defs", "patternProperties") and isinstance(existing_value, dict) and isinstance(new_value, dict):
+            merged_properties = dict(existing_value)
+            for name, property_schema in new_value.items():
+                if name in merged_properties:
+                    merged_properties[name] = _merge(merged_properties[name], property_schema, path + [key, name], conflicts)
+                else:
+                    merged_properties[name] = copy.deepcopy(property_schema)
+            merged[key] = merged_properties
+        elif key in ("required", "enum") and isinstance(existing_value, list) and isinstance(new_value, list):
+            merged[key] = _union(existing_value, new_value)
+        else:
+            merged[key] = _merge(existing_value, new_value, path + [key], conflicts)
+    return merged
+
+
+def merge_json_schemas_locally(existing: Dict[str, Any], new: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """
+    Merges two JSON schemas structurally, without any LLM call.
+
+    The properties are united and merged recursively, as are the items of arrays, the
+    required and enum lists are united, integer and number are widened to number and
+    nullable types are merged into type lists. The subschemas that cannot be reconciled,
+    like a property that is an object in one schema and a string in the other, are
+    conflicts: the existing subschema is kept and the new one is reported.
+
+    Args:
+        existing (Dict[str, Any]): The existing JSON schema, which is not modified.
+        new (Dict[str, Any]): The JSON schema to merge into the existing one.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, List[Any]]]: The merged schema and the conflicting new subschemas,
+            keyed by the JSON pointer of their location.
+    """
+    conflicts: Dict[str, List[Any]] = {}
+    merged = _merge(copy.deepcopy(existing), new, [], conflicts)
+    return merged, conflicts
+
+
+def merge_json_schema_list(schemas: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """
+    Merges several JSON schemas structurally, in order, collecting the conflicts of all the merges.
+
+    Args:
+        schemas (List[Dict[str, Any]]): The JSON schemas, at least one.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, List[Any]]]: The merged schema and the conflicts by JSON pointer.
+    """
+    merged = schemas[0]
+    conflicts: Dict[str, List[Any]] = {}
+    for schema in schemas[1:]:
+        merged, schema_conflicts = merge_json_schemas_locally(merged, schema)
+        for pointer, values in schema_conflicts.items():
+            conflicts.setdefault(pointer, []).extend(value for value in values if value not in conflicts[pointer])
+    return merged, conflicts
+
+
+def conflicts_prompt(merged: Dict[str, Any], conflicts: Dict[str, List[Any]]) -> str:
+    """
+    Builds the UPDATE_SCHEMA_PROMPT asking to reconcile only the conflicting subschemas.
+
+    Args:
+        merged (Dict[str, Any]): The locally merged schema, holding the existing subschemas.
+        conflicts (Dict[str, List[Any]]): The conflicting new subschemas by JSON pointer.
+
+    Returns:
+        str: The prompt, whose answer maps every JSON pointer to the reconciled subschema.
+    """
+    existing_schema = {pointer: _resolve(merged, pointer) for pointer in conflicts}
+    new_schema = {pointer: values[0] if len(values) == 1 else values for pointer, values in conflicts.items()}
+    return UPDATE_SCHEMA_PROMPT.format(
+        existing_schema=json.dumps(existing_schema, indent=2),
+        new_schema=json.dumps(new_schema, indent=2),
+    ) + "\nThe keys of the objects are JSON pointers to the conflicting parts of a larger schema, answer with the same keys."
+
+
+def apply_conflict_resolutions(merged: Dict[str, Any], conflicts: Dict[str, List[Any]], answer: str) -> Dict[str, Any]:
+    """
+    Replaces the conflicting subschemas with the ones reconciled by the LLM.
+
+    Args:
+        merged (Dict[str, Any]): The locally merged schema, modified in place.
+        conflicts (Dict[str, List[Any]]): The conflicting new subschemas by JSON pointer.
+        answer (str): The answer of the LLM to the conflicts_prompt.
+
+    Returns:
+        Dict[str, Any]: The merged schema, unchanged for the conflicts the answer does not resolve.
+    """
+    match = re.search(r"```json\s*(.*?)\s*```", answer, re.DOTALL)
+    try:
+        resolutions = json.loads(match.group(1) if match else answer)
+    except json.JSONDecodeError as e:
+        logger.error(f"Unable to parse the resolution of the schema conflicts: {e}")
+        return merged
+
+    for pointer in conflicts:
+        if not isinstance(resolutions, dict) or pointer not in resolutions:
+            logger.warning(f"Schema conflict at {pointer or '/'} was not resolved, keeping the existing subschema.")
+            continue
+        if pointer == "":
+            return resolutions[pointer]
+        *parents, key = _path(pointer)
+        _resolve(merged, _pointer(parents))[key] = resolutions[pointer]
+    return merged
+
+
+def _resolve(schema: Dict[str, Any], pointer: str) -> Any:
+    for key in _path(pointer):
+        schema = schema[key]
+    return schema
+
+
+def merge_json_schemas(existing: Dict[str, Any], new: Dict[str, Any], llm_client) -> Dict[str, Any]:
+    """
+    Merges two JSON schemas locally, asking the LLM to reconcile only the conflicts.
+
+    Args:
+        existing (Dict[str, Any]): The existing JSON schema.
+        new (Dict[str, Any]): The JSON schema to merge into the existing one.
+        llm_client (LLMClient): The LLM client used for the conflicts.
+
+    Returns:
+        Dict[str, Any]: The merged JSON schema.
+    """
+    merged, conflicts = merge_json_schemas_locally(existing, new)
+    if not conflicts:
+        return merged
+    logger.info(f"Resolving {len(conflicts)} schema conflicts with the LLM")
+    return apply_conflict_resolutions(merged, conflicts, llm_client.get_response(conflicts_prompt(merged, conflicts)))
+
+
+async def amerge_json_schemas(existing: Dict[str, Any], new: Dict[str, Any], llm_client) -> Dict[str, Any]:
+    """
+    Asynchronous version of merge_json_schemas.
+    """
+    merged, conflicts = merge_json_schemas_locally(existing, new)
+    if not conflicts:
+        return merged
+    logger.info(f"Resolving {len(conflicts)} schema conflicts with the LLM")
+    answer = await llm_client.aget_response(conflicts_prompt(merged, conflicts))
+    return apply_conflict_resolutions(merged, conflicts, answer)
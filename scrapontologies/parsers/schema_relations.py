@@ -0,0 +1,142 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from ..primitives import Entity, Relation
+
+# Attribute names referring to another entity by its id, like customer_id, customer_ids or customerId
+REFERENCE_ATTRIBUTE = re.compile(r"^(.+?)(?:[_-]ids?|Ids?)$")
+
+# Types of the relations between an entity and the entities nested in it
+NESTING_RELATION_TYPES = ("has_one", "has_many")
+
+
+def singular_forms(name: str) -> List[str]:
+    """
+    The name followed by the singular forms it may be the plural of, most specific first, like "category"
+    for "categories" or "address" and "addresse" for "addresses". Names ending in "ss", "us" or "is",
+    like "address", "status" or "analysis", are not plurals.
+
+    Args:
+        name (str): The name, in lower case.
+
+    Returns:
+        List[str]: The name and its possible singular forms.
+    """
+    forms = [name]
+    if name.endswith("ies") and len(name) > 3:
+        forms.append(name[:-3] + "y")
+    if name.endswith("es") and len(name) > 2:
+        forms.append(name[:-2])
+    if name.endswith("s") and not name.endswith(("ss", "us", "is")) and len(name) > 1:
+        forms.append(name[:-1])
+    return forms
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower().strip("_")
+
+
+def _ref_name(ref: Any) -> Optional[str]:
+    return ref.rsplit("/", 1)[-1] if isinstance(ref, str) and ref else None
+
+
+def _nested_target(attribute: Any) -> Optional[tuple]:
+    """The id or $ref name of the entity nested in an attribute, and whether it is an array."""
+    if not isinstance(attribute, dict):
+        return None
+    if isinstance(attribute.get("entity"), str):
+        return attribute["entity"], attribute.get("type") == "array"
+    if _ref_name(attribute.get("$ref")):
+        return _ref_name(attribute["$ref"]), False
+    items = attribute.get("items")
+    if isinstance(items, dict) and _ref_name(items.get("$ref")):
+        return _ref_name(items["$ref"]), True
+    return None
+
+
+class _RelationBuilder:
+    def __init__(self, entities: List[Entity]):
+        self.entities = entities
+        self.entity_ids = {entity.id for entity in entities}
+        # A plural name refers to the same entity as its singular, the exact names are matched first
+        self.by_name: Dict[str, str] = {}
+        for entity in entities:
+            self.by_name.setdefault(_normalize(entity.id), entity.id)
+        for entity in entities:
+            for form in singular_forms(_normalize(entity.id))[1:]:
+                self.by_name.setdefault(form, entity.id)
+        self.relations: Dict[tuple, Relation] = {}
+        self.unresolved: Dict[str, List[str]] = {}
+
+    def resolve(self, name: str) -> Optional[str]:
+        if name in self.entity_ids:
+            return name
+        return next((self.by_name[form] for form in singular_forms(_normalize(name)) if form in self.by_name), None)
+
+    def add(self, source: str, target: str, name: str, relation_type: str) -> None:
+        key = (source, target, name)
+        if key not in self.relations:
+            self.relations[key] = Relation(id=f"{source}_{name}_{target}", source=source, target=target, name=name, type=relation_type)
+
+    def build(self) -> List[Relation]:
+        for entity in self.entities:
+            for attribute_name, attribute in (entity.attributes or {}).items():
+                nested = _nested_target(attribute)
+                if nested is not None:
+                    target = self.resolve(nested[0])
+                    if target is not None:
+                        self.add(entity.id, target, attribute_name, "has_many" if nested[1] else "has_one")
+                        continue
+
+                match = REFERENCE_ATTRIBUTE.match(attribute_name)
+                if match:
+                    target = self.resolve(match.group(1))
+                    if target is not None and target != entity.id:
+                        self.add(entity.id, target, attribute_name, "references")
+                    elif target is None:
+                        self.unresolved.setdefault(entity.id, []).append(attribute_name)
+        return list(self.relations.values())
+
+
+def infer_relations(entities: List[Entity]) -> List[Relation]:
+    """
+    Infers the relations among entities from their attributes, without any LLM call.
+
+    An attribute nesting another entity, as {"entity": <id>} or {"$ref": ...}, gives a "has_one"
+    relation, or "has_many" when the entity is in an array, and an attribute named like
+    customer_id, customer_ids or customerId gives a "references" relation to the customer entity.
+    Every relation is named after its attribute.
+
+    Args:
+        entities (List[Entity]): The entities, as derived by entities_from_json_schema or by the LLM.
+
+    Returns:
+        List[Relation]: The inferred relations.
+    """
+    return _RelationBuilder(entities).build()
+
+
+def cross_relation_candidates(entities: List[Entity], relations: List[Relation]) -> List[Entity]:
+    """
+    Selects the entities that may take part in relations the schema structure does not show.
+
+    Entities nested in another one are already related to it, so the candidates are the top level
+    entities, which are not nested in any other, and the entities with reference attributes that
+    could not be resolved to an entity.
+
+    Args:
+        entities (List[Entity]): The entities.
+        relations (List[Relation]): The relations inferred from the schema structure.
+
+    Returns:
+        List[Entity]: The candidate entities.
+    """
+    builder = _RelationBuilder(entities)
+    builder.build()
+    nested = {relation.target for relation in relations if relation.type in NESTING_RELATION_TYPES}
+    return [entity for entity in entities if entity.id not in nested or entity.id in builder.unresolved]
+
+
+def summarize_entities(entities: List[Entity]) -> List[Dict[str, Any]]:
+    """The ids and attribute names of entities, a compact description for the LLM."""
+    return [{"id": entity.id, "attributes": list((entity.attributes or {}).keys())} for entity in entities]
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_page(base64_image: Optional[str], page_text: Optional[str]) -> str:
+    """
+    Computes the content hash of an encoded page.
+
+    Args:
+        base64_image (Optional[str]): The base64 encoded page image.
+        page_text (Optional[str]): The page text, for pages sent as text.
+
+    Returns:
+        str: The hex SHA-256 digest of the page.
+    """
+    content = f"text:{page_text}" if page_text is not None else f"image:{base64_image}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class SchemaStore:
+    """
+    A persistent JSON schema of a corpus, with the hashes of the documents and pages it was generated from.
+
+    The store lets the schema be updated with new documents only: known documents are skipped
+    without being rendered and known pages of new documents are not sent to the LLM again.
+    It is saved as a JSON file, written atomically.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the SchemaStore, loading it if the file exists.
+
+        Args:
+            path (str): The path of the JSON file of the store.
+        """
+        self.path = path
+        self.json_schema: Dict[str, Any] = {}
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.page_hashes = set()
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, "r") as store_file:
+                data = json.load(store_file)
+            self.json_schema = data.get("json_schema", {})
+            self.documents = data.get("documents", {})
+            self.page_hashes = set(data.get("page_hashes", []))
+
+    def has_document(self, document_hash: str) -> bool:
+        return document_hash in self.documents
+
+    def has_page(self, page_hash: str) -> bool:
+        return page_hash in self.page_hashes
+
+    def update(self, json_schema: Dict[str, Any], documents: Dict[str, Dict[str, Any]], page_hashes: List[str]) -> None:
+        """
+        Records a new version of the schema with the documents and pages that contributed to it, and saves the store.
+
+        Args:
+            json_schema (Dict[str, Any]): The updated JSON schema.
+            documents (Dict[str, Dict[str, Any]]): The new documents by content hash, with their "path" and "pages" hashes.
+            page_hashes (List[str]): The hashes of the pages whose schema was merged.
+        """
+        with self._lock:
+            self.json_schema = json_schema
+            self.documents.update(documents)
+            self.page_hashes.update(page_hashes)
+            self._save()
+
+    def clear(self) -> None:
+        """Forgets the schema and every document."""
+        with self._lock:
+            self.json_schema = {}
+            self.documents = {}
+            self.page_hashes = set()
+            self._save()
+
+    def _save(self) -> None:
+        data = {
+            "json_schema": self.json_schema,
+            "documents": self.documents,
+            "page_hashes": sorted(self.page_hashes),
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # Write to a temporary file first so that the store is never left half written
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as temp_file:
+            json.dump(data, temp_file, indent=2)
+        os.replace(temp_file.name, self.path)
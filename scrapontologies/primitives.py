@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
 @dataclass
 class Entity:
@@ -20,3 +20,11 @@ class Relation:
 class Record:
     id: str
     entities: List[Entity]
+
+@dataclass
+class ExtractionResult:
+    file_path: str
+    record: Optional[Record] = None
+    error: Optional[Exception] = None
+    # The pages whose extraction failed and that are missing from the record
+    failed_pages: List[int] = field(default_factory=list)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+# Values of the configuration of a language model that are part of the cache keys
+JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _json_config(value: Any) -> Any:
+    """
+    The JSON values of a configuration, the other ones, like clients or callbacks, do not change the
+    responses and would put memory addresses in the key.
+    """
+    if isinstance(value, dict):
+        return {str(key): _json_config(item) for key, item in value.items() if _is_json(item)}
+    if isinstance(value, (list, tuple)):
+        return [_json_config(item) for item in value if _is_json(item)]
+    return value
+
+
+def _is_json(value: Any) -> bool:
+    return isinstance(value, (dict, list, tuple) + JSON_SCALARS)
+
+
+def make_cache_key(
+    prompt: str,
+    image_url: Optional[Union[str, List[str]]],
+    provider_name: str,
+    model: str,
+    llm_config: Dict[str, Any],
+    base_url: Optional[str] = None,
+) -> str:
+    """
+    Builds the content-addressed key of a language model request.
+
+    Args:
+        prompt (str): The prompt sent to the language model.
+        image_url (Optional[Union[str, List[str]]]): The image URL, or the image URLs, sent with the prompt, only their hash is part of the key.
+        provider_name (str): The name of the language model provider.
+        model (str): The model name.
+        llm_config (Dict[str, Any]): The additional configuration of the language model, only its JSON values are part of the key.
+        base_url (Optional[str]): The base URL of the API, different deployments may serve different models under the same name. Defaults to None.
+
+    Returns:
+        str: The hex SHA-256 digest identifying the request.
+    """
+    if isinstance(image_url, list):
+        # Text parts labeling the images are part of the request too
+        image_url = "\n".join(part if isinstance(part, str) else json.dumps(part, sort_keys=True) for part in image_url)
+    image_hash = hashlib.sha256(image_url.encode("utf-8")).hexdigest() if image_url else None
+    key_data = {
+        "prompt": prompt,
+        "image_hash": image_hash,
+        "provider_name": provider_name,
+        "model": model,
+        "llm_config": _json_config(llm_config or {}),
+        "base_url": base_url,
+    }
+    serialized = json.dumps(key_data, sort_keys=True)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    Base class of the caches of language model responses, counting hits and misses.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, response: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieves a cached response.
+
+        Args:
+            key (str): The key of the request.
+
+        Returns:
+            Optional[str]: The cached response, None on a miss.
+        """
+        response = self._get(key)
+        with self._stats_lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Stores a response.
+
+        Args:
+            key (str): The key of the request.
+            response (str): The response of the language model.
+        """
+        self._set(key, response)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    A response cache persisted in a SQLite database, with optional TTL and size based eviction.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        """
+        Initializes the SQLiteResponseCache.
+
+        Args:
+            path (Optional[str]): The path of the SQLite database. Defaults to the SCRAPONTOLOGIES_CACHE_PATH
+                environment variable, or ".scrapontologies_cache.sqlite" in the working directory.
+            ttl (Optional[float]): The number of seconds after which an entry expires. Defaults to no expiration.
+            max_entries (Optional[int]): The maximum number of entries, the least recently used are evicted first.
+                Defaults to no limit.
+        """
+        super().__init__()
+        self.path = path or os.getenv("SCRAPONTOLOGIES_CACHE_PATH", ".scrapontologies_cache.sqlite")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, "
+                "response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return response
+
+    def _set(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits, server errors and overloads
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Status codes meaning that the provider is asking to slow down
+THROTTLE_STATUS_CODES = {429, 503, 529}
+
+# Rough number of tokens of an image in a vision request, used to estimate the request size
+IMAGE_TOKEN_ESTIMATE = 1000
+
+
+def estimate_tokens(prompt: str, num_images: int = 0, max_output_tokens: int = 0) -> int:
+    """
+    Estimates the number of tokens a request counts against a tokens-per-minute limit.
+
+    Args:
+        prompt (str): The prompt of the request.
+        num_images (int): The number of images sent with the prompt.
+        max_output_tokens (int): The maximum number of tokens of the response.
+
+    Returns:
+        int: The estimated number of tokens, about 4 characters per token.
+    """
+    return len(prompt) // 4 + num_images * IMAGE_TOKEN_ESTIMATE + max_output_tokens
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def _is_timeout(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError, requests.Timeout,
+                          requests.ConnectionError, httpx.TimeoutException, httpx.NetworkError)):
+        return True
+    # The provider SDKs raise their own timeout and connection errors
+    return any(name in type(error).__name__ for name in ("Timeout", "APIConnectionError"))
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _set_done(future: asyncio.Future) -> None:
+    # A cancelled waiter is already done
+    if not future.done():
+        future.set_result(None)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled continuously at a per-minute rate.
+
+    Acquiring more tokens than available reserves them ahead of time and returns how long the
+    caller has to wait, so that sync and async callers can share the same bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the TokenBucket.
+
+        Args:
+            rate_per_minute (float): The number of tokens added per minute.
+            capacity (Optional[float]): The maximum number of tokens that can accumulate. Defaults to the rate per minute.
+            clock (Callable[[], float]): The clock measuring the refill, in seconds. Defaults to time.monotonic.
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive.")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes tokens from the bucket.
+
+        Args:
+            amount (float): The number of tokens, capped at the capacity of the bucket.
+
+        Returns:
+            float: The number of seconds to wait before the tokens are actually available.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RequestScheduler:
+    """
+    Schedules the requests of a language model under rate limits.
+
+    Every request takes its share of optional requests-per-minute and tokens-per-minute token
+    buckets, runs within an adaptive concurrency limit and is retried with exponential backoff
+    and full jitter on rate limits, server errors and timeouts. The concurrency limit is halved
+    whenever the provider throttles and grows back by one request per window of successes.
+
+    A scheduler can be shared by several LLMClient instances using the same provider and model,
+    so that they split a single quota.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initializes the RequestScheduler.
+
+        Args:
+            requests_per_minute (Optional[float]): The requests per minute allowed by the provider. Defaults to no limit.
+            tokens_per_minute (Optional[float]): The tokens per minute allowed by the provider. Defaults to no limit.
+            max_concurrency (int): The maximum number of requests in flight. Defaults to 32.
+            min_concurrency (int): The number of requests in flight the adaptive limit never goes below. Defaults to 1.
+            max_retries (int): The maximum number of retries of a request. Defaults to 6.
+            initial_backoff (float): The backoff in seconds before the first retry, doubled at each retry. Defaults to 1.
+            max_backoff (float): The maximum backoff in seconds. Defaults to 60.
+            clock (Callable[[], float]): The clock refilling the rate limit buckets, in seconds. Defaults to time.monotonic.
+        """
+        if max_concurrency < 1 or not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("Concurrency limits must satisfy 1 <= min_concurrency <= max_concurrency.")
+        if max_retries < 0:
+            raise ValueError("max_retries must be at least 0.")
+
+        self.request_bucket = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # The futures of the coroutines waiting for a slot, with their event loop. Slots are released by threads
+        # and coroutines of any loop alike, so the waiters are woken with call_soon_threadsafe
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def run(self, func: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """
+        Runs a request, waiting for the rate limits and retrying it when it fails transiently.
+
+        Args:
+            func (Callable[[], Any]): The function sending the request.
+            estimated_tokens (int): The estimated number of tokens of the request.
+
+        Returns:
+            Any: The result of the function.
+        """
+        attempt = 0
+        while True:
+            time.sleep(self._reserve(estimated_tokens))
+            with self._condition:
+                self._condition.wait_for(lambda: self._in_flight < self.concurrency_limit)
+                self._in_flight += 1
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._notify()
+            time.sleep(delay)
+            attempt += 1
+
+    async def arun(self, func: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+        """
+        Asynchronous version of run.
+
+        Args:
+            func (Callable[[], Awaitable[Any]]): The coroutine function sending the request.
+            estimated_tokens (int): The estimated number of tokens of the request.
+
+        Returns:
+            Any: The result of the coroutine.
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(estimated_tokens))
+            while not self._try_enter():
+                await self._wait_for_slot()
+            try:
+                result = await func()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._notify()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and estimated_tokens:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        return wait
+
+    def _try_enter(self) -> bool:
+        with self._condition:
+            if self._in_flight >= self.concurrency_limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    async def _wait_for_slot(self) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            if self._in_flight < self.concurrency_limit:
+                return
+            self._async_waiters.append((loop, future))
+        await future
+
+    def _notify(self) -> None:
+        """Wakes the threads and the coroutines waiting for a slot, called with the condition held."""
+        self._condition.notify_all()
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_set_done, future)
+            except RuntimeError:
+                # The loop of the waiter is closed
+                pass
+        self._async_waiters.clear()
+
+    def _on_success(self) -> None:
+        with self._condition:
+            # Additive increase: one more request in flight after a full window of successes
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            self._notify()
+
+    def _on_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """Returns the number of seconds to wait before retrying, None if the error is not retried."""
+        status_code = _status_code(error)
+        if status_code is not None:
+            retryable = status_code in RETRYABLE_STATUS_CODES
+        else:
+            retryable = _is_timeout(error)
+        if not retryable or attempt >= self.max_retries:
+            return None
+
+        if status_code in THROTTLE_STATUS_CODES:
+            with self._condition:
+                # Multiplicative decrease when the provider asks to slow down
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+
+        delay = random.uniform(0, min(self.max_backoff, self.initial_backoff * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        logger.warning(
+            f"Request failed ({status_code or type(error).__name__}), retrying in {delay:.1f}s "
+            f"(attempt {attempt + 1}/{self.max_retries}, concurrency limit {self.concurrency_limit})"
+        )
+        return delay
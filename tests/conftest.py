@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Fake poppler commands, reading a fake PDF file holding the JSON list of its page texts
+FAKE_POPPLER = {
+    "pdfinfo": """
+pages = json.load(open(sys.argv[1]))
+print(f"Title: fake\\nPages:          {len(pages)}")
+""",
+    "pdftoppm": """
+from PIL import Image
+
+args = sys.argv[1:]
+if args == ["-v"]:
+    sys.exit(0)
+first_page, last_page, dpi, gray, positional = None, None, 150, False, []
+while args:
+    arg = args.pop(0)
+    if arg == "-f":
+        first_page = int(args.pop(0))
+    elif arg == "-l":
+        last_page = int(args.pop(0))
+    elif arg == "-r":
+        dpi = int(args.pop(0))
+    elif arg == "-gray":
+        gray = True
+    elif not arg.startswith("-"):
+        positional.append(arg)
+pdf_path, output_prefix = positional
+page_count = len(json.load(open(pdf_path)))
+# A letter page, pdftoppm zero-pads the page numbers to the width of the page count
+for page_num in range(first_page or 1, min(last_page or page_count, page_count) + 1):
+    image = Image.new("L" if gray else "RGB", (612 * dpi // 72, 792 * dpi // 72), "white")
+    image.save(f"{output_prefix}-{str(page_num).zfill(len(str(page_count)))}.png")
+""",
+    "pdftotext": """
+pages = json.load(open([arg for arg in sys.argv[1:] if not arg.startswith("-")][0]))
+sys.stdout.write("".join(page + "\\f" for page in pages))
+""",
+}
+
+
+class FakePoppler:
+    def __init__(self, directory):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "calls.log")
+
+    def pdf(self, name, page_texts):
+        """Writes a fake PDF file with the given page texts, returns its path."""
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as pdf_file:
+            json.dump(page_texts, pdf_file)
+        return path
+
+    def calls(self, command):
+        """The arguments of every call of a command, the version checks left out."""
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path) as log:
+            calls = [json.loads(line) for line in log]
+        return [call[1:] for call in calls if call[0] == command and call[1:] != ["-v"]]
+
+
+@pytest.fixture
+def fake_poppler(tmp_path, monkeypatch):
+    """Puts fake pdfinfo, pdftoppm and pdftotext commands first in the PATH, logging their calls."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    poppler = FakePoppler(str(tmp_path))
+    for command, body in FAKE_POPPLER.items():
+        script = bin_dir / command
+        script.write_text(
+            f"#!{sys.executable}\nimport json, os, sys\n"
+            "with open(os.environ['FAKE_POPPLER_LOG'], 'a') as log:\n"
+            "    log.write(json.dumps([os.path.basename(sys.argv[0])] + sys.argv[1:]) + '\\n')\n"
+            + body
+        )
+        script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_POPPLER_LOG", poppler.log_path)
+    return poppler
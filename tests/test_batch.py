@@ -0,0 +1,173 @@
+import json
+
+import httpx
+import pytest
+
+from scrapontologies.batch import AnthropicBatchBackend, OpenAIBatchBackend
+
+
+def make_requests(count, image_bytes=0):
+    image_url = "data:image/png;base64," + "A" * image_bytes
+    return [
+        (f"request-{index}", [{"role": "user", "content": [{"type": "text", "text": "extract"}, {"type": "image_url", "image_url": {"url": image_url}}]}])
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize("backend_class", [OpenAIBatchBackend, AnthropicBatchBackend])
+def test_split_by_request_count(backend_class):
+    backend = backend_class(httpx.Client(), "key", "model")
+    backend.max_batch_requests = 3
+
+    chunks = backend.split(make_requests(7))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert [custom_id for chunk in chunks for custom_id, _ in chunk] == [f"request-{index}" for index in range(7)]
+
+
+@pytest.mark.parametrize("backend_class", [OpenAIBatchBackend, AnthropicBatchBackend])
+def test_split_by_byte_size(backend_class):
+    backend = backend_class(httpx.Client(), "key", "model")
+    backend.max_batch_bytes = 3000
+
+    chunks = backend.split(make_requests(5, image_bytes=1000))
+
+    # Every request is about 1250 bytes, two of them fit in a job
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_split_rejects_a_request_above_the_size_limit():
+    backend = OpenAIBatchBackend(httpx.Client(), "key", "model")
+    backend.max_batch_bytes = 500
+
+    with pytest.raises(ValueError):
+        backend.split(make_requests(1, image_bytes=1000))
+
+
+class FakeBatchBackend(OpenAIBatchBackend):
+    def __init__(self):
+        super().__init__(httpx.Client(), "key", "model")
+        self.submitted = []
+        self.polls = {}
+
+    def submit(self, requests):
+        batch_id = f"batch-{len(self.submitted)}"
+        self.submitted.append(requests)
+        self.polls[batch_id] = 0
+        return batch_id
+
+    def poll(self, batch_id):
+        self.polls[batch_id] += 1
+        # The first job ends last
+        if self.polls[batch_id] < (3 if batch_id == "batch-0" else 2):
+            return None
+        return {"id": batch_id}
+
+    def results(self, batch):
+        requests = self.submitted[int(batch["id"].split("-")[1])]
+        return {custom_id: f"answer {custom_id}" for custom_id, _ in requests}
+
+
+def test_run_submits_chunks_and_polls_them_together():
+    backend = FakeBatchBackend()
+    backend.max_batch_requests = 2
+
+    responses = backend.run(make_requests(5), poll_interval=0)
+
+    assert [len(requests) for requests in backend.submitted] == [2, 2, 1]
+    assert backend.polls == {"batch-0": 3, "batch-1": 2, "batch-2": 2}
+    assert responses == {f"request-{index}": f"answer request-{index}" for index in range(5)}
+
+
+def jsonl(*lines):
+    return "\n".join(json.dumps(line) for line in lines)
+
+
+def test_openai_backend_uploads_the_requests_and_parses_the_results():
+    calls = []
+    polls = []
+
+    def handler(request):
+        calls.append((request.method, request.url.path))
+        assert request.headers["authorization"] == "Bearer key"
+        if request.url.path == "/v1/files":
+            # The requests are uploaded as a JSONL file
+            lines = [json.loads(line) for line in request.content.splitlines() if line.startswith(b'{"custom_id"')]
+            assert [line["custom_id"] for line in lines] == ["request-0", "request-1"]
+            assert lines[0]["body"]["model"] == "gpt-4o-mini" and lines[0]["body"]["temperature"] == 0
+            return httpx.Response(200, json={"id": "file-in"})
+        if request.url.path == "/v1/batches":
+            assert json.loads(request.content) == {
+                "input_file_id": "file-in", "endpoint": "/v1/chat/completions", "completion_window": "24h"
+            }
+            return httpx.Response(200, json={"id": "batch-1"})
+        if request.url.path == "/v1/batches/batch-1":
+            polls.append(1)
+            if len(polls) == 1:
+                return httpx.Response(200, json={"id": "batch-1", "status": "in_progress"})
+            return httpx.Response(200, json={"id": "batch-1", "status": "completed", "output_file_id": "file-out"})
+        if request.url.path == "/v1/files/file-out/content":
+            return httpx.Response(200, text=jsonl(
+                {"custom_id": "request-0", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "answer"}}]}}},
+                {"custom_id": "request-1", "response": {"status_code": 500, "body": {}}},
+            ))
+        return httpx.Response(404)
+
+    backend = OpenAIBatchBackend(
+        httpx.Client(transport=httpx.MockTransport(handler)), "key", "gpt-4o-mini", llm_config={"temperature": 0, "timeout": 5}
+    )
+
+    assert backend.run(make_requests(2), poll_interval=0) == {"request-0": "answer", "request-1": None}
+    assert calls[:2] == [("POST", "/v1/files"), ("POST", "/v1/batches")]
+    assert len(polls) == 2
+
+
+def test_openai_backend_raises_for_a_batch_without_output():
+    backend = OpenAIBatchBackend(httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(404))), "key", "gpt-4o-mini")
+
+    with pytest.raises(RuntimeError, match="failed"):
+        backend.results({"id": "batch-1", "status": "failed"})
+
+
+def test_anthropic_backend_converts_the_requests_and_parses_the_results():
+    submitted = []
+
+    def handler(request):
+        assert request.headers["x-api-key"] == "key"
+        if request.method == "POST" and request.url.path == "/v1/messages/batches":
+            submitted.append(json.loads(request.content))
+            return httpx.Response(200, json={"id": "msgbatch-1"})
+        if request.url.path == "/v1/messages/batches/msgbatch-1":
+            return httpx.Response(200, json={
+                "id": "msgbatch-1", "processing_status": "ended", "results_url": "https://results.example/msgbatch-1",
+            })
+        if request.url.host == "results.example":
+            return httpx.Response(200, text=jsonl(
+                {"custom_id": "request-0", "result": {"type": "succeeded", "message": {"content": [
+                    {"type": "text", "text": "ans"}, {"type": "tool_use"}, {"type": "text", "text": "wer"},
+                ]}}},
+                {"custom_id": "request-1", "result": {"type": "errored", "error": {"type": "overloaded_error"}}},
+            ))
+        return httpx.Response(404)
+
+    backend = AnthropicBatchBackend(
+        httpx.Client(transport=httpx.MockTransport(handler)), "key", "claude", llm_config={"stop": ["END"]}
+    )
+
+    assert backend.run(make_requests(2, image_bytes=4), poll_interval=0) == {"request-0": "answer", "request-1": None}
+
+    [request, _] = submitted[0]["requests"]
+    assert request["custom_id"] == "request-0"
+    # The stop sequences and the image data URLs are converted to the Anthropic format
+    assert request["params"]["max_tokens"] == AnthropicBatchBackend.default_max_tokens
+    assert request["params"]["stop_sequences"] == ["END"] and "stop" not in request["params"]
+    assert request["params"]["messages"][0]["content"][1] == {
+        "type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "AAAA"}
+    }
+
+
+def test_backend_errors_are_raised():
+    backend = AnthropicBatchBackend(httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(401))), "key", "claude")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        backend.submit(make_requests(1))
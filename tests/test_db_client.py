@@ -0,0 +1,198 @@
+from decimal import Decimal
+
+import pytest
+from psycopg2 import sql
+
+import scrapontologies.db_client as db_client
+from scrapontologies import Entity
+from scrapontologies.db_client import PostgresDBClient, _RowMapper, _Table, _column_value
+from scrapontologies.primitives import Record
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,234.50", Decimal("1234.50")),
+    ("1.234,50", Decimal("1234.50")),
+    ("2,5", Decimal("2.5")),
+    ("1,234,567", Decimal("1234567")),
+    ("$ 1 234", Decimal("1234")),
+    ("-12.5 %", Decimal("-12.5")),
+    (7, 7),
+])
+def test_numeric_values_are_parsed(value, expected):
+    assert _column_value(value, "numeric") == expected
+
+
+def test_integer_values_are_parsed():
+    assert _column_value("1,234", "integer") == 1234
+    assert _column_value("3.0", "integer") == 3
+
+
+@pytest.mark.parametrize("value, column_type", [
+    ("2.5", "integer"),
+    ("abc", "numeric"),
+    ("maybe", "boolean"),
+    (True, "integer"),
+    (float("inf"), "integer"),
+    (float("-inf"), "numeric"),
+    (Decimal("NaN"), "integer"),
+])
+def test_values_that_do_not_convert_raise(value, column_type):
+    with pytest.raises(ValueError):
+        _column_value(value, column_type)
+
+
+def test_na_values_are_null():
+    assert _column_value("NA", "integer") is None
+    assert _column_value("", "text") is None
+
+
+def test_load_records_requires_a_connection():
+    with pytest.raises(RuntimeError, match="not connected"):
+        PostgresDBClient().load_records([])
+
+
+def render(query):
+    """The text of a psycopg2 SQL composition, with the identifiers double quoted."""
+    if isinstance(query, sql.Composed):
+        return "".join(render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return ".".join(f'"{name}"' for name in query.strings)
+    if isinstance(query, sql.SQL):
+        return query.string
+    return str(query)
+
+
+# The columns of the tables, in the order the database lists them, the items before the invoices they reference
+COLUMNS = [
+    ("items", "id", "integer", "BY DEFAULT", "NEVER"),
+    ("items", "invoice_id", "integer", None, "NEVER"),
+    ("items", "sku", "text", None, "NEVER"),
+    ("items", "quantity", "integer", None, "NEVER"),
+    ("invoices", "id", "integer", "ALWAYS", "NEVER"),
+    ("invoices", "number", "text", None, "NEVER"),
+    ("invoices", "total", "numeric", None, "NEVER"),
+    ("invoices", "total_with_tax", "numeric", None, "ALWAYS"),
+]
+CONSTRAINTS = [
+    ("p", "items", "id", None, None, "public.items_id_seq"),
+    ("f", "items", "invoice_id", "invoices", "id", None),
+    ("p", "invoices", "id", None, None, "public.invoices_id_seq"),
+]
+
+
+class FakeCursor:
+    def __init__(self):
+        self.sequences = {}
+        self.copies = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        if "information_schema.columns" in query:
+            keys = ("table_name", "column_name", "data_type", "identity_generation", "is_generated")
+            self.rows = [dict(zip(keys, column)) for column in COLUMNS]
+        elif "pg_constraint" in query:
+            keys = ("contype", "table_name", "column_name", "foreign_table", "foreign_column", "sequence")
+            self.rows = [dict(zip(keys, constraint)) for constraint in CONSTRAINTS]
+        elif "nextval" in query:
+            sequence, count = params
+            first = self.sequences.get(sequence, 100)
+            self.sequences[sequence] = first + count
+            self.rows = [{"id": first + i} for i in range(count)]
+
+    def fetchall(self):
+        return self.rows
+
+    def copy_expert(self, query, buffer):
+        self.copies.append((render(query), buffer.read()))
+
+
+class FakeConnection:
+    closed = 0
+    committed = False
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def client():
+    client = PostgresDBClient()
+    client.conn = FakeConnection()
+    client.cursor = FakeCursor()
+    return client
+
+
+RECORDS = [
+    Record(id="a.pdf", entities=[Entity(id="invoice", type="object", attributes={
+        "number": "A-1\t2",
+        "total": "1,234.50",
+        "items": [{"sku": "a", "quantity": 2}, {"sku": "b", "quantity": "many"}],
+    })]),
+    Record(id="b.pdf", entities=[Entity(id="invoices", type="object", attributes={"number": "B-1", "items": [{"sku": "c"}]})]),
+]
+
+
+def test_load_records_copies_the_referenced_tables_first(client):
+    loaded = client.load_records(RECORDS)
+
+    assert loaded == {"invoices": 2, "items": 3}
+    assert client.conn.committed
+    assert client.cursor.copies == [
+        (
+            'COPY "public"."invoices" ("id", "number", "total") FROM STDIN',
+            "100\tA-1\\t2\t1234.50\n101\tB-1\t\\N\n",
+        ),
+        (
+            'COPY "public"."items" ("id", "invoice_id", "sku", "quantity") FROM STDIN',
+            # Every item references the id reserved for its invoice, the quantity that is not a number is NULL
+            "100\t100\ta\t2\n101\t100\tb\t\\N\n102\t101\tc\t\\N\n",
+        ),
+    ]
+
+
+def test_load_records_with_execute_values(client, monkeypatch):
+    inserts = []
+    monkeypatch.setattr(db_client, "execute_values", lambda cursor, query, values, page_size: inserts.append((render(query), values)))
+
+    loaded = client.load_records(RECORDS, method="values")
+
+    assert loaded == {"invoices": 2, "items": 3}
+    assert inserts == [
+        (
+            # The ids of the identity column generated always are the ones reserved from its sequence
+            'INSERT INTO "public"."invoices" ("id", "number", "total") OVERRIDING SYSTEM VALUE VALUES %s',
+            [[100, "A-1\t2", Decimal("1234.50")], [101, "B-1", None]],
+        ),
+        (
+            'INSERT INTO "public"."items" ("id", "invoice_id", "sku", "quantity") VALUES %s',
+            [[100, 100, "a", 2], [101, 100, "b", None], [102, 101, "c", None]],
+        ),
+    ]
+
+
+def test_load_records_writes_in_batches(client):
+    client.load_records(RECORDS, batch_size=1)
+
+    # Every record is written as soon as it fills a batch, with the columns its rows use, and the ids keep increasing
+    assert [query.split()[1] for query, _ in client.cursor.copies] == [
+        '"public"."invoices"', '"public"."items"', '"public"."invoices"', '"public"."items"'
+    ]
+    assert client.cursor.copies[2] == ('COPY "public"."invoices" ("id", "number") FROM STDIN', "101\tB-1\n")
+    assert client.cursor.copies[3] == ('COPY "public"."items" ("id", "invoice_id", "sku") FROM STDIN', "102\t101\tc\n")
+
+
+@pytest.mark.parametrize("name, table", [
+    ("invoice", "invoices"),
+    ("Invoices", "invoices"),
+    ("status", "status"),
+    ("statuses", "status"),
+    ("Address", "addresses"),
+    ("category", "categories"),
+    ("box", None),
+])
+def test_entities_match_tables_named_in_singular_or_plural(name, table):
+    mapper = _RowMapper({name: _Table(name) for name in ("invoices", "status", "addresses", "categories")})
+    assert getattr(mapper.table_for(name), "name", None) == table
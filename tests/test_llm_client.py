@@ -0,0 +1,53 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from scrapontologies import LLMClient
+
+
+def client():
+    return LLMClient("openai", "key", "gpt-4o-mini")
+
+
+def test_replaced_pools_are_closed_after_the_requests_in_flight():
+    llm_client = client()
+    old_pools = llm_client._http_pools
+    seen = []
+
+    def answer(messages):
+        # The pools are replaced while the request is in flight
+        llm_client.set_http_config({"max_connections": 10})
+        seen.append(old_pools.client.is_closed)
+        return "answer"
+
+    llm_client._chain = RunnableLambda(answer)
+
+    assert llm_client.get_response("prompt") == "answer"
+    assert seen == [False]
+    assert old_pools.client.is_closed and old_pools.async_client.is_closed
+    assert not llm_client._http_pools.client.is_closed
+    assert llm_client.get_llm().http_client is llm_client._http_pools.client
+
+
+def test_pools_without_requests_are_closed_when_replaced():
+    llm_client = client()
+    old_pools = llm_client._http_pools
+
+    llm_client.set_http_config({"max_connections": 10})
+
+    assert old_pools.client.is_closed and old_pools.async_client.is_closed
+
+
+def test_close_closes_both_pools():
+    llm_client = client()
+    llm_client.close()
+    assert llm_client._http_pools.client.is_closed and llm_client._http_pools.async_client.is_closed
+
+    llm_client = client()
+
+    async def main():
+        llm_client.close()
+        await asyncio.gather(*llm_client._closing_tasks)
+
+    asyncio.run(main())
+    assert llm_client._http_pools.async_client.is_closed
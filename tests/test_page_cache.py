@@ -0,0 +1,61 @@
+from scrapontologies import LLMClient, PDFParser
+from scrapontologies.parsers import PageCache
+from scrapontologies.parsers.page_cache import hash_file
+
+
+def test_the_least_recently_used_pages_are_evicted():
+    cache = PageCache(max_pages=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+
+    cache.set("c", "C")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_pages_persist_in_the_cache_directory(tmp_path):
+    PageCache(directory=str(tmp_path)).set("a", "A")
+
+    cache = PageCache(max_pages=1, directory=str(tmp_path))
+    assert cache.get("a") == "A"
+    # A page evicted from memory is read again from the directory
+    cache.set("b", "B")
+    assert len(cache) == 1 and cache.get("a") == "A"
+
+    cache.clear()
+    assert cache.get("a") is None and list(tmp_path.iterdir()) == []
+
+
+def test_keys_depend_on_the_content_and_the_render_settings(tmp_path):
+    first, second = tmp_path / "first.pdf", tmp_path / "second.pdf"
+    first.write_bytes(b"same content")
+    second.write_bytes(b"same content")
+    assert hash_file(str(first)) == hash_file(str(second))
+
+    keys = {
+        PageCache.make_key(hash_file(str(first)), 1, (150, False)),
+        PageCache.make_key(hash_file(str(first)), 2, (150, False)),
+        PageCache.make_key(hash_file(str(first)), 1, (300, False)),
+    }
+    assert len(keys) == 3
+
+
+def test_only_the_pages_missing_from_the_cache_are_rasterized(fake_poppler):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), page_cache=PageCache(), render_window=4)
+    pdf_path = fake_poppler.pdf("document.pdf", [""] * 3)
+
+    first, _ = parser._load_pdf_pages(pdf_path)
+    copy_path = fake_poppler.pdf("copy.pdf", [""] * 3)
+    second, _ = parser._load_pdf_pages(copy_path)
+
+    # The copy has the same content, its pages are reused
+    assert first == second
+    assert len(fake_poppler.calls("pdftoppm")) == 1
+
+    # Other render settings rasterize the pages again
+    parser.dpi = 72
+    parser._load_pdf_pages(pdf_path)
+    assert len(fake_poppler.calls("pdftoppm")) == 2
@@ -0,0 +1,117 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from scrapontologies import LLMClient, PDFParser
+from scrapontologies.parsers.pdf_parser import _page_windows, encode_image_in_memory, encode_pdf_pages, iter_pdf_images
+
+
+def decode(base64_image):
+    return Image.open(io.BytesIO(base64.b64decode(base64_image)))
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "WEBP", "PNG", "jpeg"])
+def test_images_are_encoded_in_memory(image_format):
+    image = Image.new("RGB", (40, 20), "red")
+
+    decoded = decode(encode_image_in_memory(image, image_format))
+
+    assert decoded.format == image_format.upper() and decoded.size == (40, 20)
+
+
+def test_images_with_alpha_are_converted_for_jpeg():
+    decoded = decode(encode_image_in_memory(Image.new("RGBA", (10, 10)), "JPEG"))
+    assert decoded.mode == "RGB"
+
+
+def test_quality_applies_to_lossy_formats():
+    image = Image.effect_noise((64, 64), 50).convert("RGB")
+
+    low, high = (len(encode_image_in_memory(image, "JPEG", quality)) for quality in (10, 95))
+
+    assert low < high
+
+
+def test_unsupported_formats_are_rejected():
+    with pytest.raises(ValueError, match="Unsupported image format"):
+        encode_image_in_memory(Image.new("RGB", (1, 1)), "GIF")
+
+
+def test_pdf_pages_are_encoded_in_page_order(fake_poppler):
+    pdf_path = fake_poppler.pdf("document.pdf", ["", ""])
+
+    pages = list(encode_pdf_pages(pdf_path, image_format="PNG"))
+
+    assert [page_num for page_num, _ in pages] == [1, 2]
+    assert decode(pages[0][1]).format == "PNG"
+    assert decode(pages[0][1]).size == (1275, 1650)
+
+
+def page_ranges(calls):
+    return [(int(call[call.index("-f") + 1]), int(call[call.index("-l") + 1])) for call in calls]
+
+
+@pytest.mark.parametrize("pages, window_size, windows", [
+    ([1, 2, 3, 4, 5], 2, [(1, 2), (3, 4), (5, 5)]),
+    ([5, 1, 2, 7, 8, 9], 3, [(1, 2), (5, 5), (7, 9)]),
+    ([1, 2, 3], 1, [(1, 1), (2, 2), (3, 3)]),
+    ([], 4, []),
+])
+def test_page_windows_group_consecutive_pages(pages, window_size, windows):
+    assert list(_page_windows(pages, window_size)) == windows
+
+
+def test_pages_are_rasterized_a_window_at_a_time(fake_poppler):
+    pdf_path = fake_poppler.pdf("document.pdf", [""] * 12)
+
+    images = iter_pdf_images(pdf_path, window_size=4)
+    first = next(images)
+
+    # Only the first window is rasterized until the next pages are requested
+    assert first[0] == 1
+    assert page_ranges(fake_poppler.calls("pdftoppm")) == [(1, 4)]
+
+    assert [page_num for page_num, _ in images] == list(range(2, 13))
+    assert page_ranges(fake_poppler.calls("pdftoppm")) == [(1, 4), (5, 8), (9, 12)]
+
+
+def test_only_the_requested_pages_are_rasterized(fake_poppler):
+    pdf_path = fake_poppler.pdf("document.pdf", [""] * 12)
+
+    assert [page_num for page_num, _ in iter_pdf_images(pdf_path, window_size=4, pages=[11, 2, 3, 10])] == [2, 3, 10, 11]
+    assert page_ranges(fake_poppler.calls("pdftoppm")) == [(2, 3), (10, 11)]
+    # The page count is not needed for an explicit page list
+    assert fake_poppler.calls("pdfinfo") == []
+
+
+def test_render_settings_are_passed_to_pdftoppm(fake_poppler):
+    pdf_path = fake_poppler.pdf("document.pdf", [""])
+
+    [(_, image)] = iter_pdf_images(pdf_path, dpi=72, grayscale=True)
+
+    [call] = fake_poppler.calls("pdftoppm")
+    assert call[call.index("-r") + 1] == "72" and "-gray" in call
+    assert image.mode == "L" and image.size == (612, 792)
+
+
+@pytest.mark.parametrize("max_dimension, size", [(396, (306, 396)), (2000, (1275, 1650))])
+def test_pages_are_downscaled_to_the_max_dimension_keeping_their_aspect_ratio(fake_poppler, max_dimension, size):
+    pdf_path = fake_poppler.pdf("document.pdf", [""])
+
+    [(_, image)] = iter_pdf_images(pdf_path, max_dimension=max_dimension)
+
+    # Pages smaller than the max dimension are not upscaled
+    assert image.size == size
+
+
+def test_parser_render_options_apply_to_the_encoded_pages(fake_poppler):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), dpi=100, grayscale=True, max_image_dimension=500, image_format="PNG")
+    pdf_path = fake_poppler.pdf("document.pdf", [""])
+
+    [(_, base64_image)] = parser.iter_encoded_pages(pdf_path)
+
+    image = decode(base64_image)
+    assert (image.format, image.mode, max(image.size)) == ("PNG", "L", 500)
+    assert parser._image_data_url(base64_image).startswith("data:image/png;base64,")
@@ -0,0 +1,422 @@
+import asyncio
+import json
+import subprocess
+import threading
+
+import pytest
+from openai.lib._pydantic import to_strict_json_schema
+
+from scrapontologies import Entity, LLMClient, PDFParser, SQLiteCheckpointer
+from scrapontologies.parsers.pdf_parser import EntitiesOutput, RelationsOutput, _SchemaUpdate
+
+
+@pytest.fixture
+def parser():
+    return PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), pages_per_request=3)
+
+
+def test_mixed_page_group_labels_every_page(parser):
+    pages = [(1, None, None), (2, None, "A text layer long enough to be used for the page"), (3, None, None)]
+    parser._image_data_url = lambda base64_image: "data:image/jpeg;base64,IMAGE"
+
+    prompt, image_urls = parser._page_group_request(lambda _: "Extract the data.", pages)
+
+    assert "Page 2:" in prompt
+    assert image_urls == [
+        {"type": "text", "text": "Page 1:"},
+        "data:image/jpeg;base64,IMAGE",
+        {"type": "text", "text": "Page 3:"},
+        "data:image/jpeg;base64,IMAGE",
+    ]
+
+    # Every image follows its label in the message sent to the model
+    content = parser.llm_client._build_messages(prompt, image_urls)[0]["content"]
+    assert [part["type"] for part in content] == ["text", "text", "image_url", "text", "image_url"]
+    assert content[1]["text"] == "Page 1:" and content[3]["text"] == "Page 3:"
+
+    answer = "```json\n" + json.dumps({"page_1": {"a": 1}, "page_2": {"b": 2}, "page_3": {"c": 3}}) + "\n```"
+    assert parser._split_page_group_answer(answer, pages) == {1: '{"a": 1}', 2: '{"b": 2}', 3: '{"c": 3}'}
+
+
+def strict_schema_errors(schema, path="$"):
+    """The places of a JSON schema that the strict structured output mode of OpenAI rejects."""
+    errors = []
+    if isinstance(schema, dict):
+        if schema.get("type") == "object" or "properties" in schema:
+            if schema.get("additionalProperties") is not False:
+                errors.append(f"{path}: additionalProperties must be false")
+            if sorted(schema.get("required", [])) != sorted(schema.get("properties", {})):
+                errors.append(f"{path}: every property must be required")
+        if schema.get("default") is not None:
+            errors.append(f"{path}: defaults are not supported")
+        for key, value in schema.items():
+            errors.extend(strict_schema_errors(value, f"{path}.{key}"))
+    elif isinstance(schema, list):
+        for index, value in enumerate(schema):
+            errors.extend(strict_schema_errors(value, f"{path}[{index}]"))
+    return errors
+
+
+@pytest.mark.parametrize("output_class", [EntitiesOutput, RelationsOutput])
+def test_structured_output_schemas_are_strict_compatible(output_class):
+    # The schema the OpenAI SDK sends for with_structured_output in its default json_schema mode
+    assert strict_schema_errors(to_strict_json_schema(output_class)) == []
+
+
+def test_structured_output_attributes_keep_their_structure():
+    output = EntitiesOutput.model_validate({"entities": [{
+        "id": "fund",
+        "type": "object",
+        "attributes": [
+            {"name": "salesCharges", "type": "string", "attributes": []},
+            {"name": "fundExpenses", "type": "object", "attributes": [{"name": "managementExpenseRatio", "type": "number", "attributes": []}]},
+        ],
+    }]})
+
+    assert output.entities[0].to_entity() == Entity(
+        id="fund", type="object", attributes={"salesCharges": "string", "fundExpenses": {"managementExpenseRatio": "number"}}
+    )
+
+
+def no_pages(path):
+    return iter([])
+
+
+def failed_conversion(path):
+    raise subprocess.CalledProcessError(1, ["pdftoppm"])
+    yield
+
+
+@pytest.mark.parametrize("iter_document_pages", [no_pages, failed_conversion])
+def test_record_snapshots_of_a_document_without_pages(parser, tmp_path, iter_document_pages):
+    file_path = tmp_path / "empty.pdf"
+    file_path.write_bytes(b"")
+    parser._json_schema = {"type": "object", "properties": {"invoice": {"type": "object"}}}
+    parser._iter_document_pages = iter_document_pages
+
+    assert list(parser.iter_record_snapshots(str(file_path))) == []
+
+    async def collect():
+        return [record async for record in parser.aiter_record_snapshots(str(file_path))]
+
+    assert asyncio.run(collect()) == []
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_checkpointed_extraction_requests_only_the_failed_pages_again(tmp_path, use_async):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), checkpointer=checkpointer)
+    file_path = tmp_path / "document.pdf"
+    file_path.write_bytes(b"%PDF-1.4")
+    parser._json_schema = {"type": "object", "properties": {"pages": {"type": "array", "items": {"type": "string"}}}}
+    parser._load_pdf_pages = lambda path: (["IMG1", "IMG2", "IMG3"], [None, None, None])
+
+    requested, failing = [], {"IMG2"}
+
+    def get_response(prompt, image_url=None):
+        image = image_url.rsplit(",", 1)[-1]
+        requested.append(image)
+        if image in failing:
+            raise RuntimeError("The request was rejected by the content filter")
+        return "```json\n" + json.dumps({"pages": [image]}) + "\n```"
+
+    async def aget_response(prompt, image_url=None):
+        return get_response(prompt, image_url)
+
+    parser.llm_client.get_response = get_response
+    parser.llm_client.aget_response = aget_response
+
+    def extract():
+        if not use_async:
+            return list(parser.iter_entities_from_file(str(file_path)))
+
+        async def collect():
+            return [result async for result in parser.aiter_entities_from_file(str(file_path))]
+
+        return asyncio.run(collect())
+
+    [result] = extract()
+    assert result.error is None
+    assert result.failed_pages == [2]
+    assert result.record.entities == [Entity(id="pages", type="object", attributes=["IMG1", "IMG3"])]
+    assert sorted(requested) == ["IMG1", "IMG2", "IMG3"]
+    # The thread is kept for the failed page
+    assert list(checkpointer.list(None))
+
+    requested.clear()
+    failing.clear()
+    [result] = extract()
+    assert requested == ["IMG2"]
+    assert result.failed_pages == []
+    assert result.record.entities == [Entity(id="pages", type="object", attributes=["IMG1", "IMG2", "IMG3"])]
+    assert list(checkpointer.list(None)) == []
+    checkpointer.close()
+
+
+def test_a_failed_file_does_not_stop_the_others(parser, tmp_path):
+    parser._json_schema = {"type": "object", "properties": {"pages": {"type": "array"}}}
+    file_paths = [str(tmp_path / "missing.pdf"), str(tmp_path / "broken.pdf"), str(tmp_path / "document.pdf")]
+    for path in file_paths[1:]:
+        open(path, "wb").close()
+
+    def invoke(state):
+        if state.file_path.endswith("broken.pdf"):
+            raise ValueError("Error merging extracted data")
+        return {"entities": [Entity(id="pages", type="object", attributes=[1])]}
+
+    parser._invoke_extract_graph = invoke
+
+    records = parser.extract_entities_from_file(file_paths)
+    assert [record.id for record in records] == [file_paths[2]]
+
+
+def test_async_record_snapshots_load_the_pages_off_the_event_loop(parser, tmp_path):
+    file_path = tmp_path / "document.pdf"
+    file_path.write_bytes(b"%PDF-1.4")
+    parser._json_schema = {"type": "object", "properties": {"pages": {"type": "array"}}}
+    loading_threads = []
+
+    def iter_document_pages(path):
+        loading_threads.append(threading.current_thread())
+        yield 1, "IMG1", None
+
+    async def aget_response(prompt, image_url=None):
+        return "```json\n" + json.dumps({"pages": [1]}) + "\n```"
+
+    parser._iter_document_pages = iter_document_pages
+    parser.llm_client.aget_response = aget_response
+
+    async def collect():
+        return [record async for record in parser.aiter_record_snapshots(str(file_path))]
+
+    [record] = asyncio.run(collect())
+    assert record.entities == [Entity(id="pages", type="object", attributes=[1])]
+    assert loading_threads != [threading.main_thread()]
+
+
+def test_schema_update_keeps_the_pages_without_a_schema_pending():
+    update = _SchemaUpdate()
+    update.add_document("a.pdf", "doc", ["h1", "h2", "h3"], {1: "h1", 2: "h2", 3: "h3"})
+
+    update.add_answers("a.pdf", ['Page 1: {"type": "object"}', "Page 2: ", "Page 3: {}"])
+
+    assert update.answered_page_hashes == ["h1", "h3"]
+    assert update.completed_documents() == {}
+
+    update.add_answers("a.pdf", ['Page 2: {"type": "object"}'])
+    assert update.completed_documents() == {"doc": {"path": "a.pdf", "pages": ["h1", "h2", "h3"]}}
+
+
+def test_pages_that_fail_to_encode_keep_the_page_numbers(parser):
+    # Page 2 failed to encode and is missing from the encoded pages
+    parser.iter_encoded_pages = lambda path, pages=None: iter([(1, "IMG1"), (3, "IMG3")])
+
+    base64_images, page_texts = parser._load_pdf_pages("document.pdf")
+
+    assert base64_images == ["IMG1", None, "IMG3"]
+    assert page_texts == [None, None, None]
+    assert parser._page_groups(base64_images, page_texts) == [[(1, "IMG1", None), (3, "IMG3", None)]]
+
+
+def test_record_snapshots_rasterize_the_pages_as_they_are_extracted(tmp_path):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"))
+    file_path = tmp_path / "document.pdf"
+    file_path.write_bytes(b"%PDF-1.4")
+    parser._json_schema = {"type": "object", "properties": {"pages": {"type": "array"}}}
+    encoded = []
+
+    def iter_encoded_pages(path, pages=None):
+        for page_num in range(1, 11):
+            encoded.append(page_num)
+            yield page_num, f"IMG{page_num}"
+
+    parser.iter_encoded_pages = iter_encoded_pages
+    parser.llm_client.get_response = lambda prompt, image_url=None: (
+        "```json\n" + json.dumps({"pages": [image_url.rsplit(",", 1)[-1]]}) + "\n```"
+    )
+
+    snapshots = parser.iter_record_snapshots(str(file_path))
+    first = next(snapshots)
+    assert first.entities == [Entity(id="pages", type="object", attributes=["IMG1"])]
+    assert encoded == [1]
+
+    *_, last = snapshots
+    assert last.entities == [Entity(id="pages", type="object", attributes=[f"IMG{page_num}" for page_num in range(1, 11)])]
+
+
+def test_pages_missing_from_a_packed_batch_answer_are_sent_again_alone(parser, tmp_path):
+    file_path = tmp_path / "document.pdf"
+    file_path.write_bytes(b"%PDF-1.4")
+    parser._json_schema = {"type": "object", "properties": {"pages": {"type": "array"}}}
+    parser._load_pdf_pages = lambda path, executor=None: (["IMG1", "IMG2", "IMG3", "IMG4"], [None] * 4)
+    submitted = []
+
+    def get_batch_responses(prompts, poll_interval=30.0, timeout=None):
+        submitted.append(prompts)
+        if len(submitted) == 1:
+            # Page 2 is missing from the answer of the first group, the request of the second group failed
+            return ["```json\n" + json.dumps({"page_1": {"pages": [1]}, "page_3": {"pages": [3]}}) + "\n```", None]
+        return ["```json\n" + json.dumps({"pages": [2]}) + "\n```"]
+
+    parser.llm_client.get_batch_responses = get_batch_responses
+
+    [record] = parser.extract_entities_from_file(str(file_path), batch=True, batch_poll_interval=0)
+
+    assert len(submitted) == 2
+    # Only page 2 is sent again, the page of a group of its own that failed is not
+    assert [image_url.rsplit(",", 1)[-1] for _, image_url in submitted[1]] == ["IMG2"]
+    assert record.entities == [Entity(id="pages", type="object", attributes=[1, 2, 3])]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_a_merge_answer_without_a_schema_keeps_the_valid_schemas_of_the_group(parser, use_async):
+    schemas = [
+        json.dumps({"type": "object", "properties": {"number": {"type": "string"}}}),
+        "{'type': 'object'",
+        json.dumps({"type": "object", "properties": {"total": {"type": "number"}}}),
+    ]
+    parser.llm_client.get_response = lambda prompt, image_url=None: "I cannot merge these schemas."
+
+    async def aget_response(prompt, image_url=None):
+        return "I cannot merge these schemas."
+
+    parser.llm_client.aget_response = aget_response
+
+    merged = asyncio.run(parser._amerge_json_schema_group(schemas)) if use_async else parser._merge_json_schema_group(schemas)
+
+    assert json.loads(merged) == {"type": "object", "properties": {"number": {"type": "string"}, "total": {"type": "number"}}}
+    assert parser._merge_json_schema_group(["not json", "[1]"]) == ""
+
+
+def test_pages_with_enough_text_skip_the_rasterization(fake_poppler):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), use_text_layer=True, min_text_length=20)
+    long_text = "Invoice 42, total due 1,234.50 EUR"
+    # Whitespace does not count towards the threshold
+    pdf_path = fake_poppler.pdf("document.pdf", [long_text, "  scanned \n page  " + " " * 40, long_text, ""])
+
+    base64_images, page_texts = parser._load_pdf_pages(pdf_path)
+
+    assert page_texts == [long_text, None, long_text, None]
+    assert [image is not None for image in base64_images] == [False, True, False, True]
+    assert [call[call.index("-f") + 1] for call in fake_poppler.calls("pdftoppm")] == ["2", "4"]
+
+    # The pages sent as text carry it in the prompt instead of an image
+    prompt, image_url = parser._page_group_request(lambda _: "Extract the data.", [(1, None, long_text)])
+    assert long_text in prompt and image_url is None
+
+
+def test_the_text_layer_is_not_read_by_default(fake_poppler):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"))
+    pdf_path = fake_poppler.pdf("document.pdf", ["Invoice 42, total due 1,234.50 EUR" * 10])
+
+    base64_images, page_texts = parser._load_pdf_pages(pdf_path)
+
+    assert base64_images[0] is not None and page_texts == [None]
+    assert fake_poppler.calls("pdftotext") == []
+
+
+def test_batch_ingestion_rasterizes_in_worker_processes(fake_poppler):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"))
+    parser._json_schema = {"type": "object", "properties": {"pages": {"type": "array"}}}
+    file_paths = [fake_poppler.pdf(f"document-{index}.pdf", [""] * (index + 1)) for index in range(3)]
+    file_paths.append(fake_poppler.pdf("missing.pdf", []) + ".gone")
+    threads = set()
+
+    def get_response(prompt, image_url=None):
+        threads.add(threading.current_thread())
+        return "```json\n" + json.dumps({"pages": [len(image_url)]}) + "\n```"
+
+    parser.llm_client.get_response = get_response
+
+    records = list(parser.extract_entities_batch(file_paths, max_documents=2, rasterize_workers=1))
+
+    assert sorted(record.id for record in records) == file_paths[:3]
+    for record in records:
+        page_count = int(record.id.rsplit("-", 1)[-1].split(".")[0]) + 1
+        assert len(record.entities[0].attributes) == page_count
+    # The pages are rasterized by the fake pdftoppm in the worker process, the LLM calls run in threads
+    assert len(fake_poppler.calls("pdftoppm")) == 6
+    assert threading.main_thread() not in threads
+
+
+def test_page_requests_run_concurrently_in_page_order():
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), max_concurrency=3)
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(3)
+
+    def get_response(prompt, image_url=None):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        page = image_url.rsplit(",", 1)[-1]
+        if page in ("IMG1", "IMG2", "IMG3"):
+            # The first three pages are in flight together
+            barrier.wait(timeout=5)
+        with lock:
+            in_flight.pop()
+        return "```json\n" + json.dumps({"page": page}) + "\n```"
+
+    parser.llm_client.get_response = get_response
+
+    answers = parser._extract_page_answers("Extract the data.", [f"IMG{page_num}" for page_num in range(1, 7)])
+
+    assert [json.loads(answer)["page"] for answer in answers] == [f"IMG{page_num}" for page_num in range(1, 7)]
+    assert max(peak) == 3
+
+
+def test_async_page_requests_are_awaited_concurrently():
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), max_concurrency=2)
+    in_flight = []
+    peak = []
+
+    async def aget_response(prompt, image_url=None):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return "```json\n" + json.dumps({"page": image_url.rsplit(",", 1)[-1]}) + "\n```"
+
+    def get_response(prompt, image_url=None):
+        raise AssertionError("The async path must not block on the synchronous client")
+
+    parser.llm_client.aget_response = aget_response
+    parser.llm_client.get_response = get_response
+
+    answers = asyncio.run(parser._aextract_page_answers("Extract the data.", ["IMG1", "IMG2", "IMG3", "IMG4", "IMG5"]))
+
+    assert [json.loads(answer)["page"] for answer in answers] == ["IMG1", "IMG2", "IMG3", "IMG4", "IMG5"]
+    # No more than max_concurrency requests are awaited at a time
+    assert max(peak) == 2
+
+
+def test_one_parser_serves_concurrent_extractions(fake_poppler):
+    parser = PDFParser(LLMClient("openai", "key", "gpt-4o-mini"), use_text_layer=True, min_text_length=10)
+    parser._json_schema = {"type": "object", "properties": {"document": {"type": "string"}}}
+    file_paths = {name: fake_poppler.pdf(f"{name}.pdf", [f"This is the document {name}"]) for name in ("alpha", "beta")}
+    barrier = threading.Barrier(2)
+
+    def get_response(prompt, image_url=None):
+        # Both extractions are in flight on the same parser at the same time
+        barrier.wait(timeout=5)
+        name = "alpha" if "document alpha" in prompt else "beta"
+        return "```json\n" + json.dumps({"document": name}) + "\n```"
+
+    parser.llm_client.get_response = get_response
+    results = {}
+
+    def extract(name):
+        [record] = parser.extract_entities_from_file(file_paths[name])
+        results[name] = record
+
+    threads = [threading.Thread(target=extract, args=(name,)) for name in file_paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    for name, record in results.items():
+        assert record.id == file_paths[name]
+        assert record.entities == [Entity(id="document", type="object", attributes=name)]
+    assert len(results) == 2
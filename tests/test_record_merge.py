@@ -0,0 +1,48 @@
+from scrapontologies.parsers.record_merge import RecordAccumulator, merge_records
+
+
+def test_fields_na_on_every_page_are_dropped():
+    merged = merge_records([{"top": "NA", "invoice": {"number": "", "date": None}}, {"top": None, "invoice": {"number": "7"}}])
+
+    assert merged == {"invoice": {"number": "7"}}
+
+
+def test_first_non_na_value_wins_and_records_are_not_modified():
+    first = {"invoice": {"number": "NA", "items": [{"sku": "a"}]}}
+    second = {"invoice": {"number": "7", "items": [{"sku": "b"}, "NA"]}}
+
+    merged = merge_records([first, second])
+
+    assert merged == {"invoice": {"number": "7", "items": [{"sku": "a"}, {"sku": "b"}]}}
+    assert first == {"invoice": {"number": "NA", "items": [{"sku": "a"}]}}
+
+
+def test_list_deduplication_is_opt_in():
+    pages = [{"tags": ["a", "b", {"x": 1}]}, {"tags": ["b", "c", {"x": 1}, 1, True]}]
+
+    assert merge_records(pages)["tags"] == ["a", "b", {"x": 1}, "b", "c", {"x": 1}, 1, True]
+    # 1 and True are told apart by their type
+    assert merge_records(pages, dedupe_lists=True)["tags"] == ["a", "b", {"x": 1}, "c", 1, True]
+
+
+def test_list_key_merges_items_across_pages():
+    pages = [{"rows": [{"id": 1, "amount": "NA"}]}, {"rows": [{"id": 1, "amount": 5}, {"id": 2, "amount": 3}]}]
+
+    assert merge_records(pages, list_key="id")["rows"] == [{"id": 1, "amount": 5}, {"id": 2, "amount": 3}]
+
+
+def test_accumulator_matches_merge_records():
+    pages = [{"a": {"b": "NA"}, "c": [1]}, {"a": {"b": 2}, "c": [1, 2]}]
+    accumulator = RecordAccumulator(dedupe_lists=True)
+    for page in pages:
+        accumulator.add(page)
+
+    assert accumulator.merged == merge_records(pages, dedupe_lists=True) == {"a": {"b": 2}, "c": [1, 2]}
+
+
+def test_items_differing_only_by_value_type_are_kept():
+    pages = [{"rows": [{"a": 1}, [1, "x"], {"a": {"b": 1}, "c": [1]}]}, {"rows": [{"a": True}, [True, "x"], {"a": {"b": True}, "c": [1]}, {"a": 1}]}]
+
+    assert merge_records(pages, dedupe_lists=True)["rows"] == [
+        {"a": 1}, [1, "x"], {"a": {"b": 1}, "c": [1]}, {"a": True}, [True, "x"], {"a": {"b": True}, "c": [1]}
+    ]
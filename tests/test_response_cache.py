@@ -0,0 +1,123 @@
+import httpx
+import pytest
+
+import scrapontologies.response_cache as response_cache
+from scrapontologies import LLMClient, SQLiteResponseCache
+from scrapontologies.response_cache import make_cache_key
+
+
+def key(**overrides):
+    arguments = {
+        "prompt": "prompt",
+        "image_url": None,
+        "provider_name": "openai",
+        "model": "gpt-4o-mini",
+        "llm_config": {"temperature": 0},
+        **overrides,
+    }
+    return make_cache_key(**arguments)
+
+
+def test_cache_keys_tell_requests_apart():
+    assert key() == key()
+    assert len({
+        key(),
+        key(prompt="other"),
+        key(image_url="data:image/png;base64,AAAA"),
+        key(model="gpt-4o"),
+        key(llm_config={"temperature": 1}),
+        key(base_url="http://localhost:8000/v1"),
+    }) == 6
+
+
+def test_the_labels_of_packed_images_are_part_of_the_key():
+    images = ["data:image/png;base64,AAAA", "data:image/png;base64,BBBB"]
+    labeled = [{"type": "text", "text": "Page 1:"}, images[0], {"type": "text", "text": "Page 2:"}, images[1]]
+    relabeled = [{"type": "text", "text": "Page 3:"}, images[0], {"type": "text", "text": "Page 4:"}, images[1]]
+
+    assert len({key(image_url=images), key(image_url=labeled), key(image_url=relabeled)}) == 3
+
+
+def test_only_the_json_values_of_the_config_are_part_of_the_key():
+    # The clients are different objects in every process, they do not change the responses
+    config = {"temperature": 0, "http_client": httpx.Client(), "stop": ["END", object()]}
+
+    assert key(llm_config=config) == key(llm_config={"temperature": 0, "stop": ["END"]})
+
+
+def test_clients_sharing_a_configuration_share_their_keys():
+    first = LLMClient("openai", "key", "gpt-4o-mini", llm_config={"temperature": 0, "http_client": httpx.Client()})
+    second = LLMClient("openai", "key", "gpt-4o-mini", llm_config={"temperature": 0, "http_client": httpx.Client()})
+    local = LLMClient("openai", "key", "gpt-4o-mini", base_url="http://localhost:8000/v1", llm_config={"temperature": 0})
+
+    assert first._cache_key("prompt", None) == second._cache_key("prompt", None)
+    assert first._cache_key("prompt", None) != local._cache_key("prompt", None)
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        # Every call is a distinct instant, so that the access order is unambiguous
+        self.now += 0.001
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), ttl=60)
+    cache.set("a", "answer")
+
+    clock.now += 30
+    assert cache.get("a") == "answer"
+    clock.now += 31
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.get_stats() == {"hits": 1, "misses": 1}
+
+
+def test_the_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+
+    cache.set("c", "C")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SQLiteResponseCache(path)
+    cache.set("a", "answer")
+    cache.close()
+
+    cache = SQLiteResponseCache(path)
+    assert cache.get("a") == "answer"
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_cached_responses_are_not_requested_again(tmp_path):
+    llm_client = LLMClient("openai", "key", "gpt-4o-mini", response_cache=SQLiteResponseCache(str(tmp_path / "cache.sqlite")))
+    prompts = []
+
+    class Chain:
+        def invoke(self, messages):
+            prompts.append(messages[0]["content"])
+            return f"answer {len(prompts)}"
+
+    llm_client._chain = Chain()
+
+    assert llm_client.get_response("prompt") == "answer 1"
+    assert llm_client.get_response("prompt") == "answer 1"
+    assert llm_client.get_response("other") == "answer 2"
+    assert prompts == ["prompt", "other"]
@@ -0,0 +1,184 @@
+import asyncio
+
+import httpx
+import pytest
+
+from scrapontologies import LLMClient, RequestScheduler
+from scrapontologies.scheduler import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = httpx.Response(status_code, headers=headers or {})
+
+
+def test_token_bucket_reserves_ahead_and_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)
+
+    assert bucket.reserve(60) == 0.0
+    # One token per second, the next caller waits for the tokens it takes
+    assert bucket.reserve(2) == pytest.approx(2.0)
+    assert bucket.reserve(1) == pytest.approx(3.0)
+
+    clock.now = 3.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+    # The refill is capped at the capacity, and so are the requests larger than it
+    clock.now = 1000.0
+    assert bucket.reserve(600) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_scheduler_waits_for_the_rate_limits():
+    clock = FakeClock()
+    scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=600, clock=clock)
+
+    assert scheduler._reserve(500) == 0.0
+    # The token bucket has 100 tokens left and refills 10 per second
+    assert scheduler._reserve(300) == pytest.approx(20.0)
+
+
+def test_concurrency_limit_decreases_multiplicatively_and_increases_additively():
+    scheduler = RequestScheduler(max_concurrency=8, initial_backoff=0)
+
+    scheduler._on_error(StatusError(429), 0)
+    assert scheduler.concurrency_limit == 4
+    scheduler._on_error(StatusError(503), 0)
+    assert scheduler.concurrency_limit == 2
+
+    # About one more request in flight after a full window of successes
+    scheduler._on_success()
+    scheduler._on_success()
+    assert scheduler.concurrency_limit == 2
+    scheduler._on_success()
+    assert scheduler.concurrency_limit == 3
+
+    # Server errors are retried without slowing down
+    scheduler._on_error(StatusError(500), 0)
+    assert scheduler.concurrency_limit == 3
+
+    for _ in range(100):
+        scheduler._on_error(StatusError(429), 0)
+    assert scheduler.concurrency_limit == scheduler.min_concurrency
+
+
+@pytest.mark.parametrize("error, retried", [
+    (StatusError(429), True),
+    (StatusError(500), True),
+    (StatusError(529), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (httpx.ReadTimeout("timed out"), True),
+    (httpx.ConnectError("refused"), True),
+    (TimeoutError(), True),
+    (ValueError("malformed answer"), False),
+])
+def test_retry_classification(error, retried):
+    scheduler = RequestScheduler(initial_backoff=0)
+    assert (scheduler._on_error(error, 0) is not None) == retried
+
+
+def test_retries_honor_retry_after_and_max_retries():
+    scheduler = RequestScheduler(max_retries=2, initial_backoff=0)
+
+    assert scheduler._on_error(StatusError(429, {"retry-after": "7"}), 0) == 7.0
+    assert scheduler._on_error(StatusError(429), 1) == 0.0
+    assert scheduler._on_error(StatusError(429), 2) is None
+
+
+def test_backoff_is_capped():
+    scheduler = RequestScheduler(initial_backoff=1, max_backoff=4, max_retries=10)
+    assert all(0 <= scheduler._on_error(StatusError(500), 8) <= 4 for _ in range(20))
+
+
+def test_run_retries_transient_errors_only():
+    scheduler = RequestScheduler(initial_backoff=0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(503)
+        return "answer"
+
+    assert scheduler.run(flaky) == "answer"
+    assert len(attempts) == 3
+
+    def rejected():
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        scheduler.run(rejected)
+    assert scheduler._in_flight == 0
+
+
+async def settle():
+    # Lets the ready tasks run until they block
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_arun_waits_for_a_free_slot_without_polling():
+    scheduler = RequestScheduler(max_concurrency=2)
+    running = []
+    peak = []
+
+    async def request(release: asyncio.Event):
+        running.append(1)
+        peak.append(len(running))
+        await release.wait()
+        running.pop()
+        return "answer"
+
+    async def main():
+        releases = [asyncio.Event() for _ in range(5)]
+        tasks = [asyncio.ensure_future(scheduler.arun(lambda release=release: request(release))) for release in releases]
+        await settle()
+        assert len(running) == 2
+        # The waiters have no timer pending, they are woken by the released slots
+        assert len(scheduler._async_waiters) == 3
+
+        for release in releases:
+            release.set()
+            await settle()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert max(peak) == 2
+    assert scheduler._in_flight == 0
+
+
+def test_a_slot_released_by_a_thread_wakes_a_coroutine():
+    scheduler = RequestScheduler(max_concurrency=1)
+
+    async def main():
+        assert scheduler._try_enter()
+        waiter = asyncio.ensure_future(scheduler.arun(lambda: asyncio.sleep(0, result="answer")))
+        await settle()
+        assert not waiter.done()
+
+        def release():
+            with scheduler._condition:
+                scheduler._in_flight -= 1
+                scheduler._notify()
+
+        await asyncio.to_thread(release)
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_sdk_retries_are_left_to_the_scheduler():
+    assert LLMClient("openai", "key", "gpt-4o-mini").get_llm().max_retries == 0
+    assert LLMClient("openai", "key", "gpt-4o-mini", llm_config={"max_retries": 3}).get_llm().max_retries == 3
@@ -0,0 +1,85 @@
+from scrapontologies.parsers.schema_entities import entities_from_json_schema
+
+
+def obj(**properties):
+    return {"type": "object", "properties": properties}
+
+
+def by_id(entities):
+    return {entity.id: entity.attributes for entity in entities}
+
+
+def test_nested_objects_and_arrays_become_entities():
+    schema = obj(
+        invoice=obj(
+            number={"type": "string"},
+            total={"type": ["number", "null"]},
+            tags={"type": "array", "items": {"type": "string"}},
+            customer=obj(name={"type": "string"}),
+            items={"type": "array", "items": obj(sku={"type": "string"}, status={"enum": ["open", "closed"]})},
+        ),
+    )
+
+    entities = by_id(entities_from_json_schema(schema))
+
+    # The root only nests objects, so it is not an entity
+    assert entities == {
+        "invoice": {
+            "number": "string",
+            "total": "number",
+            "tags": {"type": "array", "items": "string"},
+            "customer": {"type": "object", "entity": "customer"},
+            "items": {"type": "array", "entity": "items"},
+        },
+        "customer": {"name": "string"},
+        "items": {"sku": "string", "status": "string"},
+    }
+
+
+def test_a_root_with_attributes_of_its_own_is_an_entity():
+    entities = by_id(entities_from_json_schema({**obj(date={"type": "string"}, vendor=obj(name={"type": "string"})), "title": "Bill of sale"}))
+
+    assert entities == {
+        "Bill_of_sale": {"date": "string", "vendor": {"type": "object", "entity": "vendor"}},
+        "vendor": {"name": "string"},
+    }
+    assert "document" in by_id(entities_from_json_schema(obj(date={"type": "string"})))
+
+
+def test_a_definition_referenced_many_times_is_built_once():
+    schema = {
+        **obj(
+            billing={"$ref": "#/$defs/Address"},
+            shipping={"$ref": "#/$defs/Address"},
+            parts={"type": "array", "items": {"$ref": "#/$defs/Part"}},
+        ),
+        "$defs": {
+            "Address": obj(street={"type": "string"}),
+            # A recursive definition refers to its own entity
+            "Part": obj(name={"type": "string"}, subparts={"type": "array", "items": {"$ref": "#/$defs/Part"}}),
+        },
+    }
+
+    entities = by_id(entities_from_json_schema(schema))
+
+    assert set(entities) == {"Address", "Part"}
+    assert entities["Part"]["subparts"] == {"type": "array", "entity": "Part"}
+
+
+def test_objects_with_the_same_name_are_told_apart_by_their_parent():
+    schema = obj(
+        buyer=obj(address=obj(street={"type": "string"})),
+        seller=obj(address=obj(city={"type": "string"})),
+    )
+
+    entities = by_id(entities_from_json_schema(schema))
+
+    assert entities["buyer"]["address"] == {"type": "object", "entity": "address"}
+    assert entities["seller"]["address"] == {"type": "object", "entity": "seller_address"}
+    assert entities["seller_address"] == {"city": "string"}
+
+
+def test_variants_add_their_properties():
+    schema = obj(payment={"type": "object", "anyOf": [obj(iban={"type": "string"}), obj(card={"type": "string"})]})
+
+    assert by_id(entities_from_json_schema(schema))["payment"] == {"iban": "string", "card": "string"}
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+from scrapontologies.parsers.schema_merge import (
+    apply_conflict_resolutions,
+    conflicts_prompt,
+    merge_json_schema_list,
+    merge_json_schemas,
+    merge_json_schemas_locally,
+)
+
+
+def obj(**properties):
+    return {"type": "object", "properties": properties}
+
+
+def test_properties_are_united_and_merged_recursively():
+    existing = obj(invoice=obj(number={"type": "string"}), total={"type": "integer"})
+    new = obj(invoice=obj(date={"type": "string"}), total={"type": "number"}, customer=obj(name={"type": "string"}))
+
+    merged, conflicts = merge_json_schemas_locally(existing, new)
+
+    assert conflicts == {}
+    assert merged == obj(
+        invoice=obj(number={"type": "string"}, date={"type": "string"}),
+        # integer is widened to number
+        total={"type": "number"},
+        customer=obj(name={"type": "string"}),
+    )
+    # The existing schema is not modified
+    assert existing == obj(invoice=obj(number={"type": "string"}), total={"type": "integer"})
+
+
+def test_array_items_are_merged():
+    existing = obj(items={"type": "array", "items": obj(sku={"type": "string"})})
+    new = obj(items={"type": "array", "items": obj(quantity={"type": "integer"})})
+
+    merged, conflicts = merge_json_schemas_locally(existing, new)
+
+    assert conflicts == {}
+    assert merged["properties"]["items"]["items"] == obj(sku={"type": "string"}, quantity={"type": "integer"})
+
+
+def test_required_and_enum_lists_are_united():
+    existing = {**obj(status={"type": "string", "enum": ["paid"]}), "required": ["status"]}
+    new = {**obj(status={"type": "string", "enum": ["paid", "due"]}, total={"type": "number"}), "required": ["total", "status"]}
+
+    merged, _ = merge_json_schemas_locally(existing, new)
+
+    assert merged["required"] == ["status", "total"]
+    assert merged["properties"]["status"]["enum"] == ["paid", "due"]
+
+
+def test_nullable_types_are_merged_into_a_type_list():
+    merged, conflicts = merge_json_schemas_locally(obj(note={"type": "string"}), obj(note={"type": ["string", "null"]}))
+
+    assert conflicts == {}
+    assert merged["properties"]["note"]["type"] == ["string", "null"]
+
+
+def test_annotations_keep_the_existing_value():
+    merged, conflicts = merge_json_schemas_locally(
+        {**obj(), "title": "Invoice", "description": "An invoice"}, {**obj(), "title": "Bill", "description": "A bill"}
+    )
+
+    assert conflicts == {}
+    assert merged["title"] == "Invoice" and merged["description"] == "An invoice"
+
+
+def test_type_conflicts_are_reported_by_json_pointer():
+    existing = obj(customer=obj(name={"type": "string"}), **{"unit/price": {"type": "number"}})
+    new = obj(customer={"type": "string"}, **{"unit/price": {"type": "string"}})
+
+    merged, conflicts = merge_json_schemas_locally(existing, new)
+
+    # The existing subschemas are kept, the "/" of a property name is escaped in its pointer
+    assert merged == existing
+    assert conflicts == {
+        "/properties/customer": [{"type": "string"}],
+        "/properties/unit~1price": [{"type": "string"}],
+    }
+
+
+def test_conflicts_of_a_list_of_schemas_are_collected_once():
+    schemas = [obj(total={"type": "number"}), obj(total={"type": "string"}), obj(total={"type": "string"}), obj(total={"type": "boolean"})]
+
+    merged, conflicts = merge_json_schema_list(schemas)
+
+    assert merged == obj(total={"type": "number"})
+    assert conflicts == {"/properties/total": [{"type": "string"}, {"type": "boolean"}]}
+
+
+def test_conflict_resolutions_replace_the_subschemas_at_their_pointers():
+    merged, conflicts = merge_json_schemas_locally(
+        obj(items={"type": "array", "items": obj(sku={"type": "string"})}, **{"unit/price": {"type": "number"}}),
+        obj(items={"type": "array", "items": {"type": "string"}}, **{"unit/price": {"type": "string"}}),
+    )
+    assert set(conflicts) == {"/properties/items/items", "/properties/unit~1price"}
+
+    prompt = conflicts_prompt(merged, conflicts)
+    assert '"/properties/items/items"' in prompt and '"/properties/unit~1price"' in prompt
+
+    answer = "```json\n" + json.dumps({
+        "/properties/items/items": {"anyOf": [obj(sku={"type": "string"}), {"type": "string"}]},
+    }) + "\n```"
+    resolved = apply_conflict_resolutions(merged, conflicts, answer)
+
+    assert resolved["properties"]["items"]["items"] == {"anyOf": [obj(sku={"type": "string"}), {"type": "string"}]}
+    # The conflict the answer does not resolve keeps the existing subschema
+    assert resolved["properties"]["unit/price"] == {"type": "number"}
+
+
+def test_a_root_conflict_is_replaced_by_its_resolution():
+    merged, conflicts = merge_json_schemas_locally(obj(), {"type": "array"})
+    assert conflicts == {"": [{"type": "array"}]}
+
+    answer = json.dumps({"": {"type": "array", "items": obj()}})
+    assert apply_conflict_resolutions(merged, conflicts, answer) == {"type": "array", "items": obj()}
+
+
+def test_an_unparsable_resolution_keeps_the_merged_schema():
+    merged, conflicts = merge_json_schemas_locally(obj(total={"type": "number"}), obj(total={"type": "string"}))
+    assert apply_conflict_resolutions(merged, conflicts, "I cannot decide.") == obj(total={"type": "number"})
+
+
+class FakeLLMClient:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def get_response(self, prompt):
+        self.prompts.append(prompt)
+        return self.answer
+
+
+@pytest.mark.parametrize("new, calls", [(obj(total={"type": "integer"}), 0), (obj(total={"type": "string"}), 1)])
+def test_merge_json_schemas_only_asks_the_llm_for_conflicts(new, calls):
+    llm_client = FakeLLMClient(json.dumps({"/properties/total": {"type": ["number", "string"]}}))
+
+    merged = merge_json_schemas(obj(total={"type": "number"}), new, llm_client)
+
+    assert len(llm_client.prompts) == calls
+    assert merged == obj(total={"type": "number"} if calls == 0 else {"type": ["number", "string"]})
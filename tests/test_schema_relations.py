@@ -0,0 +1,89 @@
+import pytest
+
+from scrapontologies import Entity
+from scrapontologies.parsers.schema_relations import cross_relation_candidates, infer_relations, singular_forms
+
+
+def entity(entity_id, **attributes):
+    return Entity(id=entity_id, type="object", attributes=attributes)
+
+
+def relations_of(entities):
+    return {(relation.source, relation.name, relation.target, relation.type) for relation in infer_relations(entities)}
+
+
+@pytest.mark.parametrize("name, singular", [
+    ("items", "item"),
+    ("categories", "category"),
+    ("addresses", "address"),
+    ("statuses", "status"),
+    ("boxes", "box"),
+    ("invoices", "invoice"),
+])
+def test_singular_forms_include_the_singular(name, singular):
+    assert singular in singular_forms(name)
+
+
+@pytest.mark.parametrize("name", ["address", "status", "analysis", "item"])
+def test_singular_names_are_left_alone(name):
+    assert singular_forms(name) == [name]
+
+
+def test_nested_entities_give_has_one_and_has_many_relations():
+    entities = [
+        entity("invoice", customer={"type": "object", "entity": "customer"}, items={"type": "array", "entity": "item"}),
+        entity("customer", name="string"),
+        entity("item", sku="string"),
+    ]
+
+    assert relations_of(entities) == {
+        ("invoice", "customer", "customer", "has_one"),
+        ("invoice", "items", "item", "has_many"),
+    }
+
+
+def test_refs_resolve_to_the_entity_of_their_definition():
+    entities = [
+        entity("order", lines={"type": "array", "items": {"$ref": "#/$defs/Line"}}, shipping={"$ref": "#/$defs/Address"}),
+        entity("Line", sku="string"),
+        entity("Address", street="string"),
+    ]
+
+    assert relations_of(entities) == {("order", "lines", "Line", "has_many"), ("order", "shipping", "Address", "has_one")}
+
+
+def test_reference_attributes_match_singular_and_plural_names():
+    entities = [
+        entity("invoices", customerId="string", status_id="string", address_ids="array", category_id="string"),
+        entity("customer", name="string"),
+        entity("Status", code="string"),
+        entity("addresses", street="string"),
+        entity("categories", name="string"),
+    ]
+
+    # "Status" and "address" are not plurals, they are not cut to "Statu" and "addres"
+    assert relations_of(entities) == {
+        ("invoices", "customerId", "customer", "references"),
+        ("invoices", "status_id", "Status", "references"),
+        ("invoices", "address_ids", "addresses", "references"),
+        ("invoices", "category_id", "categories", "references"),
+    }
+
+
+def test_an_exact_name_is_matched_before_a_plural():
+    entities = [entity("order", item_id="string"), entity("items", sku="string"), entity("item", sku="string")]
+
+    assert relations_of(entities) == {("order", "item_id", "item", "references")}
+
+
+def test_unresolved_references_make_cross_relation_candidates():
+    entities = [
+        entity("invoice", items={"type": "array", "entity": "item"}),
+        entity("item", sku="string"),
+        entity("payment", vendor_id="string"),
+        entity("note", author_id="string", items={"type": "object", "entity": "note_item"}),
+        entity("note_item", author_id="string"),
+    ]
+    relations = infer_relations(entities)
+
+    assert [candidate.id for candidate in cross_relation_candidates(entities, relations)] == ["invoice", "payment", "note", "note_item"]